@@ -2,8 +2,14 @@
 
 from .claire_console import *
 from .claire_files   import *
+from .claire_ansi    import *
+from .claire_logging import *
+from .claire_timing  import *
 #from .claire_openai  import *
 #from .claire_usb     import *
 #from .claire_vlc     import *
 #from .claire_winamp  import *
+#from .claire_lcd     import *
+#from .claire_fonts   import *
+#from .claire_images  import *
 
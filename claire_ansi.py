@@ -0,0 +1,248 @@
+#TO USE: import clairecjs_utils as claire
+#
+#       claire.tee_to_log("job.log")                            # colors on the console, a clean copy in job.log
+#       ...
+#       claire.untee()
+#
+#       with claire.tee_to_log("job.log"): ...                  # same thing, just for a block
+#
+#       clean = claire.strip_ansi(text_or_utf8_bytes)           # CSI, OSC, DCS, SOS/PM/APC and C1 controls
+#
+#This replaces writing colored output and cleaning the log afterwards with strip_ansi_from_file(): the log is written
+#already stripped, in the same write() that goes to the terminal, so there's no second pass over the log.
+
+import io
+import re
+import sys
+from typing import Dict
+
+
+def _escape_patterns(binary: bool):
+    """
+    Build the patterns for escape sequences (ECMA-48). In text, 8-bit C1 controls are the characters U+0080-U+009F.
+    In bytes they are looked for in their two-byte UTF-8 form, because 0x80-0x9F on their own are parts of other
+    characters and must be left alone.
+
+    :return: (pattern of ESC sequences for text without C1 controls, pattern of ESC sequences and C1 controls,
+              pattern of an unfinished sequence at the end, pattern of a C1 control)
+    """
+    def c1(codes): return (r'\xc2[' if binary else '[') + codes + ']'
+    def escape(st, body):
+        return r'\x1b(?:' + '|'.join((
+            r'\[[0-?]*[ -/]*[@-~]',                                                 # CSI: colors, cursor moves...
+            r'\]' + body + r'(?:\x07|' + st + ')',                                  # OSC: titles, palette colors, ended by BEL or ST
+            r'[PX^_]' + body + st,                                                  # DCS, SOS, PM, APC: ended by ST
+            r'[\]PX^_]' + body + r'(?=\x1b)',                                       # a control string cut short by another ESC
+            r'[ -/]*[0-~]',                                                         # two-byte and nF escapes: ESC 7, ESC ( B...
+        )) + ')'
+    st      = r'(?:\x1b\\|' + c1(r'\x9c') + ')'                                    # string terminator: ESC \ or C1 ST
+    body    = r'(?:[^\x07\x1b\xc2]|\xc2(?!\x9c))*' if binary else r'[^\x07\x1b\x9c]*'
+    c1_control = '|'.join((
+        c1(r'\x9b') + r'[0-?]*[ -/]*[@-~]',
+        c1(r'\x9d') + body + r'(?:\x07|' + st + ')',
+        c1(r'\x90\x98\x9e\x9f') + body + st,
+        c1(r'\x9d\x90\x98\x9e\x9f') + body + r'(?=\x1b)',
+        c1(r'\x80-\x9f'),                                                           # any other C1 control
+    ))
+    any_string = r'(?:\x1b[\]PX^_]|' + c1(r'\x9d\x90\x98\x9e\x9f') + ')'
+    unfinished = '|'.join((r'\x1b[ -/]*', r'(?:\x1b\[|' + c1(r'\x9b') + r')[0-?]*[ -/]*', any_string + body + r'\x1b?') + ((r'\xc2',) if binary else ()))
+    return escape(r'\x1b\\', r'[^\x07\x1b]*'), escape(st, body) + '|' + c1_control, '(?:' + unfinished + r')\Z', c1(r'\x80-\x9f')
+
+
+_text_patterns  = [re.compile(pattern)                  for pattern in _escape_patterns(binary=False)]
+_bytes_patterns = [re.compile(pattern.encode('ascii')) for pattern in _escape_patterns(binary=True)]
+ESCAPE_SEQUENCE,       ANSI_ESCAPE,       INCOMPLETE_ESCAPE_AT_END,       C1_CONTROL       = _text_patterns
+ESCAPE_SEQUENCE_BYTES, ANSI_ESCAPE_BYTES, INCOMPLETE_ESCAPE_AT_END_BYTES, C1_CONTROL_BYTES = _bytes_patterns
+_INTRODUCER       = re.compile('[\x1b\x9b\x9d\x90\x98\x9e\x9f]')                  # where an unfinished sequence can start
+_INTRODUCER_BYTES  = re.compile(b'[\x1b\xc2]')
+
+
+def _stripping_pattern(text):
+    """
+    The pattern for text or bytes. Without C1 controls, which is nearly always, the ESC-only pattern is used: its
+    literal \x1b prefix lets the regex engine skip ahead to each ESC, which makes it about twice as fast.
+    """
+    if isinstance(text, (bytes, bytearray)):
+        return ANSI_ESCAPE_BYTES if C1_CONTROL_BYTES.search(text) else ESCAPE_SEQUENCE_BYTES
+    return ANSI_ESCAPE if not text.isascii() and C1_CONTROL.search(text) else ESCAPE_SEQUENCE
+
+
+def strip_ansi(text):
+    """
+    Remove every escape sequence and control string from text or UTF-8 bytes: CSI (colors, cursor movement), OSC
+    (window titles, palette changes like the ones tick() sends), DCS, SOS, PM, APC, other ESC sequences and C1 controls.
+
+    clean = strip_ansi("\\x1b]11;rgb:00/00/00\\x1b\\\\\\x1b[32mgreen")    # "green"
+    """
+    return _stripping_pattern(text).sub(text[:0], text)
+
+
+
+class AnsiStripper:
+    """
+    Strips escape sequences (see strip_ansi) from text or UTF-8 bytes that arrive in pieces. A sequence cut off at the
+    end of one piece is held back and finished with the next, so "\x1b[3" + "2mgreen" comes out as "green". The pieces
+    fed, followed by flush(), come out exactly as strip_ansi() of the whole text, wherever the pieces are split.
+
+    Each piece is stripped with the same regex scan as strip_ansi(), and the output stops at the first sequence that
+    scan reaches which is still unfinished. Held back from there, it can't be matched one way now and another way once
+    the rest arrives, as an OSC, DCS or APC that the next piece terminates would be.
+    """
+
+    def __init__(self, binary: bool = False):
+        """
+        :param binary: Whether the pieces are bytes rather than str
+        """
+        self.binary = binary
+        self.pending = b"" if binary else ""
+        self.escape = b"\x1b" if binary else "\x1b"
+        self.backslash = b"\\" if binary else "\\"
+        self.introducer = _INTRODUCER_BYTES if binary else _INTRODUCER
+        self.unfinished = INCOMPLETE_ESCAPE_AT_END_BYTES if binary else INCOMPLETE_ESCAPE_AT_END
+
+    def unfinished_start(self, text, start: int, end: int) -> int:
+        """
+        :return: Where the first unfinished sequence at the end of text that starts between start and end is, or -1
+        """
+        for introducer in self.introducer.finditer(text, start, end):
+            if self.unfinished.match(text, introducer.start()):
+                return introducer.start()
+        return -1
+
+    def feed(self, text):
+        """
+        :param text: The next piece of text
+        :return: The text, stripped, up to the first escape sequence that isn't finished yet
+        """
+        if self.pending:
+            text, self.pending = self.pending + text, text[:0]
+        pattern = _stripping_pattern(text)
+        tail = max(text.rfind(self.escape, 0, len(text) - 1), 0)        # control strings hold no ESC but a final one
+        position = tail
+        while position > 0 and text[position + 1:position + 2] == self.backslash:
+            position = max(text.rfind(self.escape, 0, position), 0)    # the ESC of an ST is inside the string it ends
+        pieces, held = [], -1
+        if position > 0:                                                # any other ESC is where the scan stops, so up
+            prefix = text[:position + 1]                                # to it the faster sub() can be used; the ESC
+            pieces.append(pattern.sub(text[:0], prefix)[:-1])           # still ends any control string before it
+        for match in pattern.finditer(text, position):
+            if match.start() >= tail:
+                held = self.unfinished_start(text, max(position, tail), match.start() + 1)
+                if held >= 0: break
+            pieces.append(text[position:match.start()])
+            position = match.end()
+        else:
+            held = self.unfinished_start(text, max(position, tail), len(text))
+        if held >= 0:
+            self.pending = text[held:]
+            pieces.append(text[position:held])
+        else:
+            pieces.append(text[position:])
+        return text[:0].join(pieces)
+
+    def flush(self):
+        """
+        End of the stream: whatever was held back is stripped as it is, as strip_ansi() would.
+
+        :return: The rest of the stripped text
+        """
+        text, self.pending = self.pending, self.pending[:0]
+        return _stripping_pattern(text).sub(text[:0], text)
+
+
+class AnsiTee(io.TextIOBase):
+    """
+    A text stream that passes everything through to the terminal untouched and writes a stripped copy to a log, in
+    the same write() call. Anything else (fileno, isatty, encoding...) comes from the terminal stream, so it can stand
+    in for sys.stdout or sys.stderr.
+    """
+
+    def __init__(self, terminal, log, close_log: bool = False):
+        """
+        :param terminal: Stream that gets the text as is, usually sys.stdout
+        :param log: Text stream for the stripped copy
+        :param close_log: Whether close() closes the log too
+        """
+        self.terminal = terminal
+        self.log = log
+        self.close_log = close_log
+        self.stripper = AnsiStripper()
+
+    def write(self, text: str) -> int:
+        self.terminal.write(text)
+        stripped = self.stripper.feed(text)
+        if stripped: self.log.write(stripped)
+        return len(text)
+
+    def writelines(self, lines):
+        for line in lines: self.write(line)
+
+    def flush(self):
+        self.terminal.flush()
+        self.log.flush()
+
+    def close(self):
+        if self.closed:
+            return
+        stripped = self.stripper.flush()
+        if stripped: self.log.write(stripped)
+        super().close()                                                 # flushes both streams
+        if self.close_log: self.log.close()
+
+    def writable(self) -> bool: return True
+    def isatty(self)   -> bool: return self.terminal.isatty()
+    def fileno(self)   -> int:  return self.terminal.fileno()
+
+    @property
+    def encoding(self): return getattr(self.terminal, "encoding", "utf-8")
+
+    @property
+    def errors(self):   return getattr(self.terminal, "errors", "strict")
+
+    def __getattr__(self, name):
+        return getattr(self.terminal, name)
+
+
+class _Installed:
+    """
+    What tee_to_log() returns: the tees it installed, usable as a context manager that uninstalls them.
+    """
+
+    def __init__(self, tees: Dict[str, AnsiTee]):
+        self.tees = tees
+
+    def __enter__(self): return self
+    def __exit__(self, *exc_info): untee()
+
+
+_originals = {}                                                          # stream name -> what was there before
+
+
+def tee_to_log(log_path: str, streams=("stdout", "stderr"), mode: str = "a", encoding: str = "utf-8") -> _Installed:
+    """
+    Replace sys.stdout and/or sys.stderr with AnsiTees writing a stripped copy to one log file.
+
+    :param log_path: The log file
+    :param streams: Which of "stdout" and "stderr" to tee
+    :param mode: "a" to append to the log, "w" to start it over
+    :return: The installed tees; use as a context manager to uninstall them at the end of a block
+    """
+    untee()
+    log = open(log_path, mode, encoding=encoding)
+    tees = {}
+    for index, name in enumerate(streams):
+        _originals[name] = getattr(sys, name)
+        tees[name] = AnsiTee(_originals[name], log, close_log=index == len(streams) - 1)
+        setattr(sys, name, tees[name])
+    return _Installed(tees)
+
+
+def untee():
+    """
+    Put back the streams tee_to_log() replaced and close the log.
+    """
+    for name, original in list(_originals.items()):
+        tee = getattr(sys, name)
+        setattr(sys, name, original)
+        if isinstance(tee, AnsiTee): tee.close()
+        del _originals[name]
@@ -11,16 +11,22 @@
 
 
 
+import io
 import os
 import sys
 import time
+import select
 import atexit
 import ctypes
+import threading
+import multiprocessing
 import colorsys
 import subprocess
 import msvcrt
 import colorama
 from colorama import init, Fore, Back, Style
+try:                from .claire_timing import timed
+except ImportError: from claire_timing  import timed
 init(autoreset=True)
 
 
@@ -121,11 +127,26 @@ class ColorControl:
 
     test_name       = "None"
     last_cycle_time =  None
-    min_cycle_delta =  0.1                                                                                            # minimum time interval between color changes
+    min_cycle_delta =  0.1                                                                                            # minimum time interval between color changes; widened by adaptive pacing when the terminal falls behind
+
+    write_lock      = threading.Lock()                                                                                # one thread at a time changes the color, so escape sequences don't interleave
+
+    adaptive_pacing  = True                                                                                           # widen min_cycle_delta on slow terminals (SSH, serial), tighten it again when they keep up
+    base_cycle_delta = None                                                                                           # the fastest pacing: min_cycle_delta as it was when pacing started
+    max_cycle_delta  = 2.0                                                                                            # the slowest pacing
+    slow_write_ratio = 0.05                                                                                           # a color change whose write takes longer than this fraction of the interval is too slow
+    write_latency    = 0.0                                                                                            # EWMA of the seconds a color change took to write
+    write_blocked    = False                                                                                          # the last color change took longer to write than the whole interval
+    frame_interval   = None                                                                                           # EWMA of the seconds between color changes actually written
+    last_frame_time  = None
+    frames_written   = 0
+    slow_writes      = 0                                                                                              # color changes that took too long to write
+    stalls           = 0                                                                                              # color changes skipped because the terminal hadn't taken the last ones yet
 
     current_color_code = "???"       # Represents the currently set color code
     last_color_changed_code = None   # Represents the last color code that was changed
 
+    @timed("console.color_cycle")                                 # tick() only gets here when it's time to change color
     def color_cycle(self, mode="fg", count=1000, sleep=None, now=None, prevent_machine_slowdown=True, testing=False, suppress_testing_header=False, test_name='None', j=None, color_step=1):
         if testing and not suppress_testing_header:
             parameters = ", ".join([f"{param}: {value}" for param, value in locals().items() if param != 'self'])
@@ -211,13 +232,83 @@ class ColorControl:
 
     def tick(self, sleep=None, mode=None, testing=False, test_name="None", j=None, count=1, color_step=1):
         now = time.time()
-        self.test_name = test_name
         if self.last_cycle_time is None or now - self.last_cycle_time >= self.min_cycle_delta:
-            #elf.color_cycle(mode= 3  , count=  1  , testing=testing, suppress_testing_header=True, sleep=sleep, now=now, j=j)
-            self.color_cycle(mode=mode, count=count, testing=testing, suppress_testing_header=True, sleep=sleep, now=now, j=j, color_step=color_step)
-            self.last_cycle_time = now
+            if not self.write_lock.acquire(blocking=False): return                     # another thread is changing the color right now, that's our heartbeat too
+            try:
+                self.test_name = test_name
+                #elf.color_cycle(mode= 3  , count=  1  , testing=testing, suppress_testing_header=True, sleep=sleep, now=now, j=j)
+                self.paced_color_cycle(now, mode=mode, count=count, testing=testing, suppress_testing_header=True, sleep=sleep, j=j, color_step=color_step)
+            finally:
+                self.write_lock.release()
         #return r, g, b 🐐
 
+    def paced_color_cycle(self, now=None, items=None, sleep=None, **cycle_args):
+        """
+        Change the color if min_cycle_delta has passed since the last change, skip it if the terminal is backlogged, and
+        adjust the pacing to how long the write took. The caller holds write_lock. This is what tick() and the
+        TickAggregator's heartbeat both go through.
+
+        :param items: Items done so far for the tick meter, when they were counted somewhere else
+        :return: True if the color was changed
+        """
+        now = time.time() if now is None else now
+        if self.last_cycle_time is not None and now - self.last_cycle_time < self.min_cycle_delta:
+            return False
+        self.last_cycle_time = now
+        if self.adaptive_pacing and self.backlogged():
+            self.stalls += 1                                                           # skip this frame rather than block the caller's loop behind it
+            self.widen_cycle_delta()
+            return False
+        start = time.perf_counter()
+        self.color_cycle(sleep=sleep, now=now, **cycle_args)
+        if tick_meter is not None: tick_meter.update(items=items)                     # the title is only rewritten along with a color change
+        if self.adaptive_pacing and not sleep: self.pace(time.perf_counter() - start, now)
+        return True
+
+    def backlogged(self):
+        """
+        Tell whether the terminal is still busy with earlier color changes. The measured write time works everywhere: a
+        write that blocked for longer than min_cycle_delta means the terminal isn't keeping up, so the next frame is
+        skipped. Where select() can probe the stream (not on Windows), a terminal that can't take more output right
+        now is caught before writing to it.
+        """
+        if self.write_blocked:
+            self.write_blocked = False
+            return True
+        return terminal_backlogged(sys.stdout)
+
+    def pace(self, write_seconds, now):
+        """
+        Adjust min_cycle_delta after a color change took write_seconds to write: double it when the write was slow, so
+        the terminal gets more time to catch up, and shrink it back towards base_cycle_delta while writes are fast.
+        """
+        if self.base_cycle_delta is None: self.base_cycle_delta = self.min_cycle_delta
+        self.frames_written += 1
+        self.write_latency   = write_seconds if self.frames_written == 1 else self.write_latency + (write_seconds - self.write_latency) * 0.2
+        if self.last_frame_time is not None:
+            interval = now - self.last_frame_time
+            self.frame_interval = interval if self.frame_interval is None else self.frame_interval + (interval - self.frame_interval) * 0.2
+        self.last_frame_time = now
+        self.write_blocked   = write_seconds > self.min_cycle_delta
+        if write_seconds > self.slow_write_ratio * self.min_cycle_delta:
+            self.slow_writes += 1
+            self.widen_cycle_delta()
+        elif self.min_cycle_delta > self.base_cycle_delta and self.write_latency < self.slow_write_ratio * self.min_cycle_delta / 2:
+            self.min_cycle_delta = max(self.base_cycle_delta, self.min_cycle_delta * 0.75)
+
+    def widen_cycle_delta(self):
+        if self.base_cycle_delta is None: self.base_cycle_delta = self.min_cycle_delta
+        self.min_cycle_delta = min(self.max_cycle_delta, self.min_cycle_delta * 2)
+
+    def pacing_stats(self):
+        """
+        :return: The current interval between color changes, the effective rate of color changes actually written per
+                 second, the average write latency, and how many color changes were written, slow, or skipped
+        """
+        return {"cycle_delta": self.min_cycle_delta, "effective_rate": 1 / self.frame_interval if self.frame_interval else 0.0,
+                "write_latency": self.write_latency, "frames_written": self.frames_written, "slow_writes": self.slow_writes,
+                "stalls": self.stalls}
+
     def tock_closer(self):
         for color_code, rgb_values in enumerate(default_rgb_for_color_code):
             ansi_code = mapping_console_color_to_ansi_color.get(color_code, color_code)
@@ -256,7 +347,10 @@ class ColorControl:
 
 
 #              vvv---- this is the default mode if we lazily call claire.tick() from somewhere external
-def tick(mode="fg", testing=False,test_name="None",sleep=None, j=None, count=1, color_step=1):  color_control.tick(mode=mode, testing=testing, test_name=test_name, sleep=sleep, j=j, count=count, color_step=color_step)
+def tick(mode="fg", testing=False,test_name="None",sleep=None, j=None, count=1, color_step=1, items=1):
+    if tick_aggregator is not None: tick_aggregator.tick(items); return            # counted; the aggregator's one writer does the color changes
+    if tick_meter      is not None: tick_meter.items += items                      # counted; the meter only does its math when the color changes
+    color_control.tick(mode=mode, testing=testing, test_name=test_name, sleep=sleep, j=j, count=count, color_step=color_step)
 def tock():                                                                                     color_control.tock()
 
 
@@ -285,11 +379,425 @@ mapping_console_color_to_ansi_color = {
     11: 0
 }
 
+def terminal_backlogged(stream):
+    """
+    Check, without blocking, whether a stream's terminal or pipe can take more output right now. A terminal over a slow
+    SSH link or serial line that hasn't drained what it was sent is backlogged, and writing to it would block.
+    The stream's blocking mode is left alone, since everything else printing to it expects blocking writes.
+
+    This is only a probe: on Windows select() doesn't work on consoles or pipes, so it never reports a backlog there.
+    ColorControl.backlogged() relies on the measured write time on every platform and uses this where it works.
+
+    :return: True if writing would block; False if it wouldn't, or it can't be told (Windows, StringIO)
+    """
+    try:
+        _, writable, _ = select.select([], [stream.fileno()], [], 0)
+    except (AttributeError, OSError, ValueError, io.UnsupportedOperation):
+        return False
+    return not writable
+
+
 color_control = ColorControl()
 atexit.register(color_control.tock)     # Register tock() function with atexit so it automatically runs when the program ends
 
 
 
+class TickAggregator:
+    """
+    Counts tick()s from many threads and worker processes and leaves the color changes to one writer, so there is one
+    merged heartbeat on the terminal instead of every worker writing escape sequences over each other.
+
+    Every ticking thread, in this process or a worker process, gets its own slot in a shared-memory array and is the
+    only one writing it, so tick() takes no locks. Slots aren't given back when a thread ends; once they are all taken,
+    further threads share one overflow slot, which does take a lock, so tick() never fails. A render thread in the
+    process that called start() reads all slots every `interval` seconds and changes the color once if anything
+    ticked, paced like tick() is. rates() gives ticks/second per worker for display.
+
+    Sample use:
+        aggregator = TickAggregator().start()
+        with multiprocessing.Pool(initializer=init_tick_worker, initargs=(aggregator,)) as pool:
+            pool.map(work, items)                           # work() calls claire.tick() as usual
+        aggregator.stop()
+    """
+
+    NAME_SIZE = 48
+
+    def __init__(self, slots=256, interval=0.1, mode="fg", render=None):
+        """
+        :param slots: Most threads that get a slot of their own, across all processes
+        :param interval: Seconds between heartbeats
+        :param mode: tick() mode for the default heartbeat
+        :param render: Function called for each heartbeat, instead of changing the color
+        """
+        self.slots = slots
+        self.interval = interval
+        self.mode = mode
+        self.render = render
+        self.counts = multiprocessing.RawArray(ctypes.c_uint64, slots + 1)           # the last one is the overflow slot
+        self.names = multiprocessing.RawArray(ctypes.c_char, (slots + 1) * self.NAME_SIZE)
+        self.names[slots * self.NAME_SIZE:slots * self.NAME_SIZE + 10] = b"(overflow)"
+        self.slots_used = multiprocessing.Value(ctypes.c_int, 0)
+        self.overflow_lock = multiprocessing.Lock()
+        self._setup_process_state()
+
+    def _setup_process_state(self):
+        self.local = threading.local()
+        self.thread = None
+        self.running = False
+        self.previous = {}
+        self.previous_time = None
+        self.rates_by_slot = {}
+        self.heartbeats = 0
+
+    def __getstate__(self):                                             # sent to worker processes: only the shared memory
+        return {"slots": self.slots, "interval": self.interval, "mode": self.mode, "render": None,
+                "counts": self.counts, "names": self.names, "slots_used": self.slots_used, "overflow_lock": self.overflow_lock}
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._setup_process_state()
+
+    def claim_slot(self):
+        with self.slots_used.get_lock():
+            slot = self.slots_used.value
+            if slot >= self.slots:
+                self.local.slot = self.slots
+                return self.slots
+            self.slots_used.value += 1
+        name = f"{multiprocessing.current_process().name}/{threading.current_thread().name}".encode()[:self.NAME_SIZE]
+        self.names[slot * self.NAME_SIZE:slot * self.NAME_SIZE + len(name)] = name
+        self.local.slot, self.local.count = slot, 0
+        return slot
+
+    def tick(self, count=1):
+        local = self.local
+        try:
+            slot = local.slot
+        except AttributeError:
+            slot = self.claim_slot()
+        if slot == self.slots:                                          # the overflow slot is shared
+            with self.overflow_lock: self.counts[slot] += count
+            return
+        local.count += count
+        self.counts[slot] = local.count
+
+    def total(self):
+        return sum(self.counts[:self.slots_used.value]) + self.counts[self.slots]
+
+    def sample(self, now=None):
+        """
+        Read every slot once, update the rates, and tell whether anything ticked since the last sample.
+        """
+        now = time.perf_counter() if now is None else now
+        used = self.slots_used.value
+        counts = dict(enumerate(self.counts[:used]))
+        if self.counts[self.slots]: counts[self.slots] = self.counts[self.slots]
+        elapsed = now - self.previous_time if self.previous_time is not None else None
+        ticked = False
+        for slot, count in counts.items():
+            delta = count - self.previous.get(slot, 0)
+            if delta: ticked = True
+            if elapsed: self.rates_by_slot[slot] = delta / elapsed
+            self.previous[slot] = count
+        self.previous_time = now
+        return ticked
+
+    def heartbeat(self):
+        self.heartbeats += 1
+        if self.render:
+            if tick_meter is not None: tick_meter.update(items=self.total())
+            self.render()
+        else:
+            color_control.paced_color_cycle(mode=self.mode, count=1, items=self.total())   # backlog check and pacing, like tick()
+
+    def run(self):
+        while self.running:
+            if self.sample():
+                with color_control.write_lock: self.heartbeat()
+            time.sleep(self.interval)
+
+    def start(self):
+        """
+        Start the one writer and send this process's tick()s through the aggregator.
+        """
+        global tick_aggregator
+        tick_aggregator = self
+        self.running = True
+        self.thread = threading.Thread(target=self.run, name="TickAggregator", daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        global tick_aggregator
+        if tick_aggregator is self: tick_aggregator = None
+        self.running = False
+        if self.thread:
+            self.thread.join()
+            self.thread = None
+            if self.sample():                                           # ticks since the writer's last look still get their heartbeat
+                with color_control.write_lock: self.heartbeat()
+
+    def rates(self):
+        """
+        :return: Ticks per second over the last interval, by worker ("process name/thread name")
+        """
+        return {self.names[slot * self.NAME_SIZE:(slot + 1) * self.NAME_SIZE].rstrip(b"\0").decode(errors="replace"): rate
+                for slot, rate in self.rates_by_slot.items()}
+
+
+tick_aggregator = None                                                  # when set, tick() counts here instead of writing
+
+
+def init_tick_worker(aggregator):
+    """
+    multiprocessing initializer: send the worker's tick()s to the parent's aggregator.
+    """
+    global tick_aggregator
+    aggregator._setup_process_state()                                   # a forked worker must not reuse the parent's slots
+    tick_aggregator = aggregator
+
+
+
+class TickMeter:
+    """
+    Throughput and ETA for loops that call tick(), shown in the terminal's window title (OSC 2, or OSC 0 for the icon
+    name too), so nothing is printed among the loop's own output. tick() only adds to a counter; the rate, an EWMA of
+    items per second, and the title are worked out when tick() changes the color anyway, and at most every `interval`
+    seconds, so the meter adds one addition to the per-tick cost.
+
+    Counting from several threads at once can lose a few items; a TickAggregator counts exactly and feeds the meter.
+
+    Sample use:
+        with claire.TickMeter(total=len(files), label="copying"):
+            for file in files:
+                copy(file)
+                claire.tick()                               # title: "copying 1,234/10,000 (12%) 523/s ETA 0:16"
+    """
+
+    def __init__(self, total=None, label="", interval=0.5, half_life=5.0, stream=None, title_code=2, clock=time.perf_counter):
+        """
+        :param total: Number of items expected, for the percentage and ETA; None if unknown
+        :param label: Text at the start of the title
+        :param interval: Least seconds between title updates
+        :param half_life: Seconds after which an old rate counts half in the average
+        :param stream: Where to write the title, defaults to sys.stdout at the time of each write
+        :param title_code: 2 for the window title, 0 for the window title and icon name
+        """
+        self.total = total
+        self.label = "".join(char for char in label if char >= " " and char != "\x7f")
+        self.interval = interval
+        self.half_life = half_life
+        self.stream = stream
+        self.title_code = title_code
+        self.clock = clock
+        self.items = 0
+        self.rate = None
+        self.last_time = None
+        self.last_items = 0
+        self.titles_written = 0
+
+    def update(self, now=None, items=None):
+        """
+        Fold the items counted since the last update into the rate and rewrite the title, if `interval` has passed.
+
+        :param items: Items done so far, when they were counted somewhere else
+        """
+        now = self.clock() if now is None else now
+        if items is not None: self.items = items
+        if self.last_time is None:
+            self.last_time, self.last_items = now, self.items
+            return
+        elapsed = now - self.last_time
+        if elapsed < self.interval:
+            return
+        rate   = (self.items - self.last_items) / elapsed
+        weight = 1 - 0.5 ** (elapsed / self.half_life)                # weighs by time, so late updates count for more
+        self.rate = rate if self.rate is None else self.rate + (rate - self.rate) * weight
+        self.last_time, self.last_items = now, self.items
+        self.write_title()
+
+    def eta(self):
+        """
+        :return: Seconds until `total` at the current rate, or None if the total or the rate isn't known
+        """
+        if self.total is None or not self.rate:
+            return None
+        return max(0.0, (self.total - self.items) / self.rate)
+
+    def title(self):
+        parts = [self.label] if self.label else []
+        if self.total: parts.append(f"{self.items:,}/{self.total:,} ({min(100, self.items * 100 // self.total)}%)")
+        else:          parts.append(f"{self.items:,}")
+        if self.rate is not None: parts.append(f"{self.rate:,.0f}/s")
+        eta = self.eta()
+        if eta is not None:
+            minutes, seconds = divmod(int(eta), 60)
+            hours,   minutes = divmod(minutes, 60)
+            parts.append(f"ETA {hours}:{minutes:02}:{seconds:02}" if hours else f"ETA {minutes}:{seconds:02}")
+        return " ".join(parts)
+
+    def write_title(self):
+        stream = self.stream or sys.stdout
+        stream.write(f'\x1b]{self.title_code};{self.title()}\x07')
+        stream.flush()
+        self.titles_written += 1
+
+    def start(self):
+        """
+        Save the window title (on terminals that support it, like xterm) and start counting tick()s.
+        """
+        global tick_meter
+        stream = self.stream or sys.stdout
+        stream.write('\x1b[22;0t')
+        stream.flush()                                                  # saved before any title update can reach the terminal
+        self.last_time, self.last_items = self.clock(), self.items
+        tick_meter = self
+        return self
+
+    def stop(self):
+        """
+        Stop counting and put the saved window title back.
+        """
+        global tick_meter
+        if tick_meter is self: tick_meter = None
+        stream = self.stream or sys.stdout
+        stream.write('\x1b[23;0t')
+        stream.flush()
+
+    def __enter__(self):           return self.start()
+    def __exit__(self, *exc_info): self.stop()
+
+
+tick_meter = None                                                       # when set, tick() counts items for it
+
+
+
+class ScreenWriter:
+    """
+    Double-buffered text screen for dashboards that refresh in place. Draw the next frame into the back buffer with
+    put(), then present() compares it cell by cell (character plus SGR attributes) with what is on the screen and
+    writes only what changed: cursor moves, SGR changes and characters, all in one write. An unchanged frame writes
+    nothing, so there's no flicker and little traffic over SSH.
+
+    Cells hold one character each; wide characters (CJK, emoji) would throw the cursor tracking off.
+
+    Sample use:
+        screen = ScreenWriter(80, 25)
+        while True:
+            screen.put(0, 0, f"Files copied: {count:,}", sgr="1;32")
+            screen.put(0, 1, "#" * done + "." * (40 - done))
+            screen.present()
+    """
+
+    def __init__(self, width, height, stream=None, top=1, left=1):
+        """
+        :param width: Columns
+        :param height: Rows
+        :param stream: Where to write, defaults to sys.stdout at the time of each present()
+        :param top: Terminal row of the screen's first row, 1-based
+        :param left: Terminal column of the screen's first column, 1-based
+        """
+        self.width, self.height = width, height
+        self.stream = stream
+        self.top, self.left = top, left
+        self.chars = [[" "] * width for _ in range(height)]           # back buffer: the frame being drawn
+        self.attrs = [[""] * width for _ in range(height)]
+        self.shown_chars = None                                         # front buffer: what is on the screen, None = unknown
+        self.shown_attrs = None
+        self.frames = 0
+        self.bytes_written = 0
+        self.cells_written = 0
+
+    def put(self, x, y, text, sgr=""):
+        """
+        Write text into the back buffer, clipped to the screen.
+
+        :param sgr: SGR parameters for the text, like "1;32" for bright green; "" for the terminal's default
+        """
+        if not 0 <= y < self.height or x >= self.width:
+            return
+        if x < 0:
+            text, x = text[-x:], 0
+        text = text[:self.width - x]
+        self.chars[y][x:x + len(text)] = text
+        self.attrs[y][x:x + len(text)] = [sgr] * len(text)
+
+    def clear(self, sgr=""):
+        """
+        Blank the back buffer. Nothing is written until present().
+        """
+        for y in range(self.height):
+            self.chars[y][:] = [" "] * self.width
+            self.attrs[y][:] = [sgr] * self.width
+
+    def invalidate(self):
+        """
+        Forget what is on the screen, so the next present() redraws everything. Use after something else wrote there.
+        """
+        self.shown_chars = self.shown_attrs = None
+
+    def render(self):
+        """
+        :return: The escape sequences and text that turn the screen into the back buffer, without writing them
+        """
+        if self.shown_chars is None:
+            self.shown_chars = [[None] * self.width for _ in range(self.height)]
+            self.shown_attrs = [[None] * self.width for _ in range(self.height)]
+        out = []
+        cursor_x = cursor_y = None                                      # unknown: anything may have moved it since the last frame
+        current_sgr = None
+        for y in range(self.height):
+            chars, attrs, shown_chars, shown_attrs = self.chars[y], self.attrs[y], self.shown_chars[y], self.shown_attrs[y]
+            if chars == shown_chars and attrs == shown_attrs:
+                continue
+            for x in range(self.width):
+                char, sgr = chars[x], attrs[x]
+                if char == shown_chars[x] and sgr == shown_attrs[x]:
+                    continue
+                if cursor_y != y or cursor_x != x:
+                    if cursor_y == y and 0 < x - cursor_x:
+                        gap = x - cursor_x
+                        if gap <= 3 and all(attr == current_sgr for attr in attrs[cursor_x:x]):
+                            out.extend(chars[cursor_x:x])               # reprinting a few unchanged cells is shorter than a move
+                        else:
+                            out.append(f"\x1b[{gap}C" if gap > 1 else "\x1b[C")
+                    else:
+                        out.append(f"\x1b[{self.top + y};{self.left + x}H")
+                if sgr != current_sgr:
+                    out.append(f"\x1b[0;{sgr}m" if sgr else "\x1b[0m")
+                    current_sgr = sgr
+                out.append(char)
+                self.cells_written += 1
+                cursor_x, cursor_y = x + 1, y
+                if cursor_x == self.width:                              # terminals differ on where the cursor is now
+                    cursor_x = cursor_y = None
+            shown_chars[:] = chars
+            shown_attrs[:] = attrs
+        if current_sgr:
+            out.append("\x1b[0m")
+        return "".join(out)
+
+    def present(self):
+        """
+        Put the back buffer on the screen, in one write.
+
+        :return: Number of characters written
+        """
+        output = self.render()
+        self.frames += 1
+        if output:
+            stream = self.stream or sys.stdout
+            stream.write(output)
+            stream.flush()
+            self.bytes_written += len(output)
+        return len(output)
+
+    def stats(self):
+        return {"frames": self.frames, "bytes_written": self.bytes_written, "cells_written": self.cells_written,
+                "bytes_per_frame": self.bytes_written / self.frames if self.frames else 0.0}
+
+
+
 def tick_subtest(mode,num_ticks=7500000):
     input(f"\n\nHit [ENTER] for tick **** {mode} **** test... will run tick() {num_ticks} times...")
     for j in range(0, num_ticks):
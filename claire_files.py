@@ -1,7 +1,18 @@
 #TO USE: import clairecjs_utils as claire
 import os
-import re
+import sys
+import json
+import time
 import shutil
+import fnmatch
+import hashlib
+import argparse
+import concurrent.futures
+from typing import (NamedTuple, Optional, Tuple)
+try:                from .claire_timing import timed, count_event
+except ImportError: from claire_timing  import timed, count_event
+try:                from .claire_ansi   import strip_ansi, C1_CONTROL_BYTES, ESCAPE_SEQUENCE_BYTES
+except ImportError: from claire_ansi    import strip_ansi, C1_CONTROL_BYTES, ESCAPE_SEQUENCE_BYTES
 from colorama import Fore, init
 init()
 
@@ -13,6 +24,7 @@ DEBUG_RENAME = False
 
 
 
+@timed("files.rename")
 def rename(filename, new_filename):
     """
     A renamer that will never overwrite an existing file, instead adding "-1", "-2", "-3", etc, to the filename until it is unique
@@ -37,6 +49,7 @@ def rename(filename, new_filename):
         new_filename = os.path.join(base_dir, new_filename)
         return_value = new_filename
         counter      += 1
+        count_event("files.rename_collisions")
 
     if DEBUG_RENAME: print(f"{Fore.GREEN}- About to try to rename {filename} to {new_filename}...")
 
@@ -48,10 +61,173 @@ def rename(filename, new_filename):
 
 
 
+def _strip_ansi_from_file_content(content: bytes) -> bytes:
+    """
+    strip_ansi() for the bytes of a file. C1 controls are only looked for in their UTF-8 form when the file is UTF-8:
+    in a cp1252 file, bytes like 0xC2 0x9B are the text "Â›", not a CSI.
+    """
+    if C1_CONTROL_BYTES.search(content):
+        try:                       content.decode('utf-8')
+        except UnicodeDecodeError: return ESCAPE_SEQUENCE_BYTES.sub(b'', content)
+    return strip_ansi(content)
+
+
 def strip_ansi_from_file(filename):
-    ansi_escape = re.compile(r'\x1B(?:[@-Z\\-_]|\[[0-?]*[ -/]*[@-~])')
-    with open(filename, 'r') as file:
+    """
+    Remove escape sequences (colors, cursor moves, window titles, palette changes... see claire_ansi.strip_ansi) from
+    a file, in place. The file is handled as bytes, so line endings and encoding are left as they were. C1 controls
+    are only removed from files that are valid UTF-8; in other encodings only the ESC sequences are.
+
+    :return: True if the file had escape sequences and was rewritten
+    """
+    with open(filename, 'rb') as file:
         log_content          = file.read()
-        log_content_stripped = ansi_escape.sub('', log_content)
-    with open(filename, 'w') as file: file.write(log_content_stripped)
+        log_content_stripped = _strip_ansi_from_file_content(log_content)
+    if log_content_stripped == log_content:
+        return False
+    with open(filename, 'wb') as file: file.write(log_content_stripped)
+    return True
+
+
 
+
+STRIP_ANSI_MANIFEST = ".strip_ansi_manifest.json"
+
+
+class StripTreeReport(NamedTuple):
+    files_stripped: int
+    """
+    Files that had escape sequences and were rewritten
+    """
+    files_clean: int
+    """
+    Files that were read but had nothing to strip
+    """
+    files_skipped: int
+    """
+    Files the manifest showed were already clean, so they weren't read
+    """
+    bytes_processed: int
+    seconds: float
+    failures: Tuple[Tuple[str, str], ...] = ()
+    """
+    (filename, error) for every file that couldn't be read or written. They aren't in the manifest, so the next run
+    tries them again.
+    """
+
+    @property
+    def megabytes_per_second(self) -> float:
+        return self.bytes_processed / self.seconds / 1e6 if self.seconds else 0.0
+
+
+def file_hash(filename) -> str:
+    digest = hashlib.blake2b(digest_size=16)
+    with open(filename, 'rb') as file:
+        for chunk in iter(lambda: file.read(1024 * 1024), b''): digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _strip_ansi_and_describe(filename) -> Tuple[str, Optional[str], bool, int, int, int, str]:
+    """
+    Process pool worker: strip one file, like strip_ansi_from_file(), and describe the result for the manifest. The
+    hash is of the stripped content already in memory, so the file isn't read back.
+
+    :return: (filename, None, whether it was rewritten, bytes before, size after, mtime_ns after, hash after), or
+             (filename, error, False, 0, 0, 0, "") if the file couldn't be read or written
+    """
+    try:
+        with open(filename, 'rb') as file: content = file.read()
+        stripped  = _strip_ansi_from_file_content(content)
+        rewritten = stripped != content
+        if rewritten:
+            with open(filename, 'wb') as file: file.write(stripped)
+        stat = os.stat(filename)
+    except OSError as e:
+        return filename, str(e), False, 0, 0, 0, ""
+    return filename, None, rewritten, len(content), stat.st_size, stat.st_mtime_ns, hashlib.blake2b(stripped, digest_size=16).hexdigest()
+
+
+def strip_ansi_tree(root, pattern="*.log", workers: Optional[int] = None, manifest_path: Optional[str] = None, verbose=False) -> StripTreeReport:
+    """
+    strip_ansi_from_file() every file under root whose name matches pattern, spread over a process pool.
+
+    A manifest of (size, mtime, hash) per cleaned file is kept in root/.strip_ansi_manifest.json, so files that were
+    already cleaned are skipped: a matching size and mtime skip without reading the file, and a file that was only
+    touched is skipped once its hash turns out to match.
+
+    strip_ansi_tree("c:/logs", "*.txt")
+
+    :param root: Directory to clean
+    :param pattern: fnmatch pattern of the file names to clean
+    :param workers: Number of processes, defaults to the number of cores
+    :param manifest_path: Where to keep the manifest, defaults to inside root
+    :return: Counts of files stripped, already clean and skipped, bytes processed, how long it took, and the files
+             that failed. A file that fails doesn't stop the others, and the manifest is still saved.
+    """
+    start = time.perf_counter()
+    manifest_path = manifest_path or os.path.join(root, STRIP_ANSI_MANIFEST)
+    try:
+        with open(manifest_path, encoding='utf-8') as file: manifest = json.load(file)
+    except (OSError, ValueError):
+        manifest = {}
+
+    todo, skipped, seen, failures = [], 0, {}, []
+    for directory, _, files in os.walk(root):
+        for name in fnmatch.filter(files, pattern):
+            filename = os.path.join(directory, name)
+            if os.path.abspath(filename) == os.path.abspath(manifest_path): continue
+            key, entry = os.path.relpath(filename, root), manifest.get(os.path.relpath(filename, root))
+            try:
+                stat = os.stat(filename)
+                unchanged = entry and entry[0] == stat.st_size and (entry[1] == stat.st_mtime_ns or entry[2] == file_hash(filename))
+            except OSError as e:                                        # gone since os.walk() listed it, or locked
+                failures.append((filename, str(e)))
+                continue
+            if unchanged:
+                seen[key] = [stat.st_size, stat.st_mtime_ns, entry[2]]
+                skipped += 1
+            else:
+                todo.append(filename)
+
+    workers = min(workers or os.cpu_count() or 1, len(todo))
+    if workers > 1:
+        with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(_strip_ansi_and_describe, todo, chunksize=max(1, len(todo) // (workers * 4))))
+    else:
+        results = [_strip_ansi_and_describe(filename) for filename in todo]
+
+    processed, stripped, clean = 0, 0, 0
+    for filename, error, rewritten, bytes_before, size, mtime_ns, digest in results:
+        if error is not None:
+            failures.append((filename, error))
+            continue
+        seen[os.path.relpath(filename, root)] = [size, mtime_ns, digest]
+        processed += bytes_before
+        if not rewritten:
+            clean += 1
+            continue
+        stripped += 1
+        if verbose: print(f"{Fore.GREEN}- Stripped {filename}")
+    with open(manifest_path + ".tmp", 'w', encoding='utf-8') as file: json.dump(seen, file)
+    os.replace(manifest_path + ".tmp", manifest_path)
+
+    return StripTreeReport(stripped, clean, skipped, processed, time.perf_counter() - start, tuple(failures))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Strip ANSI escape sequences from every matching file in a directory tree")
+    parser.add_argument("root", help="directory to clean")
+    parser.add_argument("pattern", nargs="?", default="*.log", help="file name pattern (default: *.log)")
+    parser.add_argument("--workers", type=int, default=None, help="number of processes (default: number of cores)")
+    parser.add_argument("--verbose", action="store_true", help="list every file stripped")
+    args = parser.parse_args(argv)
+    report = strip_ansi_tree(args.root, args.pattern, workers=args.workers, verbose=args.verbose)
+    print(f"Stripped {report.files_stripped} files, {report.files_clean} were already clean "
+          f"({report.bytes_processed / 1e6:.1f} MB, {report.megabytes_per_second:.1f} MB/s), skipped {report.files_skipped} unchanged in {report.seconds:.2f}s")
+    for filename, error in report.failures:
+        print(f"{Fore.RED}- Failed {filename}: {error}")
+    return 1 if report.failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
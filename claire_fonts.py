@@ -0,0 +1,333 @@
+#TO USE: import clairecjs_utils as claire
+#
+#       font = claire.get_font("JetBrains Mono", 40, weight="Bold")
+#       width = claire.text_width("Excuse Me?", "JetBrains Mono", 40)
+#       path = claire.find_font_file("RobotoMono-Regular")      # res/fonts first, then the system font directories
+
+import os
+import io
+import re
+import sys
+import json
+import functools
+from typing import (Dict, List, NamedTuple, Optional)
+from PIL import ImageFont
+
+
+DEFAULT_FONT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'res', 'fonts')
+
+FONT_WEIGHTS = {"thin": 100, "extralight": 200, "light": 300, "regular": 400, "medium": 500,
+                "semibold": 600, "bold": 700, "extrabold": 800, "black": 900}
+
+
+
+class FontFace(NamedTuple):
+    """
+    One font file, as described by its file name.
+    """
+
+    family: str
+    """
+    Family name as in the file name, e.g. 'JetBrainsMonoNL'
+    """
+    weight: int
+    """
+    CSS-style weight from 100 (Thin) to 900 (Black)
+    """
+    italic: bool
+    path: str
+
+
+def normalize_family(family: str) -> str:
+    return re.sub(r'[\s_-]', '', family).lower()
+
+
+def face_from_filename(path: str) -> FontFace:
+    """
+    Work out family, weight and style from a file name like 'JetBrainsMono-SemiBoldItalic.ttf'. Files without a
+    '-Style' part, like 'GeneraleMonoA.ttf', are taken as Regular.
+    """
+    stem = os.path.splitext(os.path.basename(path))[0]
+    family, _, style = stem.partition('-')
+    style = style.lower()
+    italic = style.endswith('italic')
+    if italic: style = style[:-len('italic')]
+    weight = FONT_WEIGHTS.get(style or 'regular', 400)
+    return FontFace(family, weight, italic, path)
+
+
+class FontRegistry:
+    """
+    Index of the fonts a FontDiscovery found (res/fonts first, then the system fonts), by the faces their file names
+    describe. Font files are only read when a face is first used, and (face, size) font objects are kept in a bounded
+    LRU so that ImageFont.truetype() isn't called again for every render. Glyph advance widths are cached per font too,
+    so measuring text doesn't have to go through FreeType.
+    """
+
+    def __init__(self, font_dirs: Optional[List[str]] = None, max_fonts: int = 64, max_glyph_metrics: int = 65536,
+                 discovery: Optional["FontDiscovery"] = None):
+        """
+        :param font_dirs: Directories to index, searched in order. Defaults to the search path of font_discovery.
+        :param max_fonts: How many (face, size) font objects to keep, and how many font files to keep the bytes of
+        :param max_glyph_metrics: How many glyph widths to keep over all fonts before the glyph cache is cleared
+        :param discovery: The FontDiscovery whose index is used. Defaults to font_discovery, or to a new one that
+                          doesn't save its index if font_dirs is given.
+        """
+        self.discovery = discovery or (FontDiscovery(font_dirs, cache_path='') if font_dirs else font_discovery)
+        self.font_dirs = self.discovery.search_path
+        self.max_glyph_metrics = max_glyph_metrics
+        self._glyph_widths = {}                                         # (path, size) -> {character: advance width}
+        self._glyph_count = 0
+        self._load_font = functools.lru_cache(maxsize=max_fonts)(self._load_font_uncached)
+        self._font_data = functools.lru_cache(maxsize=max_fonts)(self._read_font_file)     # path -> bytes, shared by its sizes
+
+    @property
+    def faces(self) -> Dict[str, List[FontFace]]:
+        """
+        The indexed faces, by normalized family name, from the index of the FontDiscovery.
+        """
+        return self.discovery.faces
+
+    def families(self) -> List[str]:
+        """
+        :return: The family names of all indexed fonts
+        """
+        return sorted({faces[0].family for faces in self.faces.values()})
+
+    def find(self, family: str, weight="Regular", italic: bool = False) -> FontFace:
+        """
+        Find the face of a family closest to the requested weight, preferring the requested style. Of equally close
+        faces, the one found first on the search path wins.
+
+        :param family: Family name, case and spaces don't matter ('JetBrains Mono', 'jetbrainsmono')
+        :param weight: Weight name ('Bold', 'Semi Bold', one of FONT_WEIGHTS) or number (700)
+        :param italic: Whether an italic face is wanted
+        :raises KeyError: If the family isn't indexed, or weight is a name that isn't in FONT_WEIGHTS
+        """
+        faces = self.faces.get(normalize_family(family))
+        if not faces:
+            raise KeyError(f"No font family {family!r} in {self.font_dirs}")
+        if isinstance(weight, str):
+            if normalize_family(weight) not in FONT_WEIGHTS:
+                raise KeyError(f"No font weight {weight!r}, use one of {', '.join(FONT_WEIGHTS)} or a number")
+            weight = FONT_WEIGHTS[normalize_family(weight)]
+        return min(faces, key=lambda face: (face.italic != italic, abs(face.weight - weight)))
+
+    @staticmethod
+    def _read_font_file(path: str) -> bytes:
+        with open(path, 'rb') as font_file: return font_file.read()
+
+    def _load_font_uncached(self, path: str, size: int) -> ImageFont.FreeTypeFont:
+        return ImageFont.truetype(io.BytesIO(self._font_data(path)), size)
+
+    def font(self, family: str, size: int, weight="Regular", italic: bool = False) -> ImageFont.FreeTypeFont:
+        """
+        :return: The font object for the closest matching face at the given size, from the cache when possible.
+        """
+        return self._load_font(self.find(family, weight, italic).path, size)
+
+    def font_from_path(self, path: str, size: int) -> ImageFont.FreeTypeFont:
+        """
+        Same as ImageFont.truetype(path, size), but cached.
+        """
+        return self._load_font(os.path.abspath(path), size)
+
+    def glyph_widths(self, path: str, size: int, text: str) -> List[float]:
+        """
+        :return: The advance width of every character of text, in pixels
+        """
+        widths = self._glyph_widths.get((path, size))
+        if widths is None:
+            widths = self._glyph_widths[(path, size)] = {}
+        missing = set(text).difference(widths)
+        if missing:
+            if self._glyph_count + len(missing) > self.max_glyph_metrics:
+                self._glyph_widths.clear()
+                self._glyph_count = 0
+                widths = self._glyph_widths[(path, size)] = {}
+                missing = set(text)
+            font = self._load_font(path, size)
+            for character in missing: widths[character] = font.getlength(character)
+            self._glyph_count += len(missing)
+        return [widths[character] for character in text]
+
+    def text_width(self, text: str, family: str, size: int, weight="Regular", italic: bool = False) -> float:
+        """
+        Measure text from the glyph cache. Kerning is ignored, which is exact for the monospaced fonts in res/fonts and
+        close enough for layout with the others.
+
+        :return: Width of the text in pixels
+        """
+        return sum(self.glyph_widths(self.find(family, weight, italic).path, size, text))
+
+    def cache_info(self) -> dict:
+        """
+        :return: Hits and misses of the font cache, and the number of cached glyph widths
+        """
+        info = self._load_font.cache_info()
+        return {"font_hits": info.hits, "font_misses": info.misses, "fonts_cached": info.currsize,
+                "font_files_read": self._font_data.cache_info().misses, "font_files_cached": self._font_data.cache_info().currsize,
+                "glyph_metrics": self._glyph_count}
+
+
+def system_font_dirs() -> List[str]:
+    """
+    :return: The usual font directories of this platform, whether they exist or not
+    """
+    home = os.path.expanduser('~')
+    if sys.platform.startswith('win'):
+        return [os.path.join(os.environ.get('WINDIR', 'C:\\Windows'), 'Fonts'),
+                os.path.join(os.environ.get('LOCALAPPDATA', os.path.join(home, 'AppData', 'Local')), 'Microsoft', 'Windows', 'Fonts')]
+    if sys.platform == 'darwin':
+        return ['/System/Library/Fonts', '/Library/Fonts', os.path.join(home, 'Library', 'Fonts')]
+    return ['/usr/share/fonts', '/usr/local/share/fonts', os.path.join(home, '.local', 'share', 'fonts'), os.path.join(home, '.fonts')]
+
+
+def default_font_index_path() -> str:
+    if sys.platform.startswith('win'): cache_dir = os.environ.get('LOCALAPPDATA', os.path.expanduser('~'))
+    else:                              cache_dir = os.environ.get('XDG_CACHE_HOME', os.path.join(os.path.expanduser('~'), '.cache'))
+    return os.path.join(cache_dir, 'clairecjs_utils', 'font_index.json')
+
+
+class FontDiscovery:
+    """
+    Finds font files on an explicit search path (res/fonts first, then the system font directories), never looking
+    more than max_depth directories down. What a scan found is saved in a small JSON file together with the mtime of
+    every directory that was scanned, so later runs only stat those directories instead of walking them, and lookups
+    within a run are dictionary work.
+    """
+
+    FONT_EXTENSIONS = ('.ttf', '.otf')
+
+    def __init__(self, search_path: Optional[List[str]] = None, max_depth: int = 4, cache_path: Optional[str] = None):
+        """
+        :param search_path: Directories to search, in order. Defaults to res/fonts and then system_font_dirs().
+        :param max_depth: How many levels of subdirectories are searched below each directory
+        :param cache_path: Where to save the index. Defaults to default_font_index_path(). Pass '' to not save it.
+        """
+        self.search_path = [os.path.abspath(path) for path in (search_path or [DEFAULT_FONT_DIR] + system_font_dirs())]
+        self.max_depth = max_depth
+        self.cache_path = default_font_index_path() if cache_path is None else cache_path
+        self._fonts = None
+        self._faces = None
+        self._found = {}
+        self.scanned = False
+
+    def scan_dir(self, top: str, dir_mtimes: Dict[str, float]) -> List[str]:
+        fonts = []
+        top_depth = top.rstrip(os.sep).count(os.sep)
+        for root, dirs, files in os.walk(top):
+            try:               dir_mtimes[root] = os.stat(root).st_mtime
+            except OSError:    continue
+            if root.rstrip(os.sep).count(os.sep) - top_depth >= self.max_depth: dirs.clear()
+            dirs.sort()
+            fonts.extend(os.path.join(root, file) for file in sorted(files) if file.lower().endswith(self.FONT_EXTENSIONS))
+        return fonts
+
+    def load_index(self) -> Optional[List[str]]:
+        """
+        :return: The fonts from the saved index if it was made for the same search path and no directory changed since
+        """
+        if not self.cache_path:
+            return None
+        try:
+            with open(self.cache_path, encoding='utf8') as index_file:
+                index = json.load(index_file)
+        except (OSError, ValueError):
+            return None
+        if not (isinstance(index, dict) and isinstance(index.get('dir_mtimes'), dict) and isinstance(index.get('fonts'), list)
+                and all(isinstance(font, str) for font in index['fonts'])):
+            return None                                                 # not an index this version wrote, so scan again
+        if index.get('search_path') != self.search_path or index.get('max_depth') != self.max_depth:
+            return None
+        for directory, mtime in index['dir_mtimes'].items():
+            try:
+                if os.stat(directory).st_mtime != mtime: return None
+            except (OSError, TypeError, ValueError):
+                return None
+        for directory in self.search_path:                              # a search directory that didn't exist before may exist now
+            if directory not in index['dir_mtimes'] and os.path.isdir(directory): return None
+        return index['fonts']
+
+    def save_index(self, fonts: List[str], dir_mtimes: Dict[str, float]):
+        if not self.cache_path:
+            return
+        try:
+            os.makedirs(os.path.dirname(self.cache_path), exist_ok=True)
+            temp_path = f"{self.cache_path}.{os.getpid()}.tmp"
+            with open(temp_path, 'w', encoding='utf8') as index_file:
+                json.dump({'search_path': self.search_path, 'max_depth': self.max_depth, 'dir_mtimes': dir_mtimes, 'fonts': fonts}, index_file)
+            os.replace(temp_path, self.cache_path)
+        except OSError:
+            pass                                                        # not being able to save the index only costs a rescan next time
+
+    @property
+    def fonts(self) -> List[str]:
+        """
+        All font files on the search path, in search order.
+        """
+        if self._fonts is None:
+            fonts = self.load_index()
+            if fonts is None:
+                dir_mtimes = {}
+                fonts = [font for directory in self.search_path for font in self.scan_dir(directory, dir_mtimes)]
+                self.save_index(fonts, dir_mtimes)
+                self.scanned = True
+            self._fonts = fonts
+        return self._fonts
+
+    @property
+    def faces(self) -> Dict[str, List[FontFace]]:
+        """
+        The faces of all font files, by normalized family name, each list in search order.
+        """
+        if self._faces is None:
+            faces = {}
+            for font in self.fonts:
+                face = face_from_filename(font)
+                faces.setdefault(normalize_family(face.family), []).append(face)
+            self._faces = faces
+        return self._faces
+
+    def find(self, name: Optional[str] = None) -> Optional[str]:
+        """
+        :param name: Part of the file name to look for, case doesn't matter. None finds the first font of all.
+        :return: The path of the first matching font file, or None if there isn't one
+        """
+        name = name.lower() if name else ''
+        if name not in self._found:
+            self._found[name] = next((font for font in self.fonts if name in os.path.basename(font).lower()), None)
+        return self._found[name]
+
+
+font_discovery = FontDiscovery()
+font_registry  = FontRegistry()     # both index nothing until first used
+
+
+def get_font(family: str, size: int, weight="Regular", italic: bool = False) -> ImageFont.FreeTypeFont: return font_registry.font(family, size, weight, italic)
+def text_width(text: str, family: str, size: int, weight="Regular", italic: bool = False) -> float:     return font_registry.text_width(text, family, size, weight, italic)
+
+
+def find_font_file(name: Optional[str] = None) -> Optional[str]: return font_discovery.find(name)
+
+
+def find_first_ttf_file(start_dir: Optional[str] = None) -> Optional[str]:
+    """
+    Find the first .ttf file: in start_dir (at most a few levels down) if given, then in res/fonts, then in the system
+    font directories. Unlike the old version, this never walks up through the parent directories.
+
+    :param start_dir: A directory to search first
+    :return: The path of the first .ttf file found, or None if no file is found.
+    """
+    if start_dir is not None:
+        for font in FontDiscovery([start_dir], cache_path='').fonts:
+            if font.lower().endswith('.ttf'): return font
+    for font in font_discovery.fonts:
+        if font.lower().endswith('.ttf'): return font
+    return None
+
+
+if __name__ == "__main__":
+    for family in font_registry.families():
+        faces = font_registry.faces[normalize_family(family)]
+        print(f"{family:>20}: " + ", ".join(str(face.weight) + ("i" if face.italic else "") for face in faces))
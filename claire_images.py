@@ -0,0 +1,266 @@
+#TO USE: import clairecjs_utils as claire
+#
+#       region = claire.background_cache.crop(800, 480, (10, 10, 300, 60))     # numpy view of what's behind a text box
+#       changed = claire.text_effects.draw(image, (10, 10), "Excuse Me?", font_path, 40, claire.TextEffect(shadow_offset=(2, 2)))
+
+import os
+import re
+import time
+import collections
+import functools
+import hashlib
+import numpy as np
+from PIL import Image, ImageDraw, ImageFilter, ImageEnhance
+from typing import (Dict, List, NamedTuple, Optional, Tuple)
+
+
+DEFAULT_BACKGROUND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'res', 'backgrounds')
+
+Rect = Tuple[int, int, int, int]                    # x, y, width, height
+
+
+
+class BackgroundCache:
+    """
+    Decodes each background image in res/backgrounds once and keeps it as a read-only RGB numpy array, so composites
+    don't decode and .copy() the whole background every time. crop() hands out views of just the region behind a
+    text box, so only that rectangle needs to be copied and composited per update.
+
+    Backgrounds are named like '800x480_circuit.png' and looked up by screen size and name. The cache is bounded by
+    max_bytes and drops the least recently used backgrounds first.
+    """
+
+    FILENAME_PATTERN = re.compile(r'^(\d+)x(\d+)_(.+)\.(png|jpg|jpeg)$', re.IGNORECASE)
+    PREFERRED_EXTENSIONS = ('png', 'jpg', 'jpeg')                       # PNG first, it's lossless
+
+    def __init__(self, background_dir: str = DEFAULT_BACKGROUND_DIR, max_bytes: int = 32 * 1024 * 1024):
+        """
+        :param background_dir: Directory of the background images
+        :param max_bytes: How much decoded pixel data to keep
+        """
+        self.background_dir = background_dir
+        self.max_bytes = max_bytes
+        self.decoded = collections.OrderedDict()                        # path -> read-only array, least recently used first
+        self.decode_seconds = {}                                        # path -> how long decoding it took
+        self.cached_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.decode_time_saved = 0.0
+        self._backgrounds = None
+
+    def backgrounds(self) -> Dict[Tuple[int, int, str], List[str]]:
+        """
+        :return: Background files by (width, height, name), best format first. The directory is only listed once.
+        """
+        if self._backgrounds is not None:
+            return self._backgrounds
+        found = {}
+        for file in sorted(os.listdir(self.background_dir)):
+            match = self.FILENAME_PATTERN.match(file)
+            if match:
+                width, height, name, extension = match.groups()
+                found.setdefault((int(width), int(height), name), []).append((self.PREFERRED_EXTENSIONS.index(extension.lower()), os.path.join(self.background_dir, file)))
+        self._backgrounds = {key: [path for _, path in sorted(paths)] for key, paths in found.items()}
+        return self._backgrounds
+
+    def find(self, width: int, height: int, name: str = "circuit") -> str:
+        """
+        :return: The path of the background for a screen size
+        :raises KeyError: If there is no such background
+        """
+        paths = self.backgrounds().get((width, height, name))
+        if not paths:
+            raise KeyError(f"No {width}x{height} {name!r} background in {self.background_dir}")
+        return paths[0]
+
+    def get_path(self, path: str) -> np.ndarray:
+        """
+        :return: The decoded image as a read-only array of shape (height, width, 3)
+        """
+        pixels = self.decoded.get(path)
+        if pixels is not None:
+            self.decoded.move_to_end(path)
+            self.hits += 1
+            self.decode_time_saved += self.decode_seconds[path]
+            return pixels
+
+        self.misses += 1
+        start = time.perf_counter()
+        with Image.open(path) as image:
+            pixels = np.asarray(image.convert("RGB"))
+        pixels.flags.writeable = False
+        self.decode_seconds[path] = time.perf_counter() - start
+
+        self.decoded[path] = pixels
+        self.cached_bytes += pixels.nbytes
+        while self.cached_bytes > self.max_bytes and len(self.decoded) > 1:
+            _, evicted = self.decoded.popitem(last=False)
+            self.cached_bytes -= evicted.nbytes
+            self.evictions += 1
+        return pixels
+
+    def get(self, width: int, height: int, name: str = "circuit") -> np.ndarray:
+        """
+        :return: The decoded background for a screen size, as a read-only array of shape (height, width, 3)
+        """
+        return self.get_path(self.find(width, height, name))
+
+    def crop(self, width: int, height: int, rect: Rect, name: str = "circuit") -> np.ndarray:
+        """
+        :param rect: (x, y, width, height) of the region, clipped to the background
+        :return: A read-only view of the region, no pixels are copied
+        """
+        x, y, rect_width, rect_height = rect
+        return self.get(width, height, name)[max(0, y):y + rect_height, max(0, x):x + rect_width]
+
+    def crop_image(self, width: int, height: int, rect: Rect, name: str = "circuit") -> Image.Image:
+        """
+        :return: The region as a new PIL image to draw on. Only the region is copied.
+        """
+        return Image.fromarray(self.crop(width, height, rect, name))
+
+    def stats(self) -> dict:
+        """
+        :return: Hit, miss and eviction counts, cached bytes and the decode time the hits saved, in seconds
+        """
+        return {"hits": self.hits, "misses": self.misses, "evictions": self.evictions,
+                "cached_bytes": self.cached_bytes, "decode_time_saved": self.decode_time_saved}
+
+
+background_cache = BackgroundCache()
+
+
+class TextEffect(NamedTuple):
+    """
+    How text is drawn: its color, an optional drop shadow, and what is done to the background right behind it.
+    """
+
+    fill: Tuple[int, int, int] = (0, 255, 0)
+    shadow_offset: Optional[Tuple[int, int]] = None
+    """
+    (dx, dy) of the drop shadow, or None for no shadow
+    """
+    shadow_color: Tuple[int, int, int] = (0, 0, 0)
+    blur_radius: float = 0
+    """
+    Gaussian blur radius applied to the background behind the text, 0 for none
+    """
+    contrast: float = 1.0
+    """
+    Contrast factor for the background behind the text, around the mean of that region. 1.0 leaves it alone.
+    """
+
+
+def union_rect(a: Rect, b: Rect) -> Rect:
+    left, top = min(a[0], b[0]), min(a[1], b[1])
+    return left, top, max(a[0] + a[2], b[0] + b[2]) - left, max(a[1] + a[3], b[1] + b[3]) - top
+
+
+def clip_rect(rect: Rect, width: int, height: int) -> Rect:
+    left, top = max(0, rect[0]), max(0, rect[1])
+    return left, top, max(0, min(width, rect[0] + rect[2]) - left), max(0, min(height, rect[1] + rect[3]) - top)
+
+
+class TextEffects:
+    """
+    Draws text with shadow, blur and contrast effects while only touching the region around the text: its bounding
+    box, plus the shadow, padded by the blur radius so the blur sees the right neighbours. The full-frame way of doing
+    this (see test/test_font_attributes.py) copies, blurs or enhances the whole 800x480 image for every variant.
+
+    Rasterized text is cached by (text, font, size) as an alpha mask, which every effect reuses: the shadow and the
+    text are both pasted through it, which is what ImageDraw.text() does internally. Text drawn with blur or contrast
+    is also cached as the finished region, by (text, font, size, effect, position) and a hash of the background pixels
+    the effect reads, so redrawing the same text on the same background is one paste.
+    """
+
+    def __init__(self, fonts=None, max_cached: int = 512, max_cached_regions: int = 128):
+        """
+        :param fonts: A claire_fonts.FontRegistry to load fonts from. Defaults to claire_fonts.font_registry.
+        :param max_cached: How many text masks to keep
+        :param max_cached_regions: How many finished blur/contrast regions to keep
+        """
+        if fonts is None:
+            try:                from .claire_fonts import font_registry as fonts
+            except ImportError: from claire_fonts  import font_registry as fonts
+        self.fonts = fonts
+        self.text_mask = functools.lru_cache(maxsize=max_cached)(self._text_mask_uncached)
+        self.regions = collections.OrderedDict()                        # key -> finished region, least recently used first
+        self.max_cached_regions = max_cached_regions
+        self.region_hits = 0
+        self.region_misses = 0
+
+    def _text_mask_uncached(self, text: str, font_path: str, size: int) -> Tuple[Image.Image, Rect]:
+        font = self.fonts.font_from_path(font_path, size)
+        left, top, right, bottom = font.getbbox(text)
+        mask = Image.new("L", (max(1, right - left), max(1, bottom - top)))
+        ImageDraw.Draw(mask).text((-left, -top), text, font=font, fill=255)
+        return mask, (left, top, right - left, bottom - top)
+
+    def text_rect(self, xy: Tuple[int, int], text: str, font_path: str, size: int, effect: TextEffect = TextEffect()) -> Rect:
+        """
+        :return: The (x, y, width, height) of everything the text and its effects change, before clipping to the image
+        """
+        _, (left, top, width, height) = self.text_mask(text, font_path, size)
+        rect = (xy[0] + left, xy[1] + top, width, height)
+        if effect.shadow_offset:
+            rect = union_rect(rect, (rect[0] + effect.shadow_offset[0], rect[1] + effect.shadow_offset[1], width, height))
+        return rect
+
+    def draw(self, image: Image.Image, xy: Tuple[int, int], text: str, font_path: str, size: int, effect: TextEffect = TextEffect()) -> Rect:
+        """
+        Draw text onto an RGB image in place, with the effect applied around it.
+
+        :param image: The image to draw on
+        :param xy: Position of the text, like ImageDraw.text()
+        :return: The rectangle of the image that changed
+        """
+        rect = clip_rect(self.text_rect(xy, text, font_path, size, effect), *image.size)
+        if not rect[2] or not rect[3]:
+            return rect
+        x, y, width, height = rect
+
+        key = None
+        if effect.blur_radius or effect.contrast != 1.0:
+            pad = int(effect.blur_radius * 3 + 0.5)                   # PIL's gaussian kernel reaches about 3 sigma
+            px, py, pwidth, pheight = clip_rect((x - pad, y - pad, width + 2 * pad, height + 2 * pad), *image.size)
+            region = image.crop((px, py, px + pwidth, py + pheight))
+            key = (text, font_path, size, effect, xy, (px, py, pwidth, pheight), hashlib.blake2b(region.tobytes(), digest_size=16).digest())
+            cached = self.regions.get(key)
+            if cached is not None:
+                self.regions.move_to_end(key)
+                self.region_hits += 1
+                image.paste(cached, (x, y))
+                return rect
+            self.region_misses += 1
+            if effect.contrast != 1.0:
+                region = ImageEnhance.Contrast(region).enhance(effect.contrast)
+            if effect.blur_radius:
+                region = region.filter(ImageFilter.GaussianBlur(radius=effect.blur_radius))
+            image.paste(region.crop((x - px, y - py, x - px + width, y - py + height)), (x, y))
+
+        mask, (left, top, _, _) = self.text_mask(text, font_path, size)
+        if effect.shadow_offset:
+            image.paste(effect.shadow_color, (xy[0] + left + effect.shadow_offset[0], xy[1] + top + effect.shadow_offset[1]), mask)
+        image.paste(effect.fill, (xy[0] + left, xy[1] + top), mask)
+        if key is not None:
+            self.regions[key] = image.crop((x, y, x + width, y + height))
+            if len(self.regions) > self.max_cached_regions:
+                self.regions.popitem(last=False)
+        return rect
+
+    def cache_info(self):
+        return self.text_mask.cache_info()
+
+    def region_cache_info(self) -> dict:
+        return {"hits": self.region_hits, "misses": self.region_misses, "cached": len(self.regions)}
+
+
+text_effects = TextEffects()
+
+
+if __name__ == "__main__":
+    for (width, height, name), paths in background_cache.backgrounds().items():
+        for _ in range(10): background_cache.get(width, height, name)
+        print(f"{width}x{height} {name}: {', '.join(os.path.basename(path) for path in paths)}")
+    print(background_cache.stats())
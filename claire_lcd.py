@@ -0,0 +1,554 @@
+#TO USE: import clairecjs_utils as claire
+#
+#Helpers for driving the now-playing LCD panel through the turing_smart_screen-python drivers (LcdCommRevA-D,
+#LcdSimulated) that claire_winamp loads. The drivers are passed in as objects, so this module doesn't import them.
+
+import sys
+import time
+import collections
+import numpy as np
+from PIL import Image, ImageDraw
+from typing import (Callable, Dict, Tuple, List, Optional, Union)
+
+try:                from .claire_logging import get_logger
+except ImportError: from claire_logging  import get_logger
+logger = get_logger(__name__)
+
+Rect = Tuple[int, int, int, int]                    # x, y, width, height
+
+
+
+def changed_tiles(previous: np.ndarray, current: np.ndarray, tile: int) -> np.ndarray:
+    """
+    Compare two frames and return which tiles changed.
+
+    :param previous: The last frame, shape (height, width, channels)
+    :param current: The new frame, same shape
+    :param tile: Tile size in pixels
+    :return: Boolean array of shape (ceil(height/tile), ceil(width/tile)), True where any pixel in the tile changed
+    """
+    height, width, channels = current.shape
+    changed = previous != current
+    rows, cols = -(-height // tile), -(-width // tile)
+    if rows * tile != height or cols * tile != width:
+        changed = np.pad(changed, ((0, rows * tile - height), (0, cols * tile - width), (0, 0)))
+    return changed.reshape(rows, tile, cols, tile * channels).any(axis=3).any(axis=1)     # one axis at a time is much faster than any(axis=(1, 3))
+
+
+def tiles_to_rects(tiles: np.ndarray, tile: int, width: int, height: int) -> List[Rect]:
+    """
+    Merge changed tiles into rectangles: runs of tiles in a row are joined, then runs with the same columns in
+    consecutive rows are stacked.
+
+    :return: List of (x, y, width, height) rectangles in pixels, clipped to the frame
+    """
+    rects = []
+    open_runs = {}                                  # (first col, last col) -> [first row, last row]
+    for row in range(tiles.shape[0]):
+        runs = []
+        cols = np.flatnonzero(tiles[row])
+        if len(cols):
+            breaks = np.flatnonzero(np.diff(cols) != 1)
+            starts = np.concatenate(([cols[0]], cols[breaks + 1]))
+            ends   = np.concatenate((cols[breaks], [cols[-1]]))
+            runs   = list(zip(starts.tolist(), ends.tolist()))
+        still_open = {}
+        for run in runs:
+            if run in open_runs: open_runs[run][1] = row ; still_open[run] = open_runs.pop(run)
+            else:                still_open[run] = [row, row]
+        for (first_col, last_col), (first_row, last_row) in open_runs.items():
+            rects.append((first_col, first_row, last_col, last_row))
+        open_runs = still_open
+    for (first_col, last_col), (first_row, last_row) in open_runs.items():
+        rects.append((first_col, first_row, last_col, last_row))
+
+    return [(first_col * tile, first_row * tile,
+             min(width,  (last_col + 1) * tile) - first_col * tile,
+             min(height, (last_row + 1) * tile) - first_row * tile) for first_col, first_row, last_col, last_row in rects]
+
+
+class Rgb565Converter:
+    """
+    Converts RGB888 pixels to the RGB565 the panels take, with NumPy bit operations into reused buffers: one output
+    and one scratch buffer per region size, so pushing the same regions frame after frame allocates nothing. Works on
+    strided views (e.g. a rectangle of a frame) without copying them first.
+    """
+
+    def __init__(self, little_endian: bool = True, max_buffers: int = 32):
+        """
+        :param little_endian: Byte order of the panel. LcdCommRevA takes little endian.
+        :param max_buffers: How many region sizes to keep buffers for
+        """
+        self.little_endian = little_endian
+        self.max_buffers = max_buffers
+        self.buffers = collections.OrderedDict()        # (height, width) -> (output, scratch), least recently used first
+        self.allocations = 0
+
+    def buffers_for(self, height: int, width: int) -> Tuple[np.ndarray, np.ndarray]:
+        buffers = self.buffers.get((height, width))
+        if buffers is None:
+            buffers = self.buffers[(height, width)] = (np.empty((height, width), dtype=np.uint16), np.empty((height, width), dtype=np.uint16))
+            self.allocations += 1
+            if len(self.buffers) > self.max_buffers: self.buffers.popitem(last=False)
+        else:
+            self.buffers.move_to_end((height, width))
+        return buffers
+
+    def convert(self, pixels: np.ndarray) -> memoryview:
+        """
+        :param pixels: Array of shape (height, width, 3), uint8
+        :return: The RGB565 bytes, as a view of a reused buffer: valid until the next conversion of the same size
+        """
+        out, scratch = self.buffers_for(pixels.shape[0], pixels.shape[1])
+        np.copyto(out, pixels[..., 0])     ; out     &= 0xF8 ; out     <<= 8
+        np.copyto(scratch, pixels[..., 1]) ; scratch &= 0xFC ; scratch <<= 3 ; out |= scratch
+        np.copyto(scratch, pixels[..., 2]) ; scratch >>= 3                   ; out |= scratch
+        if self.little_endian != (sys.byteorder == "little"):
+            out.byteswap(inplace=True)
+        return memoryview(out).cast("B")
+
+
+def takes_raw_rgb565(lcd) -> bool:
+    """
+    :return: True for drivers whose bitmap command is sent raw RGB565 by push_region(), currently LcdCommRevA
+    """
+    return type(lcd).__name__ == "LcdCommRevA"
+
+
+def push_region(lcd, pixels: np.ndarray, x: int, y: int, converter: Optional[Rgb565Converter] = None):
+    """
+    Push a region of pixels to the panel at (x, y). For LcdCommRevA the pixels go through the converter and are sent
+    with the bitmap command the same way its DisplayPILImage() does after converting. Other drivers get a PIL image
+    through DisplayPILImage() and convert by themselves.
+
+    :param pixels: Array of shape (height, width, 3), uint8. May be a view into a bigger frame.
+    :param converter: Conversion step to use for LcdCommRevA. Defaults to a new little endian Rgb565Converter.
+    """
+    if not takes_raw_rgb565(lcd):
+        lcd.DisplayPILImage(Image.fromarray(pixels), x, y)
+        return
+
+    from library.lcd.lcd_comm_rev_a import Command
+    height, width = pixels.shape[:2]
+    data = (converter or Rgb565Converter(little_endian=True)).convert(pixels)
+    lcd.SendCommand(Command.DISPLAY_BITMAP, x, y, x + width - 1, y + height - 1)
+    queued = getattr(lcd, "update_queue", None) is not None             # queued lines are written later, so they can't point into the buffer
+    chunk = lcd.get_width() * 8
+    with lcd.update_queue_mutex:
+        for start in range(0, len(data), chunk):
+            line = data[start:start + chunk]
+            lcd.SendLine(bytes(line) if queued else line)
+
+
+class DirtyRegionRenderer:
+    """
+    Retained-mode renderer for an LCD driver. Keeps the last frame that was pushed to the panel, and for every new frame
+    only sends the rectangles that changed, through the driver's DisplayPILImage(image, x, y) partial bitmap call.
+
+    Sample use:
+        renderer = DirtyRegionRenderer(lcd)
+        renderer.render(frame)                  # PIL image or numpy array of the whole screen
+    """
+
+    BYTES_PER_PIXEL = 2
+    """
+    The panels take RGB565, so every pixel sent costs two bytes on the serial link.
+    """
+
+    def __init__(self, lcd, width: Optional[int] = None, height: Optional[int] = None, tile: int = 16, full_frame_ratio: float = 0.6,
+                 converter: Optional[Rgb565Converter] = None):
+        """
+        :param lcd: An LcdComm driver, or anything with DisplayPILImage(image, x, y)
+        :param width: Screen width. Defaults to lcd.get_width()
+        :param height: Screen height. Defaults to lcd.get_height()
+        :param tile: Size in pixels of the tiles that frames are compared in
+        :param full_frame_ratio: If at least this much of the screen changed, send the whole frame in one go
+        :param converter: RGB565 conversion step used by push_region(). Defaults to a little endian Rgb565Converter.
+        """
+        self.lcd = lcd
+        self.converter = converter or Rgb565Converter(little_endian=True)
+        self.width  = width  or lcd.get_width()
+        self.height = height or lcd.get_height()
+        self.tile = tile
+        self.full_frame_ratio = full_frame_ratio
+        self.previous = None
+        self.frames = 0
+        self.rects_sent = 0
+        self.bytes_sent = 0
+        self.render_time = 0.0
+
+    def invalidate(self):
+        """
+        Forget what is on the panel, so the next frame is sent in full.
+        """
+        self.previous = None
+
+    def dirty_rects(self, frame: np.ndarray) -> List[Rect]:
+        """
+        :param frame: The new frame as an array of shape (height, width, 3)
+        :return: The rectangles that differ from the last frame pushed to the panel
+        """
+        if self.previous is None:
+            return [(0, 0, self.width, self.height)]
+        tiles = changed_tiles(self.previous, frame, self.tile)
+        if tiles.mean() >= self.full_frame_ratio:
+            return [(0, 0, self.width, self.height)]
+        return tiles_to_rects(tiles, self.tile, self.width, self.height)
+
+    def push(self, frame: np.ndarray, rect: Rect):
+        x, y, width, height = rect
+        push_region(self.lcd, frame[y:y + height, x:x + width], x, y, self.converter)
+
+    def render(self, frame) -> List[Rect]:
+        """
+        Push a frame to the panel, sending only what changed.
+
+        :param frame: The whole screen as a PIL image or a numpy array of shape (height, width, 3)
+        :return: The rectangles that were sent
+        """
+        start = time.perf_counter()
+        if isinstance(frame, Image.Image):
+            frame = np.asarray(frame.convert("RGB"))
+        if frame.shape[:2] != (self.height, self.width):
+            raise ValueError(f"Frame is {frame.shape[1]}x{frame.shape[0]}, screen is {self.width}x{self.height}")
+
+        rects = self.dirty_rects(frame)
+        for rect in rects:
+            self.push(frame, rect)
+            self.bytes_sent += rect[2] * rect[3] * self.BYTES_PER_PIXEL
+        if self.previous is None or len(rects) == 1 and rects[0] == (0, 0, self.width, self.height):
+            self.previous = frame.copy()
+        else:
+            for x, y, width, height in rects: self.previous[y:y + height, x:x + width] = frame[y:y + height, x:x + width]
+        self.frames += 1
+        self.rects_sent += len(rects)
+        self.render_time += time.perf_counter() - start
+        return rects
+
+    def stats(self) -> dict:
+        """
+        :return: Frame, rectangle and byte counts, and how many bytes full frames would have cost.
+        """
+        full_frame_bytes = self.frames * self.width * self.height * self.BYTES_PER_PIXEL
+        return {"frames": self.frames, "rects_sent": self.rects_sent, "bytes_sent": self.bytes_sent,
+                "full_frame_bytes": full_frame_bytes, "fps": self.frames / self.render_time if self.render_time else 0.0}
+
+
+class Marquee:
+    """
+    Scrolls a title that is too long for its box. The title is rendered once into a strip holding the title, a gap,
+    and the start of the title again, so every scroll position is a plain slice of the strip, pushed to the panel as one
+    partial update. The strip is only rendered again when the title changes. Titles that fit are drawn once and not
+    scrolled.
+
+    Sample use:
+        marquee = Marquee(lcd, (0, 400, 800, 48), get_font("JetBrains Mono", 36))
+        marquee.set_title(w.get_trackinfo_raw())
+        while True: marquee.step() ; time.sleep(1 / 30)
+    """
+
+    def __init__(self, lcd, rect: Rect, font, fill: Tuple[int, int, int] = (0, 255, 0),
+                 background: Union[Tuple[int, int, int], np.ndarray] = (0, 0, 0), gap: int = 64, step: int = 2,
+                 converter: Optional[Rgb565Converter] = None):
+        """
+        :param lcd: An LcdComm driver, or anything with DisplayPILImage(image, x, y)
+        :param rect: (x, y, width, height) of the box on the screen
+        :param font: PIL font to draw the title with
+        :param fill: Text color
+        :param background: Background color, or an array of shape (height, width, 3) with what is behind the box
+        :param gap: Pixels between the end of the title and its start coming round again
+        :param step: Pixels scrolled per step()
+        :param converter: RGB565 conversion step used by push_region(). Defaults to a little endian Rgb565Converter.
+        """
+        self.lcd = lcd
+        self.rect = rect
+        self.font = font
+        self.fill = fill
+        self.background = background
+        self.gap = gap
+        self.step_size = step
+        self.converter = converter or Rgb565Converter(little_endian=True)
+        self.title = None
+        self.strip = None                           # (height, period + width, 3) for solid backgrounds, else alpha (height, period + width)
+        self.period = 0
+        self.offset = 0
+        self.scrolling = False
+        self.buffer = None
+        self.renders = 0
+        self.frames_pushed = 0
+
+    def render_strip(self, title: str):
+        x, y, width, height = self.rect
+        left, top, right, bottom = self.font.getbbox(title)
+        text_width = right - left
+        self.scrolling = text_width > width
+        self.period = text_width + self.gap if self.scrolling else width
+        mask = Image.new("L", (self.period + width if self.scrolling else width, height))
+        d = ImageDraw.Draw(mask)
+        text_y = (height - (bottom - top)) // 2 - top
+        d.text((-left, text_y), title, font=self.font, fill=255)
+        if self.scrolling:
+            d.text((self.period - left, text_y), title, font=self.font, fill=255)     # wrap-around copy
+        alpha = np.asarray(mask, dtype=np.float32) / 255.0
+
+        if isinstance(self.background, np.ndarray):
+            self.strip = alpha                                                          # composited per frame over the background
+            self.buffer = np.empty((height, width, 3), dtype=np.uint8)
+        else:
+            background = np.asarray(self.background, dtype=np.float32)
+            self.strip = (background + (np.asarray(self.fill, dtype=np.float32) - background) * alpha[..., None] + 0.5).astype(np.uint8)
+        self.renders += 1
+
+    def set_title(self, title: str):
+        """
+        Show a new title. Does nothing if it's the same title.
+        """
+        if title == self.title:
+            return
+        self.title = title
+        self.offset = 0
+        self.render_strip(title)
+        self.push()
+
+    def frame(self) -> np.ndarray:
+        """
+        :return: The pixels of the box at the current scroll position. For solid backgrounds this is a view of the strip.
+        """
+        width = self.rect[2]
+        window = self.strip[:, self.offset:self.offset + width]
+        if self.buffer is None:
+            return window
+        alpha = window[..., None]
+        np.add(self.background, (np.asarray(self.fill, dtype=np.float32) - self.background) * alpha + 0.5, out=self.buffer, casting="unsafe")
+        return self.buffer
+
+    def push(self):
+        push_region(self.lcd, self.frame(), self.rect[0], self.rect[1], self.converter)
+        self.frames_pushed += 1
+
+    def step(self) -> bool:
+        """
+        Scroll one step and push the box to the panel.
+
+        :return: False if the title fits and nothing was pushed
+        """
+        if not self.scrolling:
+            return False
+        self.offset = (self.offset + self.step_size) % self.period
+        self.push()
+        return True
+
+
+class Widget:
+    """
+    One part of the dashboard for FrameScheduler: a render function, how often it wants to be redrawn, and how
+    important it is.
+    """
+
+    def __init__(self, name: str, render: Callable[[], Optional[Tuple[np.ndarray, int, int]]], interval: float, priority: int = 0):
+        """
+        :param name: Name for the stats
+        :param render: Function returning (pixels, x, y) to push, or None if there is nothing new to show
+        :param interval: Seconds between redraws
+        :param priority: Higher goes first and is dropped last when the link falls behind
+        """
+        self.name = name
+        self.render = render
+        self.interval = interval
+        self.priority = priority
+        self.next_due = 0.0
+        self.skips_in_a_row = 0
+        self.pushes = 0
+        self.skips = 0
+        self.bytes_sent = 0
+        self.last_bytes = 0
+        self.render_time = 0.0
+        self.push_time = 0.0
+
+    def stats(self) -> dict:
+        return {"pushes": self.pushes, "skips": self.skips, "bytes_sent": self.bytes_sent,
+                "avg_render_ms": self.render_time / self.pushes * 1000 if self.pushes else 0.0,
+                "avg_push_ms": self.push_time / self.pushes * 1000 if self.pushes else 0.0}
+
+
+class FrameScheduler:
+    """
+    Runs the dashboard widgets (title, progress bar, clock, album art...) at a target frame rate. Each frame the widgets
+    that are due are pushed in priority order while the frame's byte budget lasts. The budget comes from the measured
+    throughput of the link, so when a slow serial link falls behind, lower-priority widgets are skipped and stay due;
+    the next frame that has room pushes their latest state, so a backlog never builds up. A widget's size is guessed
+    from its last push.
+
+    A driver that writes to the serial port as it is called is measured by how long each push takes. A driver with an
+    update_queue (the turing app's threaded mode) returns before anything is written, so there the throughput is
+    measured from how fast its queue drains, and a frame is skipped altogether while the queue holds more than a
+    frame's worth of bytes. The highest-priority due widget is always pushed first. The others move up the line for every
+    frame they are skipped, and one skipped max_skips frames in a row is pushed even over budget, after the widgets
+    that outrank it, so nothing starves for good.
+
+    Sample use:
+        scheduler = FrameScheduler(lcd, target_fps=15)
+        scheduler.add_widget("progress", draw_progress_bar, interval=1 / 15, priority=10)
+        scheduler.add_widget("clock", draw_clock, interval=1.0, priority=5)
+        scheduler.run()
+    """
+
+    MIN_SAMPLE_SECONDS = 0.001
+    """
+    Throughput samples over less time than this are ignored; they say more about the clock than about the link.
+    """
+
+    def __init__(self, lcd, target_fps: float = 15.0, converter: Optional[Rgb565Converter] = None, clock=time.monotonic,
+                 initial_bytes_per_second: float = 1e6, max_skips: int = 8):
+        """
+        :param lcd: An LcdComm driver, or anything with DisplayPILImage(image, x, y)
+        :param target_fps: Frames per second to aim for
+        :param converter: RGB565 conversion step used by push_region(). Defaults to a little endian Rgb565Converter.
+        :param clock: Function returning the current time in seconds, for testing
+        :param initial_bytes_per_second: Link throughput to assume until it has been measured
+        :param max_skips: Frames in a row a widget can be skipped before it is pushed over budget
+        """
+        self.lcd = lcd
+        self.target_fps = target_fps
+        self.converter = converter or Rgb565Converter(little_endian=True)
+        self.clock = clock
+        self.widgets = {}
+        self.bytes_per_second = initial_bytes_per_second
+        self.max_skips = max_skips
+        self.queued = collections.deque()                               # [items, bytes] per push still in the driver's update_queue
+        self.queued_items = 0
+        self.queued_bytes = 0.0
+        self.drained_bytes = 0.0                                        # bytes the driver wrote since drained_since
+        self.drained_since = None
+        self.frames = 0
+        self.late_frames = 0
+        self.backpressure_frames = 0
+
+    def backlog(self) -> Optional[int]:
+        """
+        :return: Items waiting in the driver's update_queue, or None if the driver writes as it is called
+        """
+        queue = getattr(self.lcd, "update_queue", None)
+        return queue.qsize() if queue is not None else None
+
+    def measure(self, bytes_per_second: float):
+        self.bytes_per_second += 0.2 * (bytes_per_second - self.bytes_per_second)
+
+    def account_drained(self, backlog: int):
+        """
+        Take what the driver has written since we last looked off the front of our pushes still in its queue.
+        """
+        excess = self.queued_items - backlog
+        while excess > 0 and self.queued:
+            items, size = self.queued[0]
+            done = min(items, excess)
+            part = size * done / items
+            if done == items: self.queued.popleft()
+            else:             self.queued[0] = [items - done, size - part]
+            self.queued_items -= done
+            self.queued_bytes -= part
+            self.drained_bytes += part
+            excess -= done
+
+    def measure_drain(self, now: float, backlog: int):
+        """
+        Measure the link from how many bytes of the driver's queue were written since the last frame. Only counted while
+        the queue is still busy, or the link was waiting for us rather than the other way around.
+        """
+        self.account_drained(backlog)
+        if self.drained_since is not None and backlog and self.drained_bytes and now - self.drained_since >= self.MIN_SAMPLE_SECONDS:
+            self.measure(self.drained_bytes / (now - self.drained_since))
+        self.drained_bytes, self.drained_since = 0.0, now
+
+    def add_widget(self, name: str, render, interval: float, priority: int = 0) -> Widget:
+        """
+        Add a widget; see Widget for the parameters.
+        """
+        widget = self.widgets[name] = Widget(name, render, interval, priority)
+        return widget
+
+    def push(self, widget: Widget, pixels: np.ndarray, x: int, y: int) -> int:
+        backlog = self.backlog()
+        start = self.clock()
+        push_region(self.lcd, pixels, x, y, self.converter)
+        elapsed = self.clock() - start
+        sent = pixels.shape[0] * pixels.shape[1] * DirtyRegionRenderer.BYTES_PER_PIXEL
+        if backlog is None:
+            if elapsed >= self.MIN_SAMPLE_SECONDS: self.measure(sent / elapsed)
+        else:
+            self.account_drained(backlog)
+            added = max(1, self.backlog() - backlog)
+            self.queued.append([added, sent])
+            self.queued_items += added
+            self.queued_bytes += sent
+        widget.push_time += elapsed
+        widget.bytes_sent += sent
+        widget.last_bytes = sent
+        return sent
+
+    def tick(self) -> List[str]:
+        """
+        Run one frame: push the widgets that are due, as far as the link keeps up.
+
+        :return: Names of the widgets pushed
+        """
+        now = self.clock()
+        frame_start = now
+        backlog = self.backlog()
+        if backlog is not None: self.measure_drain(now, backlog)
+        budget = self.bytes_per_second / self.target_fps
+        if backlog is not None:
+            if self.queued_bytes > budget:                              # the link hasn't caught up with earlier frames yet
+                self.backpressure_frames += 1
+                self.frames += 1
+                return []
+            budget -= self.queued_bytes
+        slack = 0.5 / self.target_fps                                   # due within half a frame counts as due now
+        due = sorted((widget for widget in self.widgets.values() if now + slack >= widget.next_due),
+                     key=lambda widget: widget.priority + widget.skips_in_a_row, reverse=True)
+        if due:                                                         # waiting never puts a widget ahead of the most important one
+            top = max(due, key=lambda widget: widget.priority)
+            due.remove(top)
+            due.insert(0, top)
+        pushed, spent = [], 0
+        for widget in due:
+            if pushed and spent + widget.last_bytes > budget and widget.skips_in_a_row < self.max_skips:
+                widget.skips += 1
+                widget.skips_in_a_row += 1
+                continue
+            render_start = self.clock()
+            rendered = widget.render()
+            widget.render_time += self.clock() - render_start
+            widget.next_due = now + widget.interval
+            widget.skips_in_a_row = 0
+            if rendered is None:
+                continue
+            spent += self.push(widget, *rendered)
+            widget.pushes += 1
+            pushed.append(widget.name)
+        self.frames += 1
+        if self.clock() - frame_start > 1 / self.target_fps:
+            self.late_frames += 1
+        return pushed
+
+    def run(self, duration: Optional[float] = None, sleep=time.sleep):
+        """
+        Run frames at the target rate, for duration seconds or forever.
+        """
+        frame_time = 1 / self.target_fps
+        start = next_frame = self.clock()
+        while duration is None or self.clock() - start < duration:
+            self.tick()
+            next_frame += frame_time
+            delay = next_frame - self.clock()
+            if delay > 0: sleep(delay)
+            else:         next_frame = self.clock()                 # behind: don't try to catch up with a burst
+
+    def stats(self) -> Dict[str, dict]:
+        """
+        :return: Per-widget timing stats, and the scheduler's own under "scheduler"
+        """
+        stats = {name: widget.stats() for name, widget in self.widgets.items()}
+        stats["scheduler"] = {"frames": self.frames, "late_frames": self.late_frames, "backpressure_frames": self.backpressure_frames,
+                              "link_bytes_per_second": self.bytes_per_second}
+        return stats
@@ -0,0 +1,135 @@
+#TO USE: import clairecjs_utils as claire
+#
+#       logger = claire.get_logger(__name__)                    # in a module: never configures the root logger
+#       claire.enable_console_logging(logging.DEBUG)            # in a script that wants our log lines on the console
+#       trace  = claire.trace_to_ring("claire_winamp")          # keep the last 1000 records in memory, format them later
+#
+#Library modules used to remove every root handler and call logging.basicConfig() when imported, which undid the
+#logging setup of whatever program imported them. Modules get their logger from get_logger() instead; only scripts
+#decide where log records go.
+#
+#Log calls in hot paths pass their values as arguments (logger.debug("x=%s", x)) rather than f-strings, so nothing is
+#formatted unless the record is actually emitted. The level check itself is cached by logging: Logger.isEnabledFor()
+#keeps a per-level cache that is cleared whenever a level changes.
+
+import logging
+import collections
+from typing import (List, Union)
+
+PACKAGE_LOGGER_NAMES = ("clairecjs_utils", "claire_console", "claire_files", "claire_openai", "claire_usb", "claire_vlc",
+                        "claire_winamp", "claire_lcd", "claire_fonts", "claire_images", "claire_logging", "claire_ansi",
+                        "claire_timing")
+DEFAULT_FORMAT = '\t\t[%(levelname)s] %(message)s'
+
+
+
+def get_logger(name: str) -> logging.Logger:
+    """
+    Get a module's logger. It has a NullHandler, so a program that hasn't set up logging doesn't get "No handlers"
+    complaints, and its level is left alone so the program's configuration decides what is emitted.
+
+    :param name: Usually __name__
+    :return: The logger
+    """
+    logger = logging.getLogger(name)
+    if not any(isinstance(handler, logging.NullHandler) for handler in logger.handlers):
+        logger.addHandler(logging.NullHandler())
+    return logger
+
+
+class Lazy:
+    """
+    A log argument that is only computed if the record is formatted, for values that are expensive to build:
+
+        logger.debug("playlist: %s", Lazy(lambda: ", ".join(entries)))
+    """
+
+    __slots__ = ("function",)
+
+    def __init__(self, function):
+        self.function = function
+
+    def __str__(self):
+        return str(self.function())
+
+    __repr__ = __str__
+
+
+class RingBufferHandler(logging.Handler):
+    """
+    Keeps the most recent log records in memory without formatting them, for tracing hot paths: emitting a record is
+    an append to a deque, and the formatting cost is only paid by whoever reads the trace.
+    """
+
+    def __init__(self, capacity: int = 1000, level: int = logging.NOTSET):
+        """
+        :param capacity: How many records to keep; older ones are dropped
+        :param level: Lowest level to keep
+        """
+        super().__init__(level)
+        self.records = collections.deque(maxlen=capacity)
+        self.setFormatter(logging.Formatter(DEFAULT_FORMAT))
+
+    def emit(self, record: logging.LogRecord):
+        self.records.append(record)
+
+    def handle(self, record: logging.LogRecord) -> bool:
+        # Handler.handle() takes a lock per record, which a deque append doesn't need
+        if self.filter(record):
+            self.records.append(record)
+            return True
+        return False
+
+    def lines(self) -> List[str]:
+        """
+        :return: The kept records, formatted, oldest first
+        """
+        return [self.format(record) for record in list(self.records)]
+
+    def clear(self):
+        self.records.clear()
+
+
+def trace_to_ring(logger: Union[str, logging.Logger], capacity: int = 1000, level: int = logging.DEBUG) -> RingBufferHandler:
+    """
+    Start keeping a logger's records in memory. This lowers the logger's level to `level`, so its records stop
+    being filtered out; they still only reach other handlers that accept them.
+
+    :param logger: Logger or logger name
+    :return: The handler, whose lines() are the trace. Pass it to stop_trace() when done.
+    """
+    if isinstance(logger, str):
+        logger = logging.getLogger(logger)
+    handler = RingBufferHandler(capacity, level)
+    handler.previous_level = logger.level
+    logger.addHandler(handler)
+    if logger.getEffectiveLevel() > level:
+        logger.setLevel(level)
+    return handler
+
+
+def stop_trace(logger: Union[str, logging.Logger], handler: RingBufferHandler):
+    if isinstance(logger, str):
+        logger = logging.getLogger(logger)
+    logger.removeHandler(handler)
+    logger.setLevel(handler.previous_level)
+
+
+def enable_console_logging(level: int = logging.WARNING, fmt: str = DEFAULT_FORMAT, names=PACKAGE_LOGGER_NAMES) -> logging.Handler:
+    """
+    For scripts: send this package's log records to stderr, formatted the way the modules used to set up the root
+    logger. The root logger is not touched.
+
+    :param level: Lowest level to show
+    :param fmt: Log format
+    :param names: Loggers to attach to
+    :return: The handler
+    """
+    handler = logging.StreamHandler()
+    handler.setFormatter(logging.Formatter(fmt))
+    for name in names:
+        logger = logging.getLogger(name)
+        logger.addHandler(handler)
+        logger.setLevel(level)
+        logger.propagate = False                                        # or the root logger, if configured, prints it twice
+    return handler
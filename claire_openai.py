@@ -2,6 +2,8 @@ import os
 import re
 import sys
 import time
+try:                from .claire_timing import span, count_event
+except ImportError: from claire_timing  import span, count_event
 
 DEFAULTMODEL           = "gpt-3.5-turbo"
 OPENAI_FAIL_SLEEP_TIME = 21                     #as of 20230428 max requests of 3 per minute, so, 20 seconds each. I don't think that's the best criteria for this video, however, when you get an error from OpenAI, it explicitly says try again in 20 seconds. I think that's the best value to set this variable from. That plus one. However, we attempt to actually read their response and wait how long they say. This is just the fallback value if that fails. And in fact if you are paying, you can get away with a much lower value, but it's still prudent to keep it this high because there may be an infinite loop and you wouldn't want to automatically spend your API access money running a pointless loop! Better to have a few seconds to interrupt things!
@@ -37,7 +39,8 @@ def ask_GPT(our_prompt, personality="You are a helpful assistant", additionalCon
 
     while True:
         try:
-            response = openai.ChatCompletion.create(model=model, max_tokens=max_tokens, messages=our_messages, temperature=randomness)
+            with span("openai.chat_completion"):
+                response = openai.ChatCompletion.create(model=model, max_tokens=max_tokens, messages=our_messages, temperature=randomness)
             if response.choices:
                 if debugMore: print(f"       -  Response object: {response.choices[0]}")
                 answer = response.choices[0].message['content']
@@ -54,6 +57,7 @@ def ask_GPT(our_prompt, personality="You are a helpful assistant", additionalCon
             match = re.search(r"try again in (\d+)s", exstr)                              #obey how long OpenAI's error message says to wait
             wait_time = int(match.group(1)) if match else OPENAI_FAIL_SLEEP_TIME;
             print(F"...Retrying in {wait_time} seconds...")
+            count_event("openai.retries")
             time.sleep(wait_time)
 
 #print(ask_GPT("What is the future of OpenAI's GPT AI?"))
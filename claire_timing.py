@@ -0,0 +1,185 @@
+#TO USE: import clairecjs_utils as claire
+#
+#       claire.timings.enable()                                 # or set CLAIRE_TIMING=1 in the environment
+#       with claire.span("winamp.get_playing_status"): ...
+#       @claire.timed("vlc.get_vlc_status")
+#       def get_vlc_status(): ...
+#       print(claire.timings.dump_json())                       # count, total, min, max, p50/p95/p99 per span, plus counters
+#
+#Spans are off unless enabled. A disabled span() hands back one shared do-nothing context manager and a disabled
+#@timed function costs one attribute check before calling through, so the instrumentation can stay in hot paths.
+
+import os
+import math
+import json
+import time
+import threading
+import functools
+import contextlib
+from typing import (Dict, Optional)
+
+
+class LatencyHistogram:
+    """
+    Latencies in logarithmic buckets, four per doubling from 1µs up to about 18 minutes, so recording is O(1), memory
+    is fixed, and percentiles are within about 10% of the true value. Count, total, min and max are exact.
+    """
+
+    BUCKETS_PER_DOUBLING = 4
+    SMALLEST = 1e-6                                                     # seconds; everything faster lands in bucket 0
+    BUCKET_COUNT = 120
+
+    def __init__(self):
+        self.buckets = [0] * self.BUCKET_COUNT
+        self.count = 0
+        self.total = 0.0
+        self.min = math.inf
+        self.max = 0.0
+
+    def bucket(self, seconds: float) -> int:
+        if seconds <= self.SMALLEST:
+            return 0
+        return min(self.BUCKET_COUNT - 1, int(math.log2(seconds / self.SMALLEST) * self.BUCKETS_PER_DOUBLING) + 1)
+
+    def bucket_value(self, bucket: int) -> float:
+        """
+        :return: The geometric middle of a bucket, in seconds
+        """
+        if bucket == 0:
+            return self.SMALLEST
+        return self.SMALLEST * 2 ** ((bucket - 0.5) / self.BUCKETS_PER_DOUBLING)
+
+    def record(self, seconds: float):
+        self.buckets[self.bucket(seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        if seconds < self.min: self.min = seconds
+        if seconds > self.max: self.max = seconds
+
+    def percentile(self, percent: float) -> float:
+        """
+        :param percent: 0-100
+        :return: Estimated latency in seconds, clamped to the exact min and max; 0 if nothing was recorded
+        """
+        if not self.count:
+            return 0.0
+        rank, seen = percent / 100 * self.count, 0
+        for bucket, count in enumerate(self.buckets):
+            seen += count
+            if seen >= rank and count:
+                return min(self.max, max(self.min, self.bucket_value(bucket)))
+        return self.max
+
+    def summary(self) -> dict:
+        return {"count": self.count, "total": self.total, "mean": self.total / self.count if self.count else 0.0,
+                "min": self.min if self.count else 0.0, "max": self.max,
+                "p50": self.percentile(50), "p95": self.percentile(95), "p99": self.percentile(99)}
+
+
+class _Span:
+    __slots__ = ("timings", "name", "start")
+
+    def __init__(self, timings, name):
+        self.timings = timings
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.timings.record(self.name, time.perf_counter() - self.start)
+        return False
+
+
+_NULL_SPAN = contextlib.nullcontext()
+
+
+class Timings:
+    """
+    Named latency histograms and counters, shared by every module through the module-level `timings`.
+    """
+
+    def __init__(self, enabled: Optional[bool] = None):
+        """
+        :param enabled: Whether to record; defaults to the CLAIRE_TIMING environment variable being set to 1
+        """
+        self.enabled = os.environ.get("CLAIRE_TIMING") == "1" if enabled is None else enabled
+        self.histograms = {}
+        self.counters = {}
+        self.lock = threading.Lock()
+
+    def enable(self):  self.enabled = True
+    def disable(self): self.enabled = False
+
+    def span(self, name: str):
+        """
+        :return: A context manager timing its body under `name`
+        """
+        if not self.enabled:
+            return _NULL_SPAN
+        return _Span(self, name)
+
+    def timed(self, name: Optional[str] = None):
+        """
+        Decorator timing every call of a function, under `name` or the function's qualified name.
+        """
+        def decorator(function):
+            span_name = name or function.__qualname__
+
+            @functools.wraps(function)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return function(*args, **kwargs)
+                start = time.perf_counter()
+                try:
+                    return function(*args, **kwargs)
+                finally:
+                    self.record(span_name, time.perf_counter() - start)
+            return wrapper
+        return decorator
+
+    def record(self, name: str, seconds: float):
+        with self.lock:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = LatencyHistogram()
+            histogram.record(seconds)
+
+    def count(self, name: str, amount: int = 1):
+        if not self.enabled:
+            return
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def summary(self) -> Dict[str, dict]:
+        """
+        :return: {"spans": {name: count/total/mean/min/max/p50/p95/p99 in seconds}, "counters": {name: count}}
+        """
+        with self.lock:
+            return {"spans": {name: histogram.summary() for name, histogram in sorted(self.histograms.items())},
+                    "counters": dict(sorted(self.counters.items()))}
+
+    def dump_json(self, path: Optional[str] = None) -> str:
+        """
+        :param path: File to write the summary to, if any
+        :return: The summary as JSON
+        """
+        text = json.dumps(self.summary(), indent=2)
+        if path:
+            with open(path, "w", encoding="utf-8") as file:
+                file.write(text)
+        return text
+
+    def reset(self):
+        with self.lock:
+            self.histograms.clear()
+            self.counters.clear()
+
+
+timings = Timings()
+
+
+def span(name: str):                          return timings.span(name)
+def timed(name: Optional[str] = None):        return timings.timed(name)
+def count_event(name: str, amount: int = 1):  timings.count(name, amount)
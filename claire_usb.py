@@ -1,35 +1,27 @@
+import os
+import time
+import threading
+import numpy as np
 import hid
-
-
 import usb.core
-import usb.backend.libusb1
+import usb.util
+from typing import (List, NamedTuple, Optional)
 
 
-
-import logging as logging
-for handler in logging.root.handlers[:]: logging.root.removeHandler(handler)
-logging.basicConfig(
-    level=logging.WARNING,
-    format='\t\t[%(levelname)s] %(message)s'
-)
-logger = logging.getLogger(__name__)
-#logger.setLevel(logging.WARNING)
+try:                from .claire_logging import get_logger
+except ImportError: from claire_logging  import get_logger
+logger = get_logger(__name__)
 logger.debug("clairecjs_usb started")
 
 
 
 
 def display_all_devices():
-    # Find all devices
-    devices = usb.core.find(find_all=True)
-
-    #backend = usb.backend.libusb1.get_backend(find_library=lambda x: "libusb-1.0.dll")
-    #devices = usb.core.find(find_all=True, backend=backend)
-    #for device in devices:
-    #    print(f"Device: {device}")
-    #    print(f"  Vendor ID: {hex(device.idVendor)}")
-    #    print(f"  Product ID: {hex(device.idProduct)}")
-    #    print(f"  Serial Number: {usb.util.get_string(device, 256, device.iSerialNumber)}\n")
+    for device in usb_registry.all():
+        print(f"Device: {device.product}")
+        print(f"  Vendor ID: {hex(device.vid)}")
+        print(f"  Product ID: {hex(device.pid)}")
+        print(f"  Serial Number: {device.serial}\n")
 
 def list_usb_devices():
     import pywinusb.hid as hid
@@ -40,12 +32,353 @@ def list_usb_devices():
         print(f"     P roduct ID: {device.product_id  }")
         print(f"    Manufacturer: {device.product_name}")
 
-list_usb_devices()
+
+
+SYSFS_USB_DEVICES = "/sys/bus/usb/devices"
+
+
+class UsbDevice(NamedTuple):
+    vid: int
+    pid: int
+    serial: str = ""
+    manufacturer: str = ""
+    product: str = ""
+    path: str = ""
+    """
+    The sysfs directory on Linux, "usb:bus:address" from pyusb or the HID path elsewhere
+    """
+    devnum: int = 0
+    """
+    The device number on its bus (sysfs and pyusb), new every time something is plugged in
+    """
+
+
+def read_sysfs_attribute(path: str, name: str) -> str:
+    try:
+        with open(os.path.join(path, name), encoding="utf-8", errors="replace") as file:
+            return file.read().strip()
+    except OSError:
+        return ""
+
+
+def read_sysfs_device(path: str) -> Optional[UsbDevice]:
+    """
+    :param path: A device directory under /sys/bus/usb/devices
+    :return: The device, or None for interfaces and hubs' ports, which have no idVendor
+    """
+    def read(name: str) -> str: return read_sysfs_attribute(path, name)
+    vid = read("idVendor")
+    if not vid:
+        return None
+    return UsbDevice(int(vid, 16), int(read("idProduct") or "0", 16), read("serial"), read("manufacturer"), read("product"), path,
+                     int(read("devnum") or "0"))
+
+
+def enumerate_hid_devices() -> List[UsbDevice]:
+    return [UsbDevice(device["vendor_id"], device["product_id"], device.get("serial_number") or "",
+                      device.get("manufacturer_string") or "", device.get("product_string") or "",
+                      device["path"].decode(errors="replace") if isinstance(device["path"], bytes) else device["path"])
+            for device in hid.enumerate()]
+
+
+def enumerate_pyusb_devices() -> List[UsbDevice]:
+    """
+    :return: Every USB device libusb sees, HID or not. Strings the device won't give out (no permission, no WinUSB
+             driver) are left empty.
+    """
+    devices = []
+    for device in usb.core.find(find_all=True):
+        def string(index) -> str:
+            if not index:
+                return ""
+            try:
+                return usb.util.get_string(device, index) or ""
+            except (usb.core.USBError, ValueError, NotImplementedError):
+                return ""
+        devices.append(UsbDevice(device.idVendor, device.idProduct, string(device.iSerialNumber), string(device.iManufacturer),
+                                 string(device.iProduct), f"usb:{device.bus}:{device.address}", device.address or 0))
+    return devices
+
+
+def enumerate_usb_devices() -> List[UsbDevice]:
+    """
+    :return: The devices from pyusb, which include CDC serial devices like the smart screens, plus the HID devices
+             pyusb didn't list (it lists nothing without a libusb backend)
+    """
+    try:
+        devices = enumerate_pyusb_devices()
+    except usb.core.NoBackendError:
+        devices = []
+    listed = {(device.vid, device.pid, device.serial) for device in devices}
+    return devices + [device for device in enumerate_hid_devices() if (device.vid, device.pid, device.serial) not in listed]
+
+
+class UsbDeviceRegistry:
+    """
+    USB devices indexed by (vid, pid) and serial number. Nothing is enumerated until the first lookup.
+
+    On Linux the registry reads /sys/bus/usb/devices. Refreshing lists that directory and reads each known device's
+    devnum, which changes when a different device is plugged into the same port between polls; the other attribute
+    files are only read for devices that appeared or changed. That happens at most every poll_interval seconds.
+    Elsewhere the devices come from pyusb and hid.enumerate() (see enumerate_usb_devices), which only run again when
+    refresh(force=True) is called.
+
+    Sample use:
+        screen = usb_registry.find(0x1a86, 0x5722)              # the 3.5" smart screen, a CDC serial device, so not a HID one
+    """
+
+    def __init__(self, sysfs_root: Optional[str] = SYSFS_USB_DEVICES, poll_interval: float = 1.0, enumerate_devices=enumerate_usb_devices, clock=time.monotonic):
+        """
+        :param sysfs_root: The sysfs devices directory, used if it exists. None to always use enumerate_devices.
+        :param poll_interval: Minimum seconds between looks at sysfs
+        :param enumerate_devices: Function returning every UsbDevice, used when there is no sysfs
+        :param clock: Function returning the current time in seconds, for testing
+        """
+        if sysfs_root is not None and not os.path.isdir(sysfs_root):
+            sysfs_root = None
+        self.sysfs_root = sysfs_root
+        self.poll_interval = poll_interval
+        self.enumerate_devices = enumerate_devices
+        self.clock = clock
+        self.devices = {}                                               # sysfs entry or hid path -> UsbDevice
+        self.by_vid_pid = {}                                            # (vid, pid) -> [UsbDevice]
+        self.by_serial = {}                                             # serial -> UsbDevice
+        self.entries = frozenset()
+        self.polled_at = None
+        self.enumerations = 0
+        self.devices_read = 0
+
+    def index(self):
+        self.by_vid_pid, self.by_serial = {}, {}
+        for device in self.devices.values():
+            self.by_vid_pid.setdefault((device.vid, device.pid), []).append(device)
+            if device.serial:
+                self.by_serial[device.serial] = device
+
+    def refresh(self, force: bool = False) -> bool:
+        """
+        Bring the registry up to date, if poll_interval has passed (or force is set).
+
+        :return: True if devices were added, removed or replaced
+        """
+        now = self.clock()
+        if not force and self.polled_at is not None and (self.sysfs_root is None or now - self.polled_at < self.poll_interval):
+            return False
+        self.polled_at = now
+
+        if self.sysfs_root is None:
+            self.enumerations += 1
+            devices = {device.path: device for device in self.enumerate_devices()}
+            changed = devices != self.devices
+            self.devices = devices
+            self.index()
+            return changed
+
+        try:
+            entries = frozenset(os.listdir(self.sysfs_root))
+        except OSError:
+            entries = frozenset()
+        replaced = {entry for entry, device in self.devices.items()
+                    if entry in entries and int(read_sysfs_attribute(os.path.join(self.sysfs_root, entry), "devnum") or "0") != device.devnum}
+        if entries == self.entries and not replaced:
+            return False
+        for gone in (self.entries - entries) | replaced:
+            self.devices.pop(gone, None)
+        for new in (entries - self.entries) | replaced:
+            if ":" in new:                                              # "1-1:1.0" is an interface, not a device
+                continue
+            self.devices_read += 1
+            device = read_sysfs_device(os.path.join(self.sysfs_root, new))
+            if device:
+                self.devices[new] = device
+        self.entries = entries
+        self.index()
+        return True
+
+    def all(self) -> List[UsbDevice]:
+        self.refresh()
+        return list(self.devices.values())
+
+    def find(self, vid: int, pid: int) -> Optional[UsbDevice]:
+        """
+        :return: The first device with this vendor and product ID, or None
+        """
+        self.refresh()
+        found = self.by_vid_pid.get((vid, pid))
+        return found[0] if found else None
+
+    def find_all(self, vid: int, pid: int) -> List[UsbDevice]:
+        self.refresh()
+        return list(self.by_vid_pid.get((vid, pid), ()))
+
+    def find_serial(self, serial: str) -> Optional[UsbDevice]:
+        self.refresh()
+        return self.by_serial.get(serial)
+
+
+usb_registry = UsbDeviceRegistry()
+
+
+def find_usb_device(vid: int, pid: int) -> Optional[UsbDevice]:
+    return usb_registry.find(vid, pid)
+
+
+class HidReport(NamedTuple):
+    data: bytes
+    timestamp: float
+    """
+    time.perf_counter() when the report was read
+    """
+
+
+class HidReader:
+    """
+    Reads a HID device on its own thread into a preallocated ring buffer, so reports keep being collected however
+    slow the consumer is, and hands them out in batches, through callbacks or by iterating.
+
+    The reader thread does timed reads (read_timeout_ms) so it notices close() without ever blocking a consumer. When
+    the consumer falls so far behind that the ring is full, the oldest reports are overwritten: "dropped" counts the
+    lost reports, "overruns" how many times it happened. Reports longer than report_size are cut to report_size.
+
+    Sample use:
+        device = hid.device(); device.open(0x046d, 0xc52b)
+        with HidReader(device) as reader:
+            for batch in reader:
+                for report in batch: handle(report.data, report.timestamp)
+    """
+
+    def __init__(self, device, report_size: int = 64, capacity: int = 1024, batch_size: int = 64,
+                 read_timeout_ms: int = 10, clock=time.perf_counter):
+        """
+        :param device: An open hid.device, or anything with read(max_length, timeout_ms) returning a list of ints or bytes
+        :param report_size: Largest report to keep, in bytes
+        :param capacity: How many reports the ring holds
+        :param batch_size: Most reports delivered in one batch
+        :param read_timeout_ms: How long each read waits for a report
+        :param clock: Function returning the timestamp for each report
+        """
+        self.device = device
+        self.report_size = report_size
+        self.capacity = capacity
+        self.batch_size = batch_size
+        self.read_timeout_ms = read_timeout_ms
+        self.clock = clock
+        self.data = np.zeros((capacity, report_size), np.uint8)
+        self.lengths = np.zeros(capacity, np.int32)
+        self.timestamps = np.zeros(capacity, np.float64)
+        self.head = 0                                                   # next slot to write, counts up forever
+        self.tail = 0                                                   # next slot to read
+        self.received = 0
+        self.delivered = 0
+        self.dropped = 0
+        self.overruns = 0
+        self.read_errors = 0
+        self.overflowing = False
+        self.callbacks = []
+        self.condition = threading.Condition()
+        self.running = False
+        self.threads = []
+
+    def add_callback(self, callback):
+        """
+        Have callback(batch) called with each batch, a list of HidReport, on a delivery thread. Add callbacks
+        before start(); with callbacks, don't iterate the reader as well.
+        """
+        self.callbacks.append(callback)
+
+    def start(self) -> "HidReader":
+        self.running = True
+        self.threads = [threading.Thread(target=self.read_loop, name="HidReader", daemon=True)]
+        if self.callbacks:
+            self.threads.append(threading.Thread(target=self.deliver_loop, name="HidReader delivery", daemon=True))
+        for thread in self.threads: thread.start()
+        return self
+
+    def close(self):
+        with self.condition:
+            self.running = False
+            self.condition.notify_all()
+        for thread in self.threads:
+            if thread is not threading.current_thread(): thread.join()
+
+    def __enter__(self): return self.start()
+    def __exit__(self, *exc_info): self.close()
+
+    def read_loop(self):
+        while self.running:
+            try:
+                report = self.device.read(self.report_size, self.read_timeout_ms)
+            except (OSError, IOError, ValueError) as e:
+                self.read_errors += 1
+                logger.debug("HID read failed: %s", e)
+                time.sleep(self.read_timeout_ms / 1000)
+                continue
+            if report:
+                self.put(report, self.clock())
+
+    def put(self, report, timestamp: float):
+        """
+        Store one report in the ring. Called by the reader thread, or directly for testing.
+        """
+        length = min(len(report), self.report_size)
+        with self.condition:
+            if self.head - self.tail == self.capacity:
+                if not self.overflowing:                                # a new overrun, not more of the same one
+                    self.overflowing = True
+                    self.overruns += 1
+                self.tail += 1
+                self.dropped += 1
+            slot = self.head % self.capacity
+            self.data[slot, :length] = np.frombuffer(bytes(report[:length]), np.uint8)
+            self.lengths[slot] = length
+            self.timestamps[slot] = timestamp
+            self.head += 1
+            self.received += 1
+            self.condition.notify()
+
+    def pending(self) -> int:
+        return self.head - self.tail
+
+    def read_batch(self, timeout: Optional[float] = None) -> List[HidReport]:
+        """
+        Wait for at least one report, then take up to batch_size of them.
+
+        :param timeout: Seconds to wait, None for as long as the reader runs
+        :return: The reports, oldest first; empty on timeout or once closed and drained
+        """
+        with self.condition:
+            if self.head == self.tail:
+                self.condition.wait_for(lambda: self.head != self.tail or not self.running, timeout)
+            count = min(self.head - self.tail, self.batch_size)
+            batch = []
+            for position in range(self.tail, self.tail + count):
+                slot = position % self.capacity
+                batch.append(HidReport(self.data[slot, :self.lengths[slot]].tobytes(), float(self.timestamps[slot])))
+            self.tail += count
+            self.delivered += count
+            self.overflowing = False
+            return batch
+
+    def deliver_loop(self):
+        while self.running or self.pending():
+            batch = self.read_batch(timeout=0.1)
+            if batch:
+                for callback in self.callbacks: callback(batch)
+
+    def __iter__(self):
+        while self.running or self.pending():
+            batch = self.read_batch(timeout=0.1)
+            if batch:
+                yield batch
+
+    def stats(self) -> dict:
+        return {"received": self.received, "delivered": self.delivered, "pending": self.pending(),
+                "dropped": self.dropped, "overruns": self.overruns, "read_errors": self.read_errors}
 
 
 if __name__ == "__main__":
     # List all devices
-    for device in hid.enumerate(): print(device)
+    for device in usb_registry.all(): print(device)
 
 
     #display_all_devices()
@@ -10,23 +10,21 @@ VLC_PASSWORD = 'password'
 
 
 import requests
-import logging as logging
-for handler in logging.root.handlers[:]: logging.root.removeHandler(handler)
-logging.basicConfig(
-    level=logging.WARNING,
-    format='\t\t[%(levelname)s] %(message)s'
-)
-logger = logging.getLogger(__name__)
-#logger.setLevel(logging.WARNING)
+try:                from .claire_logging import get_logger
+except ImportError: from claire_logging  import get_logger
+try:                from .claire_timing  import timed
+except ImportError: from claire_timing   import timed
+logger = get_logger(__name__)
 logger.debug("clairecjs_vlc started")
 
 
+@timed("vlc.get_vlc_status")
 def get_vlc_status():
     vlc_lua_port   = VLC_LUA_PORT
     vlc_password   = VLC_PASSWORD
     vlc_ip_address = "localhost"
     url = f"http://{vlc_ip_address}:{vlc_lua_port}/requests/status.json"
-    logger.debug(f"* VLC control URL is {url}")
+    logger.debug("* VLC control URL is %s", url)
 
     # If you set a password, use HTTP Basic Authentication
     auth = ('', vlc_password)  # (username, password), leave username as an empty string
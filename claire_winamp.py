@@ -49,16 +49,23 @@ from library.lcd.lcd_simulated  import LcdSimulated
 
 
 ############################################## LOGGING: ##############################################
-import logging as logging
-for    handler in logging.root.handlers[:]: logging.root.removeHandler(handler)
-logging.basicConfig(level=logging.DEBUG,format='\t\t[%(levelname)s] %(message)s')
-logger                  = logging.getLogger(__name__)
-logger.setLevel          (logging.WARNING)
+try:                from .claire_logging import get_logger
+except ImportError: from claire_logging  import get_logger
+try:                from .claire_timing  import span, timed
+except ImportError: from claire_timing   import span, timed
+logger                  = get_logger(__name__)
 logger.debug             ("dashboard logger started")
 ############################################## LOGGING ###############################################
 
 import tempfile
 import glob
+import ctypes
+import ctypes.util
+import struct
+import json
+import threading
+import collections
+import concurrent.futures
 from pathlib import Path
 
 #global previous_track_title
@@ -67,6 +74,7 @@ from pathlib import Path
 #global artist
 #global title
 global w
+w = None
 #global custom_assets
 #global winamp_version
 #global trackinfo_raw
@@ -76,61 +84,62 @@ trackinfo_raw  = ""
 
 
 from enum import Enum
-from typing import (Tuple, Union, Optional, List)
-
+from typing import (Tuple, Union, Optional, List, NamedTuple)
+
+
+
+# Example trackinfo_raw strings
+TITLE_EXAMPLES = [
+    "The Coathangers – Excuse Me? - Winamp *** 4809. The Coathangers – Excuse Me? - Winamp",
+    "Coathangers – Excuse Me? - Winamp *** 4809. The Coathangers – Excuse Me? - Winamp",
+    "hangers – Excuse Me? - Winamp *** 4809. The Coathangers – Excuse Me? - Winamp",
+    "rs - Excuse Me? - Winamp *** 4809. The Coathangers – Excuse Me? - Winamp",
+    "Excuse Me? - Winamp *** 4809. The Coathangers – Excuse Me? - Winamp",
+    "e Me? - Winamp *** 4809. The Coathangers – Excuse Me? - Winamp",
+    " - Winamp *** 4809. The Coathangers – Excuse Me? - Winamp",
+    "namp *** 4809. The Coathangers – Excuse Me? - Winamp",
+    "*** 4809. The Coathangers – Excuse Me? - Winamp ***",
+    "9. The Coathangers – Excuse Me? - Winamp *** 4809. The Coathangers – Excuse Me? - Winamp",
+    "e Coathangers – Excuse Me? - Winamp *** 4809. The Coathangers – Excuse Me? - Winamp",
+    "thangers – Excuse Me? - Winamp *** 4809. The Coathangers – Excuse Me? - Winamp",
+    "ers - Excuse Me? - Winamp *** 4809. The Coathangers – Excuse Me? - Winamp",
+    " Excuse Me? - Winamp *** 4809. The Coathangers – Excuse Me? - Winamp",
+    "se Me? - Winamp *** 4809. The Coathangers – Excuse Me? - Winamp",
+    "? - Winamp *** 4809. The Coathangers – Excuse Me? - Winamp",
+    "inamp *** 4809. The Coathangers – Excuse Me? - Winamp",
+    "p *** 4809. The Coathangers – Excuse Me? - Winamp",
+    "809. The Coathangers – Excuse Me? - Winamp *** 4809. The Coathangers – Excuse Me? - Winamp",
+    "The Coathangers – Excuse Me? - Winamp *** 4809. The Coathangers – Excuse Me? - Winamp",
+    "oathangers – Excuse Me? - Winamp *** 4809. The Coathangers – Excuse Me? - Winamp",
+    "ngers – Excuse Me? - Winamp *** 4809. The Coathangers – Excuse Me? - Winamp",
+    " - Excuse Me? - Winamp *** 4809. The Coathangers – Excuse Me? - Winamp",
+    "cuse Me? - Winamp *** 4809. The Coathangers – Excuse Me? - Winamp",
+    "Me? - Winamp *** 4809. The Coathangers – Excuse Me? - Winamp",
+    " Winamp *** 4809. The Coathangers – Excuse Me? - Winamp",
+    "mp *** 4809. The Coathangers – Excuse Me? - Winamp",
+    "4809. The Coathangers – Excuse Me? - Winamp *** 4809. The Coathangers – Excuse Me? - Winamp",
+    " The Coathangers – Excuse Me? - Winamp *** 4809. The Coathangers – Excuse Me? - Winamp",
+    "Coathangers – Excuse Me? - Winamp *** 4809. The Coathangers – Excuse Me? - Winamp",
+    "angers – Excuse Me? - Winamp *** 4809. The Coathangers – Excuse Me? - Winamp",
+    "s - Excuse Me? - Winamp *** 4809. The Coathangers – Excuse Me? - Winamp",
+    "Excuse Me? - Winamp *** 4809. The Coathangers – Excuse Me? - Winamp",
+    "e Me? - Winamp *** 4809. The Coathangers – Excuse Me? - Winamp",
+    " - Winamp *** 4809. The Coathangers – Excuse Me? - Winamp",
+    "namp *** 4809. The Coathangers – Excuse Me? - Winamp",
+    #---------------------------------------------------------------
+    "PURPOSEFUL ERROR",
+    "Winamp *** 30. The Sword – Freya - Winamp",
+    " *** 76. Fugazi – Suggestion - Winamp ***",
+    " *** 127. Arthur Bradford – Roslyn's Dog - Winamp ***",
+    "amp *** 139. The Dreadnoughts – Black Sea Gale - Winamp",
+    "inamp *** 141. Pixies – Bel Esprit - Winamp",
+    "Winamp *** 143. The Dreadnoughts – Black Letters - Winamp",
+    "3) - Winamp *** 164. They Might Be Giants – Hide Away Folk Family (live) (2013) - Winamp",
+]
 
 
 def test_examples():
-    # Example trackinfo_raw strings
-    examples = [
-        "The Coathangers – Excuse Me? - Winamp *** 4809. The Coathangers – Excuse Me? - Winamp",
-        "Coathangers – Excuse Me? - Winamp *** 4809. The Coathangers – Excuse Me? - Winamp",
-        "hangers – Excuse Me? - Winamp *** 4809. The Coathangers – Excuse Me? - Winamp",
-        "rs - Excuse Me? - Winamp *** 4809. The Coathangers – Excuse Me? - Winamp",
-        "Excuse Me? - Winamp *** 4809. The Coathangers – Excuse Me? - Winamp",
-        "e Me? - Winamp *** 4809. The Coathangers – Excuse Me? - Winamp",
-        " - Winamp *** 4809. The Coathangers – Excuse Me? - Winamp",
-        "namp *** 4809. The Coathangers – Excuse Me? - Winamp",
-        "*** 4809. The Coathangers – Excuse Me? - Winamp ***",
-        "9. The Coathangers – Excuse Me? - Winamp *** 4809. The Coathangers – Excuse Me? - Winamp",
-        "e Coathangers – Excuse Me? - Winamp *** 4809. The Coathangers – Excuse Me? - Winamp",
-        "thangers – Excuse Me? - Winamp *** 4809. The Coathangers – Excuse Me? - Winamp",
-        "ers - Excuse Me? - Winamp *** 4809. The Coathangers – Excuse Me? - Winamp",
-        " Excuse Me? - Winamp *** 4809. The Coathangers – Excuse Me? - Winamp",
-        "se Me? - Winamp *** 4809. The Coathangers – Excuse Me? - Winamp",
-        "? - Winamp *** 4809. The Coathangers – Excuse Me? - Winamp",
-        "inamp *** 4809. The Coathangers – Excuse Me? - Winamp",
-        "p *** 4809. The Coathangers – Excuse Me? - Winamp",
-        "809. The Coathangers – Excuse Me? - Winamp *** 4809. The Coathangers – Excuse Me? - Winamp",
-        "The Coathangers – Excuse Me? - Winamp *** 4809. The Coathangers – Excuse Me? - Winamp",
-        "oathangers – Excuse Me? - Winamp *** 4809. The Coathangers – Excuse Me? - Winamp",
-        "ngers – Excuse Me? - Winamp *** 4809. The Coathangers – Excuse Me? - Winamp",
-        " - Excuse Me? - Winamp *** 4809. The Coathangers – Excuse Me? - Winamp",
-        "cuse Me? - Winamp *** 4809. The Coathangers – Excuse Me? - Winamp",
-        "Me? - Winamp *** 4809. The Coathangers – Excuse Me? - Winamp",
-        " Winamp *** 4809. The Coathangers – Excuse Me? - Winamp",
-        "mp *** 4809. The Coathangers – Excuse Me? - Winamp",
-        "4809. The Coathangers – Excuse Me? - Winamp *** 4809. The Coathangers – Excuse Me? - Winamp",
-        " The Coathangers – Excuse Me? - Winamp *** 4809. The Coathangers – Excuse Me? - Winamp",
-        "Coathangers – Excuse Me? - Winamp *** 4809. The Coathangers – Excuse Me? - Winamp",
-        "angers – Excuse Me? - Winamp *** 4809. The Coathangers – Excuse Me? - Winamp",
-        "s - Excuse Me? - Winamp *** 4809. The Coathangers – Excuse Me? - Winamp",
-        "Excuse Me? - Winamp *** 4809. The Coathangers – Excuse Me? - Winamp",
-        "e Me? - Winamp *** 4809. The Coathangers – Excuse Me? - Winamp",
-        " - Winamp *** 4809. The Coathangers – Excuse Me? - Winamp",
-        "namp *** 4809. The Coathangers – Excuse Me? - Winamp",
-        #---------------------------------------------------------------
-        "PURPOSEFUL ERROR",
-        "Winamp *** 30. The Sword – Freya - Winamp",
-        " *** 76. Fugazi – Suggestion - Winamp ***",
-        " *** 127. Arthur Bradford – Roslyn's Dog - Winamp ***",
-        "amp *** 139. The Dreadnoughts – Black Sea Gale - Winamp",
-        "inamp *** 141. Pixies – Bel Esprit - Winamp",
-        "Winamp *** 143. The Dreadnoughts – Black Letters - Winamp",
-        "3) - Winamp *** 164. They Might Be Giants – Hide Away Folk Family (live) (2013) - Winamp",
-    ]
-
-    for example in examples:
+    for example in TITLE_EXAMPLES:
         band_name, title = extract_band_and_track_from_raw_title(example)
         print(f"Input: {example}")
         print(f"Band Name: {band_name}\nTrack Name: {title}\n")
@@ -329,12 +338,224 @@ class CurrentTrack(Track):
         self.playlist_position = playlist_position
 
 
+class PlaylistFingerprint(NamedTuple):
+    """
+    A cheap summary of the last dumped playlist, used to decide whether Winamp needs to dump it again.
+    """
+
+    length: int
+    """
+    Number of tracks Winamp reported when the playlist was last dumped.
+    """
+    mtime: float
+    """
+    Modification time of the dumped playlist file.
+    """
+
+
 class NoTrackSelectedError(Exception):
     """
     Exception raised when track is not selected in Winamp and one is required for requested operation.
     """
 
 
+class _Inotify:
+    """
+    Minimal non-blocking inotify watcher through ctypes. Only available on Linux; use _Inotify.create() which returns
+    None anywhere else.
+    """
+
+    IN_CLOSE_WRITE = 0x00000008
+    IN_MOVED_FROM  = 0x00000040
+    IN_MOVED_TO    = 0x00000080
+    IN_CREATE      = 0x00000100
+    IN_DELETE      = 0x00000200
+    IN_DELETE_SELF = 0x00000400
+    IN_MOVE_SELF   = 0x00000800
+    IN_NONBLOCK    = 0x00000800
+    IN_CLOEXEC     = 0x00080000
+    WATCH_MASK     = IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE | IN_DELETE_SELF | IN_MOVE_SELF
+    EVENT_HEADER   = struct.Struct("iIII")
+
+    def __init__(self, libc, fd: int):
+        self.libc = libc
+        self.fd = fd
+        self.watches = {}
+
+    @classmethod
+    def create(cls) -> Optional["_Inotify"]:
+        if not sys.platform.startswith("linux"):
+            return None
+        try:
+            libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+            fd = libc.inotify_init1(cls.IN_NONBLOCK | cls.IN_CLOEXEC)
+        except (OSError, AttributeError):
+            return None
+        if fd < 0:
+            return None
+        return cls(libc, fd)
+
+    def watch(self, path: str):
+        wd = self.libc.inotify_add_watch(self.fd, os.fsencode(path), self.WATCH_MASK)
+        if wd >= 0:
+            self.watches[wd] = path
+
+    def clear(self):
+        for wd in list(self.watches):
+            self.libc.inotify_rm_watch(self.fd, wd)
+        self.watches.clear()
+
+    def read_events(self) -> List[Tuple[str, int, str]]:
+        """
+        :return: A list of (watched directory, event mask, file name) for every event queued since the last call.
+        """
+        events = []
+        while True:
+            try:
+                data = os.read(self.fd, 4096)
+            except BlockingIOError:
+                break
+            offset = 0
+            while offset < len(data):
+                wd, mask, _cookie, length = self.EVENT_HEADER.unpack_from(data, offset)
+                offset += self.EVENT_HEADER.size
+                name = data[offset:offset + length].rstrip(b"\0").decode(errors="replace")
+                offset += length
+                events.append((self.watches.get(wd, ""), mask, name))
+        return events
+
+    def close(self):
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
+            self.watches.clear()
+
+    def __del__(self):
+        self.close()
+
+
+class WinampPlaylistLocator:
+    """
+    Finds the playlist file Winamp dumps into, and remembers it. The search root is %APPDATA%, or the directory in
+    the environment variable WINAMP_PLAYLIST_ROOT if it is set. Every *winamp* directory under the root is checked for
+    winamp.m3u8 and the most recently modified one wins.
+
+    After the first scan, each call to locate() costs two stats: the chosen playlist, so that it disappearing is noticed
+    at once, and one of the root, the winamp directories and the other playlist files in rotation. A full rescan only
+    happens when one of them changed or the chosen playlist disappeared. With use_inotify=True on Linux, pending inotify events are read instead.
+    """
+
+    PLAYLIST_FILENAME    = "winamp.m3u8"
+    ENVIRONMENT_VARIABLE = "WINAMP_PLAYLIST_ROOT"
+
+    def __init__(self, root: Optional[str] = None, use_inotify: bool = False):
+        """
+        :param root: Directory to search for *winamp* directories. Defaults to WINAMP_PLAYLIST_ROOT, then APPDATA.
+        :param use_inotify: Watch the directories with inotify instead of polling them. Ignored if not on Linux.
+        """
+        self.root = root
+        self.playlist_path = None
+        self.watched_mtimes = {}                     # path -> mtime that was seen during the last scan
+        self.watched_paths = []                      # the watched paths other than the chosen playlist, checked in rotation
+        self.next_watched = 0
+        self.scans = 0
+        self.inotify = _Inotify.create() if use_inotify else None
+
+    def search_root(self) -> Path:
+        """
+        :return: The directory that is searched for *winamp* directories.
+        """
+        return Path(self.root or os.getenv(self.ENVIRONMENT_VARIABLE) or os.getenv('APPDATA', ''))
+
+    def scan(self) -> str:
+        """
+        Search all winamp directories for the most recently modified playlist file and remember what was seen.
+
+        :return: The path to the most recent winamp.m3u8 file, or an empty string if not found.
+        """
+        self.scans += 1
+        root = self.search_root()
+        watched = {}
+        try:               watched[str(root)] = root.stat().st_mtime
+        except OSError:    pass
+
+        latest_file = None
+        latest_mtime = 0
+        try:               candidates = list(root.iterdir())
+        except OSError:    candidates = []
+        for winamp_dir in candidates:
+            if 'winamp' not in winamp_dir.name.lower() or not winamp_dir.is_dir():
+                continue                                                    # same as glob('*winamp*'), but case-insensitive everywhere
+            try:               watched[str(winamp_dir)] = winamp_dir.stat().st_mtime
+            except OSError:    continue                                     # removed while scanning
+            playlist_file = winamp_dir / self.PLAYLIST_FILENAME
+            try:               mtime = playlist_file.stat().st_mtime
+            except OSError:    continue
+            watched[str(playlist_file)] = mtime
+            if mtime > latest_mtime:
+                latest_mtime = mtime
+                latest_file = playlist_file
+
+        self.playlist_path = str(latest_file) if latest_file else ''
+        self.watched_mtimes = watched
+        self.watched_paths = [path for path in watched if path != self.playlist_path]
+        self.next_watched = 0
+        if self.inotify is not None:
+            self.inotify.clear()
+            for path in watched:
+                if os.path.isdir(path): self.inotify.watch(path)
+        logger.debug("winamp playlist scan #%d found %r", self.scans, self.playlist_path)
+        return self.playlist_path
+
+    def changed(self) -> bool:
+        """
+        Check whether the last scan result may be stale.
+
+        :return: True if a rescan is needed.
+        """
+        if self.inotify is not None:
+            root = str(self.search_root())
+            for directory, mask, name in self.inotify.read_events():
+                if directory == root and name and 'winamp' not in name.lower():
+                    continue                                                # something unrelated came or went in APPDATA
+                if directory != root and name not in ('', self.PLAYLIST_FILENAME):
+                    continue                                                # Winamp writing its other settings files
+                if os.path.join(directory, name) == self.playlist_path and not mask & (_Inotify.IN_DELETE | _Inotify.IN_MOVED_FROM):
+                    continue                                                # Winamp rewriting the chosen playlist doesn't change the answer
+                return True
+            return False
+
+        if self.playlist_path:
+            try:               os.stat(self.playlist_path)
+            except OSError:    return True                                  # deleted, or its profile moved
+        if not self.watched_paths:
+            return not self.playlist_path
+        path = self.watched_paths[self.next_watched]
+        self.next_watched = (self.next_watched + 1) % len(self.watched_paths)
+        try:               mtime = os.stat(path).st_mtime
+        except OSError:    return True
+        return mtime != self.watched_mtimes[path]
+
+    def locate(self) -> str:
+        """
+        :return: The path to the most recent winamp.m3u8 file, or an empty string if not found.
+        """
+        if self.playlist_path is None or self.changed():
+            return self.scan()
+        return self.playlist_path
+
+    def close(self):
+        """
+        Close the inotify watcher, if any. The locator keeps working by polling afterwards.
+        """
+        if self.inotify is not None:
+            self.inotify.close()
+            self.inotify = None
+
+    def __enter__(self): return self
+    def __exit__(self, *exc_info): self.close()
+
+
 class Winamp:
     """
     a controller class for an open Winamp client.
@@ -345,7 +566,11 @@ class Winamp:
     A value Winamp returns for specific commands when the playlist is empty.
     """
     DEFAULT_NO_TRACK_MESSAGE = "No track selected in Winamp"
-
+    PLAYLIST_MAX_AGE = 30.0
+    """
+    Seconds after which the playlist is dumped again even if the fingerprint looks unchanged, because reordering a
+    playlist without changing its length or the current track can't be seen from the cheap checks.
+    """
 
     def __init__(self):
         """
@@ -355,8 +580,17 @@ class Winamp:
         self.window_id = None
         self._version = None
         self.saved_playlist_path = None
+        self.playlist_locator = WinampPlaylistLocator()
         self.previous_track_title = None
         self.custom_assets = False
+        self.album_art = None                        # AlbumArtResolver, made when custom assets are used
+        self.position_tracker = None                 # TrackPositionTracker, told when commands move the position
+        self.playlist_entries = None                 # track paths read from the last playlist dump
+        self.playlist_fingerprint = None
+        self.playlist_dumped_at = 0.0
+        self.playlist_title_checked = None           # (playlist position, title) the last dump was done for
+        self.dumps_performed = 0
+        self.dumps_avoided = 0
         self.connect()
         self.winamp_version = self._version
 
@@ -393,6 +627,9 @@ class Winamp:
         if isinstance(command, MenuCommand):
             command = command.value
 
+        if self.position_tracker is not None and command not in (MenuCommand.RaiseVolume.value, MenuCommand.LowerVolume.value):
+            self.position_tracker.invalidate()
+
         return win32api.SendMessage(self.window_id, WM_COMMAND, command, 0)
 
     def send_user_command(self, command: Union[UserCommand, int], data: int = 0) -> int:
@@ -508,12 +745,10 @@ class Winamp:
 
         :return: The current playing status as PlayingStatus enumeration value.
         """
-        gps_start  = time.perf_counter()
-        status     = self.send_user_command(104)
-        try:               retval = PlayingStatus(status)
-        except ValueError: retval = PlayingStatus.Stopped
-        gps_end = time.perf_counter()
-        #print(f"\t(status of {retval} determined in {gps_end - gps_start} seconds)") #0.00034659996163100004s
+        with span("winamp.get_playing_status"):                   # about 0.35ms
+            status     = self.send_user_command(104)
+            try:               retval = PlayingStatus(status)
+            except ValueError: retval = PlayingStatus.Stopped
         return retval
 
     def get_track_status(self) -> Tuple[int, int]:
@@ -543,6 +778,7 @@ class Winamp:
         :param: Zero if the track was successfully changed.
         """
 
+        if self.position_tracker is not None: self.position_tracker.invalidate()
         return self.send_user_command(UserCommand.ChangeTrack, track_number)
 
     def get_playlist_position(self) -> Optional[int]:
@@ -567,6 +803,7 @@ class Winamp:
         :raises NoTrackSelectedError: If no track is selected in Winamp.
         """
 
+        if self.position_tracker is not None: self.position_tracker.invalidate()
         ret = self.send_user_command(UserCommand.SeekTrack, position)
         if ret == self.NO_TRACK_SELECTED:
             raise NoTrackSelectedError(self.DEFAULT_NO_TRACK_MESSAGE)
@@ -622,11 +859,93 @@ class Winamp:
         """
         #print ("\t\tabout to dump playlist............")
         returnValue = self.send_user_command(UserCommand.DumpPlaylist)
-        if self.saved_playlist_path is None: self.saved_playlist_path = self.find_latest_winamp_playlist()
+        self.saved_playlist_path = self.find_latest_winamp_playlist() or self.saved_playlist_path
         return returnValue
 
 
-    def get_playlist(playlist_filepath) -> Tuple[str, str]:
+    def saved_playlist_mtime(self) -> Optional[float]:
+        """
+        :return: Modification time of the dumped playlist file, or None if there is no such file
+        """
+        if not self.saved_playlist_path:
+            return None
+        try:               return os.stat(self.saved_playlist_path).st_mtime
+        except OSError:    return None
+
+    @staticmethod
+    def title_key(text: str) -> str:
+        return "".join(character for character in text.casefold() if character.isalnum())
+
+    def entry_matches_title(self, playlist_position: Optional[int], title: str) -> bool:
+        """
+        Check the cached entry of the current track against the track title in Winamp's window, which catches a
+        playlist swapped for another one of the same length.
+
+        :param playlist_position: Position of the current track in the playlist, starting from 0
+        :param title: Track title parsed from the window title
+        :return: False if the cached entry's file name doesn't contain the title. A title that couldn't be parsed, and
+        a title that the last dump was already done for, count as a match.
+        """
+        key = self.title_key(title)
+        if playlist_position is None or not key or (playlist_position, key) == self.playlist_title_checked:
+            return True
+        entry = self.playlist_entries[playlist_position].replace("\\", "/")
+        return key in self.title_key(os.path.basename(entry))
+
+    def dump_playlist_if_changed(self, playlist_position: Optional[int] = None, force: bool = False) -> bool:
+        """
+        Dump the playlist only if it looks like it changed since the last dump, and refresh the cached playlist
+        entries. The playlist length reported by Winamp and the mtime of the dumped file are compared against the
+        fingerprint of the last dump, and the cached entry at playlist_position is compared against the track title in
+        Winamp's window. A dump is also done if playlist_position isn't covered by the cached entries.
+
+        :param playlist_position: Playlist position that the caller is about to look up, starting from 0
+        :param force: Dump even if the fingerprint is unchanged
+        :return: True if Winamp was asked to dump the playlist, False if the cached entries were good enough.
+        """
+        fingerprint = self.playlist_fingerprint
+        title = ""
+        if not force and fingerprint is not None and self.playlist_entries is not None:
+            index_hit = playlist_position is None or 0 <= playlist_position < len(self.playlist_entries)
+            fresh     = time.monotonic() - self.playlist_dumped_at < self.PLAYLIST_MAX_AGE
+            if index_hit and fresh and self.get_playlist_length() == fingerprint.length:
+                if playlist_position is not None:
+                    _, title = extract_band_and_track_from_raw_title(self.get_trackinfo_raw())
+                if self.entry_matches_title(playlist_position, title):
+                    mtime = self.saved_playlist_mtime()
+                    if mtime == fingerprint.mtime:
+                        self.dumps_avoided += 1
+                        return False
+                    if mtime is not None:                               # Winamp rewrote the file on its own, so rereading it is enough
+                        entries = self.get_playlist(self.saved_playlist_path)
+                        if len(entries) == fingerprint.length:
+                            self.playlist_entries     = entries
+                            self.playlist_fingerprint = PlaylistFingerprint(len(entries), mtime)
+                            self.dumps_avoided += 1
+                            return False
+
+        self.dump_playlist()
+        entries = self.get_playlist(self.saved_playlist_path) if self.saved_playlist_path else []
+        self.playlist_entries       = entries
+        self.playlist_fingerprint   = PlaylistFingerprint(len(entries), self.saved_playlist_mtime() or 0.0)
+        self.playlist_dumped_at     = time.monotonic()
+        self.playlist_title_checked = (playlist_position, self.title_key(title))   # file names without titles don't dump every call
+        self.dumps_performed += 1
+        logger.debug("playlist dumped: %d performed, %d avoided", self.dumps_performed, self.dumps_avoided)
+        return True
+
+    def get_playlist_entries(self, playlist_position: Optional[int] = None) -> List[str]:
+        """
+        Get the track paths of the current playlist, dumping the playlist only when it seems to have changed.
+
+        :param playlist_position: Playlist position that the caller is about to look up, starting from 0
+        :return: List of track paths in the current playlist
+        """
+        self.dump_playlist_if_changed(playlist_position)
+        return self.playlist_entries
+
+    @staticmethod
+    def get_playlist(playlist_filepath) -> List[str]:
         """
         Get paths to tracks in a playlist. A playlist dump is required for this method except if a playlist file in
         specific location is desired.
@@ -644,7 +963,7 @@ class Winamp:
             #open(playlist_filepath, "r", encoding="utf-8"    ) as playlist_file:
             lines = playlist_file.read().splitlines()
 
-        return [line for line in lines if line and not line.startswith("#")]  # Exclude comments and empty lines
+        return [line.strip() for line in lines if line.strip() and not line.startswith("#")]  # Exclude comments and empty lines
 
 
 
@@ -673,7 +992,9 @@ class Winamp:
 
     def find_latest_winamp_playlist(self) -> str:
         """
-        Find the most recent Winamp playlist file in the user's AppData\Roaming directory.
+        Find the most recent Winamp playlist file in the user's AppData\Roaming directory, or in the directory set in
+        environment variable WINAMP_PLAYLIST_ROOT. The result is cached by the playlist locator and only searched for
+        again when the winamp directories change.
 
         :return: The path to the most recent winamp.m3u file, or an empty string if not found.
 
@@ -681,22 +1002,10 @@ class Winamp:
         self.saved_playlist_path = self.find_latest_winamp_playlist()
         print(f"The most recent Winamp playlist is located at: {saved_playlist_path}")
         """
-        appdata_roaming = Path(os.getenv('APPDATA', ''))
-        winamp_dirs = [d for d in appdata_roaming.glob('*winamp*') if d.is_dir()]
-
-        latest_file = None
-        latest_mtime = 0
-
-        for winamp_dir in winamp_dirs:
-            playlist_files = winamp_dir.glob('winamp.m3u8')
-            for playlist_file in playlist_files:
-                if playlist_file.stat().st_mtime > latest_mtime:
-                    latest_mtime = playlist_file.stat().st_mtime
-                    latest_file = playlist_file
-
-        return str(latest_file) if latest_file else ''
+        return self.playlist_locator.locate()
 
 
+    @timed("winamp.get_current_track_file_path")
     def get_current_track_file_path(self) -> Optional[str]:
         """
         Get the file path of the currently playing track.
@@ -707,46 +1016,329 @@ class Winamp:
         #if isinstance(self, Winamp):
         #    return None  # or handle this case as needed if self is not an instance of the expected type
 
-        gctfp_start = time.perf_counter()
-
-        w.dump_playlist()
         playlist_position = self.get_playlist_position()
-        if playlist_position is not None:
-            print(f"\t\t {playlist_position} = playlist position")
-        else:
+        if playlist_position is None:
             return None
+        logger.debug("\t\t %s = playlist position", playlist_position)
 
-        print(f"saved_playlist= {self.saved_playlist_path}")
-        with open(self.saved_playlist_path, 'r', encoding='utf-8-sig') as temp_playlist_file:
-            lines = [line.strip() for line in temp_playlist_file if not line.startswith('#')]
+        lines = self.get_playlist_entries(playlist_position)
+        if 0 <= playlist_position < len(lines):
+            retval = lines[playlist_position]
+            if retval.startswith('\\'): retval = f'C:{retval}'
+            logger.debug("\t THE FILE = %s", retval)
+        else:
+            retval = None
+        return retval
 
-        try:
-            #f 0 <= (playlist_position+1) < len(lines):
-            if 0 <= (playlist_position  ) < len(lines):
-                retval = lines[playlist_position].strip()
-                if retval.startswith('\\'): retval = f'C:{retval}'
-                print(f"\t THE FILE = {retval}")
-                return retval
+SMTO_BLOCK = 0x0001
+SMTO_ABORTIFHUNG = 0x0002
+
+
+def send_message_timeout(window_id: int, message: int, wparam: int, lparam: int, timeout: float) -> int:
+    """
+    Send a window message, giving up if the receiving window doesn't answer within timeout seconds or is hung.
+
+    :return: The result of the message.
+    :raises TimeoutError: If the window didn't answer in time.
+    """
+    try:
+        _, result = win32gui.SendMessageTimeout(window_id, message, wparam, lparam, SMTO_BLOCK | SMTO_ABORTIFHUNG, int(timeout * 1000))
+    except win32gui.error as e:
+        raise TimeoutError(f"Winamp did not answer message {message} within {timeout} s: {e}")
+    return result
+
+
+class WinampCommandQueue:
+    """
+    Sends commands to Winamp from a worker thread, so that a hung Winamp can't freeze the caller. Every send is bounded
+    by a timeout, and callers get a concurrent.futures.Future for the result.
+
+    Redundant commands are coalesced while they wait in the queue: a setter (SetVolume, SeekTrack, ChangeTrack) that is
+    followed by the same setter only sends the last value, and a query that is already waiting with the same data, with
+    only other queries queued after it, is sent once for both callers. Messages are always sent in the order submitted.
+
+    Sample use:
+        commands = WinampCommandQueue(w)
+        for level in range(0, 256, 5): commands.set_volume(level)       # only the last few actually get sent
+        status = PlayingStatus(commands.submit_user_command(UserCommand.PlayingStatus).result())
+    """
+
+    COALESCED_SETTERS = (UserCommand.SetVolume.value, UserCommand.SeekTrack.value, UserCommand.ChangeTrack.value)
+    COALESCED_QUERIES = (UserCommand.PlayingStatus.value, UserCommand.TrackStatus.value, UserCommand.PlaylistLength.value,
+                         UserCommand.PlaylistPosition.value, UserCommand.TrackInfo.value, UserCommand.WinampVersion.value)
+
+    def __init__(self, winamp: "Winamp", transport=send_message_timeout, timeout: float = 0.5):
+        """
+        :param winamp: The Winamp controller whose window receives the commands
+        :param transport: Function (window_id, message, wparam, lparam, timeout) -> result that sends one message
+        :param timeout: Seconds to wait for Winamp to answer each message
+        """
+        self.winamp = winamp
+        self.transport = transport
+        self.timeout = timeout
+        self.pending = collections.deque()                 # [message, wparam, lparam, [futures], submitted_at]
+        self.condition = threading.Condition()
+        self.closed = False
+        self.sent = 0
+        self.coalesced = 0
+        self.timed_out = 0
+        self.max_backlog = 0
+        self.latencies = collections.deque(maxlen=1000)     # seconds from submit to result, most recent sends
+        self.worker = threading.Thread(target=self.run, name="WinampCommandQueue", daemon=True)
+        self.worker.start()
+
+    def submit(self, message: int, wparam: int, lparam: int, coalesce: Optional[str] = None) -> concurrent.futures.Future:
+        """
+        Queue a window message for the worker to send.
+
+        :param message: WM_COMMAND or WM_USER
+        :param wparam: The message's wparam, the command or the data
+        :param lparam: The message's lparam, the user command or 0
+        :param coalesce: "setter" to merge with the same setter right before it in the queue, "query" to share the
+                         answer of the same query queued since the last other command, None to always send
+        :return: Future for the response from Winamp.
+        :raises RuntimeError: If the queue is closed.
+        """
+        future = concurrent.futures.Future()
+        with self.condition:
+            if self.closed:
+                raise RuntimeError("WinampCommandQueue is closed")
+            last = self.pending[-1] if self.pending else None
+            if coalesce == "setter" and last is not None and last[0] == message and last[2] == lparam:
+                last[1] = wparam                                        # keep only the last value, answer everyone
+                last[3].append(future)
+                self.coalesced += 1
+                return future
+            if coalesce == "query":
+                for item in reversed(self.pending):                     # only queries queued since the last other command
+                    if item[0] == message and item[1] == wparam and item[2] == lparam:
+                        item[3].append(future)
+                        self.coalesced += 1
+                        return future
+                    if item[0] != WM_USER or item[2] not in self.COALESCED_QUERIES:
+                        break                                           # its answer could change what this query returns
+            self.pending.append([message, wparam, lparam, [future], time.perf_counter()])
+            self.max_backlog = max(self.max_backlog, len(self.pending))
+            self.condition.notify()
+        return future
+
+    def submit_command(self, command: Union[MenuCommand, int]) -> concurrent.futures.Future:
+        """
+        Queue a WM_COMMAND message, like Winamp.send_command().
+
+        :param command: MenuCommand object or the ID of the message to send.
+        :return: Future for the response from Winamp.
+        """
+        if isinstance(command, MenuCommand):
+            command = command.value
+        return self.submit(WM_COMMAND, command, 0)
+
+    def submit_user_command(self, command: Union[UserCommand, int], data: int = 0) -> concurrent.futures.Future:
+        """
+        Queue a WM_USER message, like Winamp.send_user_command().
+
+        :param command: UserCommand object or the ID of the message to send.
+        :param data: Data to send with the command.
+        :return: Future for the response from the Winamp API.
+        """
+        if isinstance(command, UserCommand):
+            command = command.value
+        if   command in self.COALESCED_SETTERS: coalesce = "setter"
+        elif command in self.COALESCED_QUERIES: coalesce = "query"
+        else:                                   coalesce = None
+        return self.submit(WM_USER, data, command, coalesce)
+
+    def set_volume(self, volume_level: int) -> concurrent.futures.Future:
+        """
+        Queue a volume change. Consecutive volume changes only send the last one.
+
+        :param volume_level: Volume level in range from 0 to 255.
+        :raises ValueError: If the volume level is outbounds.
+        """
+        if volume_level < 0 or volume_level > 255:
+            raise ValueError("Volume level must be in range [0, 255]")
+        return self.submit_user_command(UserCommand.SetVolume, volume_level)
+
+    @staticmethod
+    def moves_position(message: int, wparam: int, lparam: int) -> bool:
+        """
+        :return: Whether the message can change the track or the position in it, so the position tracker must resample
+        """
+        if message == WM_COMMAND:
+            return wparam not in (MenuCommand.RaiseVolume.value, MenuCommand.LowerVolume.value)
+        return lparam in (UserCommand.SeekTrack.value, UserCommand.ChangeTrack.value)
+
+    def run(self):
+        while True:
+            with self.condition:
+                while not self.pending and not self.closed:
+                    self.condition.wait()
+                if not self.pending:
+                    return
+                message, wparam, lparam, futures, submitted_at = self.pending.popleft()
+            futures = [future for future in futures if future.set_running_or_notify_cancel()]
+            if not futures:
+                continue
+            try:
+                if self.winamp.window_id == 0:
+                    raise ConnectionError("No Winamp client connected")
+                result = self.transport(self.winamp.window_id, message, wparam, lparam, self.timeout)
+            except Exception as e:
+                if isinstance(e, TimeoutError): self.timed_out += 1
+                self.invalidate_position(message, wparam, lparam)       # a timed out seek may still have happened
+                for future in futures: future.set_exception(e)
             else:
-                return None
-        except Exception as e:
-            print(f"An error occurred while reading the temporary playlist file: {e} [X1!]")
-            return None
-        finally:
-            # Clean up the temporary file?
-            # nah why bother? if os.path.exists(temp_playlist_path): os.remove(temp_playlist_path)
-            pass
-        gctfp_end = time.perf_counter()
-        logger.debug(f"\t\tget_current_track_file_path took {gctfp_end - gctfp_start:.3f} s")
+                self.sent += 1
+                self.latencies.append(time.perf_counter() - submitted_at)
+                self.invalidate_position(message, wparam, lparam)       # only now does Winamp have the new position
+                for future in futures: future.set_result(result)
+
+    def invalidate_position(self, message: int, wparam: int, lparam: int):
+        if self.winamp.position_tracker is not None and self.moves_position(message, wparam, lparam):
+            self.winamp.position_tracker.invalidate()
+
+    @property
+    def backlog(self) -> int:
+        """
+        Number of messages waiting to be sent.
+        """
+        return len(self.pending)
+
+    def stats(self) -> dict:
+        """
+        :return: Counters and latency figures of the queue, latencies in seconds.
+        """
+        latencies = sorted(self.latencies)
+        def percentile(p): return latencies[min(len(latencies) - 1, int(p * len(latencies)))] if latencies else 0.0
+        return {"sent": self.sent, "coalesced": self.coalesced, "timed_out": self.timed_out,
+                "backlog": self.backlog, "max_backlog": self.max_backlog,
+                "latency_p50": percentile(0.50), "latency_p95": percentile(0.95), "latency_max": latencies[-1] if latencies else 0.0}
+
+    def close(self, wait: bool = True):
+        """
+        Stop accepting commands. The worker sends what is already queued and then exits.
+
+        :param wait: Wait for the worker to finish.
+        """
+        with self.condition:
+            self.closed = True
+            self.condition.notify()
+        if wait:
+            self.worker.join()
+
+
+class TrackPositionTracker:
+    """
+    Keeps track of the current track position without asking Winamp every frame. Winamp is sampled at most every
+    sample_interval seconds, and in between the position is dead-reckoned from the last sample with time.monotonic()
+    while the track is playing. A sample is also taken right away after a seek, pause, play or track change sent
+    through the Winamp object, and when the estimate runs more than LENGTH_SLACK past the end of the track.
+
+    Sample use:
+        tracker = TrackPositionTracker(w)
+        track_length, track_position = tracker.get_track_status()      # cheap enough to call every frame
+    """
+
+    SAMPLE_INTERVAL = 1.0
+    """
+    Seconds between samples while nothing happens.
+    """
+    SPURIOUS_POSITION = 4000000000
+    """
+    Winamp sometimes reports positions around 2^32 milliseconds when a new track starts. Anything from here up is
+    treated as the start of the track.
+    """
+    LENGTH_SLACK = 1000
+    """
+    Milliseconds the estimate may run past the track length before a sample is taken. Winamp reports the length in
+    whole seconds, so the estimate passes it during the last second of every track.
+    """
+
+    def __init__(self, winamp: "Winamp", sample_interval: float = SAMPLE_INTERVAL, clock=time.monotonic):
+        """
+        :param winamp: The Winamp controller to sample
+        :param sample_interval: Seconds between samples
+        :param clock: Function returning the current time in seconds, for testing
+        """
+        self.winamp = winamp
+        self.sample_interval = sample_interval
+        self.clock = clock
+        self.status = PlayingStatus.Stopped
+        self.length = 0
+        self.sampled_position = 0
+        self.playlist_position = None
+        self.sampled_at = None
+        self.samples = 0
+        self.reads = 0
+        winamp.position_tracker = self
+
+    def invalidate(self):
+        """
+        Make the next read take a fresh sample. Called by Winamp after commands that move the position.
+        """
+        self.sampled_at = None
+
+    def clamp(self, position: int) -> int:
+        if position < 0 or position >= self.SPURIOUS_POSITION:
+            return 0
+        if self.length and position > self.length:
+            return self.length
+        return position
+
+    def sample(self):
+        """
+        Ask Winamp for the playing status, the playlist position and the track status.
+        """
+        self.samples += 1
+        self.sampled_at = self.clock()
+        self.status = self.winamp.get_playing_status()
+        self.playlist_position = self.winamp.get_playlist_position()
+        try:
+            length, position = self.winamp.get_track_status()
+        except NoTrackSelectedError:
+            self.status, length, position = PlayingStatus.Stopped, 0, 0
+        self.length = length
+        self.sampled_position = self.clamp(position)
+
+    def estimate(self, now: float, sampled_at: float) -> int:
+        if self.status != PlayingStatus.Playing:
+            return self.sampled_position
+        return self.sampled_position + int((now - sampled_at) * 1000)
+
+    def get_track_position(self) -> int:
+        """
+        :return: The current track position in milliseconds.
+        """
+        self.reads += 1
+        now = self.clock()
+        sampled_at = self.sampled_at                                # read once, the queue's worker may invalidate() meanwhile
+        if sampled_at is None or now - sampled_at >= self.sample_interval:
+            self.sample()
+            return self.sampled_position
+        position = self.estimate(now, sampled_at)
+        if self.length and position > self.length + self.LENGTH_SLACK:   # the track has probably ended, see what came next
+            self.sample()
+            return self.sampled_position
+        return self.clamp(position)
+
+    def get_track_status(self) -> Tuple[int, int]:
+        """
+        Same as Winamp.get_track_status(), but from the tracker.
+
+        :return: A tuple containing track length and current track position in milliseconds.
+        """
+        position = self.get_track_position()
+        return self.length, position
+
 
 def strip_winamp_title_suffixes(info):
     winamp_title_suffixes_to_strip = [" - Winamp", " ***", " [Paused]", " [Stopped]"]
     suffix = None
     for suffix in winamp_title_suffixes_to_strip:
-        logger.debug(f"⏸⏸⏸ Checking if {info} ends with {suffix}")
+        logger.debug("⏸⏸⏸ Checking if %s ends with %s", info, suffix)
         if info.endswith(suffix):
             info = info[:-len(suffix)]
-            logger.debug(f"⏸⏸⏸ Stripped suffix. New info: {info}")
+            logger.debug("⏸⏸⏸ Stripped suffix. New info: %s", info)
     return info
 
 
@@ -771,7 +1363,7 @@ def extract_band_and_track_from_raw_title(trackinfo_raw: str) -> Tuple[str, str]
     #print(f"Stripped Info: 3: {                                               trackinfo_stripped}")
 
     trackinfo_stripped = re.sub(r' - Winamp *(?=[^ - Winamp ])[\s\*]*$' , '' , trackinfo_stripped)
-    logger.debug(f"⏸⏸⏸ how is trackinfo_stripped={trackinfo_stripped} rn?")
+    logger.debug("⏸⏸⏸ how is trackinfo_stripped=%s rn?", trackinfo_stripped)
 
     trackinfo_stripped = strip_winamp_title_suffixes(trackinfo_stripped)
 
@@ -779,22 +1371,22 @@ def extract_band_and_track_from_raw_title(trackinfo_raw: str) -> Tuple[str, str]
     winamp_title_suffixes_to_strip = [" - Winamp", " ***", " [Paused]", " [Stopped]"]
     while   suffix in winamp_title_suffixes_to_strip:
         for suffix in winamp_title_suffixes_to_strip:
-            logger.debug(f"⏸⏸⏸does {trackinfo_stripped} and with {suffix}?")
+            logger.debug("⏸⏸⏸does %s and with %s?", trackinfo_stripped, suffix)
             if trackinfo_stripped.endswith(suffix): trackinfo_stripped = trackinfo_stripped[:-len(suffix)]
-            logger.debug(f"⏸⏸⏸final trackinfo_stripped={trackinfo_stripped}")
+            logger.debug("⏸⏸⏸final trackinfo_stripped=%s", trackinfo_stripped)
 
 
 
     # Split on "–" (endash) to get artist and track name
     # requires going into Winamp->Options->Title->Advanced Title formatting and changing the hyphen between artist and title into an endash
     if '–' not in trackinfo_stripped:                            #that – is an en-dash and not a hyphen!
-        logger.debug(f'ERROR: can\'t find en-dash in "{trackinfo_raw}"\nYou probably need to go into Winamp->Preferences, to the "Titles" section (the 5th line on the left), to the "Advanced Title Formatting" section and make sure "Use Advanced title formatting when possible" is checked, and change the hypen (-) after %artist% into an en-dash (–).\nI prefer the following avanced title display format:\n[%artist% – ]$if2(%title%,$filepart(%filename%))')
+        logger.debug('ERROR: can\'t find en-dash in "%s"\nYou probably need to go into Winamp->Preferences, to the "Titles" section (the 5th line on the left), to the "Advanced Title Formatting" section and make sure "Use Advanced title formatting when possible" is checked, and change the hypen (-) after %%artist%% into an en-dash (–).\nI prefer the following avanced title display format:\n[%%artist%% – ]$if2(%%title%%,$filepart(%%filename%%))', trackinfo_raw)
         return "", ""
 
     artist, track = trackinfo_stripped.split('–', 1)     #that – is an en-dash and not a hyphen!
     artist = artist.strip()
     track  = track .strip()
-    logger.debug(f"\t⁉⁉⁉⁉⁉⁉⁉⁉⁉⁉⁉⁉⁉⁉⁉⁉⁉⁉⁉⁉⁉⁉⁉⁉⁉⁉⁉⁉⁉ Artist = '{artist}'\n\tSong   = '{track}'")
+    logger.debug("\t⁉⁉⁉⁉⁉⁉⁉⁉⁉⁉⁉⁉⁉⁉⁉⁉⁉⁉⁉⁉⁉⁉⁉⁉⁉⁉⁉⁉⁉ Artist = '%s'\n\tSong   = '%s'", artist, track)
     return artist, track
 
 
@@ -834,118 +1426,218 @@ def extract_band_and_track_from_raw_title(trackinfo_raw: str) -> Tuple[str, str]
 
 
 
-def get_album_art(track_position: int, artist: str):
-    """
-    Dump current playlist into C:\\Users\\username\\Appdata\\Roaming\\Winamp\\Winamp.m3u8. Then read the path of current
-    track from the file and find the album name from it. If album has corresponding album name with key in file
-    album_covers.json, return the asset key and album name. Otherwise return default asset key and text. Also, this
-    function assumes the music directory structure is like artist\\album\\tracks. If the folder structure is something
-    else, the album_name variable may not be the album name and you need to check these manually.
-    This function is used only if custom_assets is set to True and album_covers.json is found.
+DEFAULT_WINAMP_RPC_SETTINGS = {"_comment": "Default_large_asset_text 'winamp version' shows your Winamp version and 'album name' "
+                                           "the current playing album",
+                               "client_id": "default",
+                               "default_large_asset_key": "logo",
+                               "default_large_asset_text": "winamp version",
+                               "small_asset_key": "playbutton",
+                               "small_asset_text": "Playing",
+                               "custom_assets": False}
 
-    :param track_position: Current track's position in the playlist, starting from 0
-    :param artist: Current track's artist. This is needed in case album name is in exceptions i.e. there are multiple
-    albums with same name
-    :return: Album asset key and album name. Asset key in api must be exactly same as this key.
+
+def load_winamp_rpc_settings(settings_dir: str) -> dict:
     """
+    Load winamp-rpc-settings.json from settings_dir. If the settings file can't be found, make a new one with default
+    settings.
 
-    w.dump_playlist()
-    find_latest_winamp_playlist()
-    appdata_path = os.getenv("APPDATA")
-    # Returns list of paths to every track in playlist which are in format
-    # 'path_to_music_directory\\artist\\album\\track'
-    tracklist_paths = w.get_playlist(f"{appdata_path}\\Winamp\\Winamp.m3u8")
-    # Get the current track's directory path
-    track_path = os.path.dirname(tracklist_paths[track_position])
-    # Get the tail of the path i.e. the album name
-    album_name = os.path.basename(track_path)
-
-    large_asset_text = album_name
-    # If there are multiple albums with same name, and they are added into exceptions file, use 'Artist - Album' instead
-    if album_name in album_exceptions:
-        album_key = f"{artist} - {album_name}"
-    else:
-        album_key = album_name
+    :param settings_dir: Directory of the settings file
+    :return: The settings as a dictionary
+    """
+    settings_path = os.path.join(settings_dir, "winamp-rpc-settings.json")
     try:
-        large_asset_key = album_asset_keys[album_key]
-    except KeyError:
-        # Could not find asset key for album cover. Use default asset and asset text instead
-        large_asset_key = default_large_key
-        if default_large_text == "winamp version":
-            large_asset_text = "Winamp v" + w.winamp_version
-        elif default_large_text == "album name":
-            large_asset_text = album_name
+        with open(settings_path) as settings_file:
+            return json.load(settings_file)
+    except FileNotFoundError:
+        settings = dict(DEFAULT_WINAMP_RPC_SETTINGS)
+        with open(settings_path, "w") as settings_file:
+            json.dump(settings, settings_file, indent=2)
+        #too much info: print("Could not find winamp-rpc-settings.json .... Made new settings file with default values.")
+        return settings
+
+
+class AlbumArtResolver:
+    """
+    Resolves the album asset key and text for every track in the Winamp playlist ahead of time, so that looking one up
+    on a track change is a single dictionary lookup.
+
+    The settings, album_name_exceptions.txt and album_covers.json are read once and read again only when their mtimes
+    change. The playlist-wide mapping is rebuilt when the playlist fingerprint of the Winamp object changes, reusing the
+    results of track paths that are in both the old and the new playlist. Like get_album_art always has, this assumes
+    the music directory structure is like artist\\album\\tracks.
+    """
+
+    RECHECK_INTERVAL = 5.0
+    """
+    Seconds between checks of the settings, exceptions and covers files for changes.
+    """
+
+    def __init__(self, winamp: "Winamp", settings_dir: Optional[str] = None):
+        """
+        :param winamp: The Winamp controller whose playlist is resolved
+        :param settings_dir: Directory of winamp-rpc-settings.json, album_name_exceptions.txt and album_covers.json.
+        Defaults to the directory of this file.
+        """
+        self.winamp = winamp
+        self.settings_dir = settings_dir or os.path.dirname(os.path.abspath(__file__))
+        self.settings = {}
+        self.album_exceptions = set()
+        self.album_asset_keys = {}
+        self.file_mtimes = {}
+        self.files_checked_at = None
+        self.playlist_fingerprint = None
+        self.by_path = {}                                       # track path -> (asset key, asset text)
+        self.by_position = {}                                   # playlist position -> (asset key, asset text)
+        self.builds = 0
+
+    def data_files(self) -> List[str]:
+        return [os.path.join(self.settings_dir, filename) for filename in ("winamp-rpc-settings.json", "album_name_exceptions.txt", "album_covers.json")]
+
+    def load(self):
+        """
+        Read the settings, the album name exceptions and the album covers, and forget every resolved track.
+        """
+        self.settings = load_winamp_rpc_settings(self.settings_dir)
+        settings_path, exceptions_path, covers_path = self.data_files()
+        try:
+            with open(exceptions_path, "r", encoding="utf8") as exceptions_file:
+                self.album_exceptions = set(exceptions_file.read().splitlines())
+        except FileNotFoundError:
+            if self.settings.get("custom_assets"): print("Could not find album_name_exceptions.txt. Default (or possibly wrong) assets will be used for duplicate album names.")
+            self.album_exceptions = set()
+        try:
+            with open(covers_path, encoding="utf8") as data_file:
+                self.album_asset_keys = json.load(data_file)
+        except FileNotFoundError:
+            if self.settings.get("custom_assets"): print("Could not find album_covers.json. Default assets will be used.")
+            self.album_asset_keys = {}
+        self.file_mtimes = {path: self.mtime(path) for path in self.data_files()}
+        self.by_path.clear()
+        self.playlist_fingerprint = None
+
+    @staticmethod
+    def mtime(path: str) -> Optional[float]:
+        try:               return os.stat(path).st_mtime
+        except OSError:    return None
+
+    def resolve_path(self, track_path: str) -> Tuple[str, str]:
+        """
+        Work out the asset key and text of one track from its path.
+
+        :param track_path: Path to the track, in format 'path_to_music_directory\\artist\\album\\track'
+        :return: Album asset key and album name. Asset key in api must be exactly same as this key.
+        """
+        album_path = os.path.dirname(track_path.replace("\\", "/"))
+        album_name = os.path.basename(album_path)
+        artist     = os.path.basename(os.path.dirname(album_path))
+
+        large_asset_text = album_name
+        # If there are multiple albums with same name, and they are added into exceptions file, use 'Artist - Album' instead
+        if album_name in self.album_exceptions:
+            album_key = f"{artist} - {album_name}"
         else:
-            large_asset_text = default_large_text
+            album_key = album_name
+        try:
+            large_asset_key = self.album_asset_keys[album_key]
+        except KeyError:
+            # Could not find asset key for album cover. Use default asset and asset text instead
+            large_asset_key, large_asset_text = self.default_asset(album_name)
+
+        if len(large_asset_text) < 2:
+            large_asset_text = f"Album: {large_asset_text}"
+
+        return large_asset_key, large_asset_text
+
+    def default_asset(self, album_name: str = "") -> Tuple[str, str]:
+        default_large_key  = self.settings.get("default_large_asset_key", "logo")
+        default_large_text = self.settings.get("default_large_asset_text", "winamp version")
+        if default_large_text == "winamp version":
+            return default_large_key, "Winamp v" + str(self.winamp.winamp_version)
+        if default_large_text == "album name":
+            return default_large_key, album_name
+        return default_large_key, default_large_text
+
+    def refresh(self, track_position: Optional[int] = None):
+        """
+        Bring the mapping up to date: reload the data files if they changed and rebuild the playlist mapping if the
+        playlist changed.
 
-    if len(large_asset_text) < 2:
-        large_asset_text = f"Album: {large_asset_text}"
+        :param track_position: Playlist position about to be looked up, so a playlist dump is done if it isn't known yet
+        """
+        now = time.monotonic()
+        if self.files_checked_at is None or now - self.files_checked_at >= self.RECHECK_INTERVAL:
+            self.files_checked_at = now
+            if not self.file_mtimes or any(self.mtime(path) != mtime for path, mtime in self.file_mtimes.items()):
+                self.load()
+
+        entries = self.winamp.get_playlist_entries(track_position)
+        if self.winamp.playlist_fingerprint == self.playlist_fingerprint and self.by_position:
+            return
+        by_path, by_position = {}, {}
+        for position, track_path in enumerate(entries):
+            asset = by_path.get(track_path) or self.by_path.get(track_path)
+            if asset is None:
+                asset = self.resolve_path(track_path)
+            by_path[track_path] = by_position[position] = asset
+        self.by_path     = by_path                              # only the current playlist's paths are kept
+        self.by_position = by_position
+        self.playlist_fingerprint = self.winamp.playlist_fingerprint
+        self.builds += 1
+
+    def resolve(self, track_position: int) -> Tuple[str, str]:
+        """
+        :param track_position: Current track's position in the playlist, starting from 0
+        :return: Album asset key and album name, or the default asset key and text if the position is unknown.
+        """
+        self.refresh(track_position)
+        asset = self.by_position.get(track_position)
+        return asset if asset is not None else self.default_asset()
 
-    return large_asset_key, large_asset_text
 
+def get_album_art(track_position: int, artist: str = "", winamp: Optional["Winamp"] = None):
+    """
+    Find the album asset key and text of the track in the playlist. The album name is taken from the track's directory
+    in the dumped playlist. If album has corresponding album name with key in file album_covers.json, return the asset
+    key and album name. Otherwise return default asset key and text. Also, this function assumes the music directory
+    structure is like artist\\album\\tracks. If the folder structure is something else, the album_name variable may
+    not be the album name and you need to check these manually.
+    This function is used only if custom_assets is set to True and album_covers.json is found.
 
+    :param track_position: Current track's position in the playlist, starting from 0
+    :param artist: Unused, the artist for album name exceptions is now taken from the track path. Kept so old callers
+    still work.
+    :param winamp: Winamp controller to use. Defaults to the one made by initialize_and_get_winamp_object().
+    :return: Album asset key and album name. Asset key in api must be exactly same as this key.
+    """
+    winamp = winamp or w
+    if winamp.album_art is None:
+        winamp.album_art = AlbumArtResolver(winamp)
+    return winamp.album_art.resolve(track_position)
+
+
+@timed("winamp.init")                                              # 0.5ms-4ms
 def initialize_and_get_winamp_object():
-    winamp_init_start = time.perf_counter()
-    #global w, custom_assets, winamp_version
+    global w
 
     # Get the directory where this script was executed to make sure Python can find all files.
-    path_of_this_file = os.path.dirname(__file__)
+    path_of_this_file = os.path.dirname(os.path.abspath(__file__))
 
     # Load current settings to a dictionary and assign them to variables. If settings file can't be found, make a new one
     # with default settings.
-    #print(f"settings file would be at: {path_of_this_file}\\winamp-rpc-settings.json")
-    try:
-        with open(f"{path_of_this_file}\\winamp-rpc-settings.json") as settings_file:
-            import json
-            settings = json.load(settings_file)
-    except FileNotFoundError:
-        settings = {"_comment": "Default_large_asset_text 'winamp version' shows your Winamp version and 'album name' "
-                                "the current playing album",
-                    "client_id": "default",
-                    "default_large_asset_key": "logo",
-                    "default_large_asset_text": "winamp version",
-                    "small_asset_key": "playbutton",
-                    "small_asset_text": "Playing",
-                    "custom_assets": False}
-        with open(f"{path_of_this_file}\\winamp-rpc-settings.json", "w") as settings_file:
-            import json
-            json.dump(settings, settings_file, indent=2)
-        #too much info: print("Could not find winamp-rpc-settings.json .... Made new settings file with default values.")
-
+    settings = load_winamp_rpc_settings(path_of_this_file)
     client_id = settings["client_id"]
-    default_large_key = settings["default_large_asset_key"]
-    default_large_text = settings["default_large_asset_text"]
-    small_asset_key = settings["small_asset_key"]
-    small_asset_text = settings["small_asset_text"]
-    custom_assets = settings["custom_assets"]
     if client_id == "default": client_id = "507484022675603456"
-    #print("setting w to winamp")
     w = Winamp()
     #rpc = Presence(client_id)  #discord stuff
     #rpc.connect()              #discord stuff
 
-    winamp_version = w.version
-    previous_track_title = ""
-    cleared = False
-
-    # If boolean custom_assets is set True, try to load file for album assets and album name exceptions.
-    # Files for album cover assets and album name exceptions are loaded only when starting the script so restart is
-    # needed when new albums are added
+    # If boolean custom_assets is set True, album assets and album name exceptions are loaded by the resolver, which
+    # reloads them when the files change, so restarting is no longer needed when new albums are added.
+    w.custom_assets = settings["custom_assets"]
     if w.custom_assets:
-        try:
-            with open(f"{path_of_this_file}\\album_name_exceptions.txt", "r", encoding="utf8") as exceptions_file:
-                album_exceptions = exceptions_file.read().splitlines()
-        except FileNotFoundError:
-            print("Could not find album_name_exceptions.txt. Default (or possibly wrong) assets will be used for duplicate album names.")
-            album_exceptions = []
-        try:
-            with open(f"{path_of_this_file}\\album_covers.json", encoding="utf8") as data_file:
-                album_asset_keys = json.load(data_file)
-        except FileNotFoundError:
-            print("Could not find album_covers.json. Default assets will be used.")
-            w.custom_assets = False
-    winamp_init_end = time.perf_counter()
-    #print(f"\t(winamp init took {winamp_init_end - winamp_init_start} seconds)") # 0.004s- 0.0005
+        w.album_art = AlbumArtResolver(w, path_of_this_file)
+        w.album_art.load()
+        if not w.album_art.album_asset_keys: w.custom_assets = False
     return w
 
 
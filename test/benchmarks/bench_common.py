@@ -0,0 +1,56 @@
+#Shared helpers for the benchmarks in this directory. Run them from the repo root, e.g.:
+#    python test/benchmarks/bench_lcd_renderer.py
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+
+library_path = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', '..', 'turing_smart_screen-python'))
+if library_path not in sys.path: sys.path.append(library_path)
+
+
+class MemoryLcd:
+    """
+    Stand-in for LcdSimulated when turing_smart_screen-python isn't next to this repo: pastes into an image and
+    nothing else.
+    """
+
+    def __init__(self, width=800, height=480):
+        from PIL import Image
+        self.width, self.height = width, height
+        self.screen_image = Image.new("RGB", (width, height))
+    def get_width (self): return self.width
+    def get_height(self): return self.height
+    def DisplayPILImage(self, image, x=0, y=0, image_width=0, image_height=0):
+        self.screen_image.paste(image, (x, y))
+
+
+def get_simulated_lcd(width=800, height=480):
+    """
+    :return: An LcdSimulated in landscape orientation, or a MemoryLcd if the turing library can't be imported.
+    """
+    try:
+        from library.lcd.lcd_comm_rev_a import Orientation
+        from library.lcd.lcd_simulated  import LcdSimulated
+        lcd = LcdSimulated(display_width=height, display_height=width)
+        lcd.SetOrientation(Orientation.LANDSCAPE)
+        print(f"* using LcdSimulated {lcd.get_width()}x{lcd.get_height()}")
+        return lcd
+    except Exception as e:
+        print(f"* LcdSimulated not available ({e}), using MemoryLcd")
+        return MemoryLcd(width, height)
+
+
+def timed(function, seconds=2.0):
+    """
+    Call function repeatedly for about the given number of seconds.
+
+    :return: Calls per second
+    """
+    calls, start = 0, time.perf_counter()
+    while time.perf_counter() - start < seconds:
+        function()
+        calls += 1
+    return calls / (time.perf_counter() - start)
@@ -0,0 +1,33 @@
+#Benchmark: FrameScheduler driving a progress bar, a clock and album art against LcdSimulated, printing the
+#per-widget timing stats.
+
+import numpy as np
+from bench_common import get_simulated_lcd
+from claire_lcd import FrameScheduler
+
+WIDTH, HEIGHT = 800, 480
+
+
+def main():
+    lcd = get_simulated_lcd(WIDTH, HEIGHT)
+    rng = np.random.default_rng(0)
+    position = [0]
+
+    def progress():
+        position[0] = (position[0] + 7) % 760
+        bar = np.zeros((12, 760, 3), np.uint8)
+        bar[:, :position[0]] = (0, 255, 0)
+        return bar, 20, 440
+
+    scheduler = FrameScheduler(lcd, target_fps=15)
+    scheduler.add_widget("progress", progress, interval=1 / 15, priority=10)
+    scheduler.add_widget("clock", lambda: (rng.integers(0, 256, (40, 100, 3), dtype=np.uint8), 680, 20), interval=1.0, priority=5)
+    scheduler.add_widget("album_art", lambda: (rng.integers(0, 256, (300, 300, 3), dtype=np.uint8), 20, 60), interval=0.5, priority=1)
+    scheduler.run(duration=3.0)
+
+    for name, stats in scheduler.stats().items():
+        print(f"{name:10} {stats}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,48 @@
+#Benchmark: full-frame pushes vs DirtyRegionRenderer for a typical now-playing screen update
+#(progress bar creeping along, clock changing), against LcdSimulated.
+
+import numpy as np
+from PIL import Image
+from bench_common import get_simulated_lcd, timed
+from claire_lcd import DirtyRegionRenderer
+
+WIDTH, HEIGHT = 800, 480
+
+
+def make_frames(count=100):
+    background = np.random.default_rng(0).integers(0, 256, (HEIGHT, WIDTH, 3), dtype=np.uint8)
+    frames = []
+    for i in range(count):
+        frame = background.copy()
+        frame[440:452, 20:20 + (i * 7) % 760] = (0, 255, 0)                     # progress bar
+        frame[20:60, 680:780] = (i // 10 * 25) % 256                             # clock, changes every 10 frames
+        frames.append(frame)
+    return frames
+
+
+def main():
+    lcd = get_simulated_lcd(WIDTH, HEIGHT)
+    frames = make_frames()
+
+    index = [0]
+    def full_frame():
+        lcd.DisplayPILImage(Image.fromarray(frames[index[0] % len(frames)]), 0, 0)
+        index[0] += 1
+    full_fps = timed(full_frame)
+    full_bytes = WIDTH * HEIGHT * DirtyRegionRenderer.BYTES_PER_PIXEL
+
+    renderer = DirtyRegionRenderer(lcd, WIDTH, HEIGHT)
+    renderer.render(frames[0])
+    index[0] = 1
+    def dirty_frame():
+        renderer.render(frames[index[0] % len(frames)])
+        index[0] += 1
+    dirty_fps = timed(dirty_frame)
+    stats = renderer.stats()
+
+    print(f"full frames : {full_fps:8.1f} fps, {full_bytes:9,d} bytes/frame")
+    print(f"dirty rects : {dirty_fps:8.1f} fps, {stats['bytes_sent'] // stats['frames']:9,d} bytes/frame, {stats['rects_sent'] / stats['frames']:.1f} rects/frame")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,34 @@
+#Benchmark: scrolling a long title by re-rasterizing it for every step vs claire_lcd.Marquee, against LcdSimulated.
+
+from PIL import Image, ImageDraw
+from bench_common import get_simulated_lcd, timed
+from claire_fonts import get_font
+from claire_lcd import Marquee
+
+TITLE = "4809. The Coathangers – Excuse Me? (live at the 40 Watt Club, Athens GA, 2016) - Winamp"
+RECT  = (0, 400, 800, 48)
+
+
+def main():
+    lcd  = get_simulated_lcd()
+    font = get_font("JetBrains Mono", 36)
+
+    offset = [0]
+    def rerasterize():
+        x, y, width, height = RECT
+        image = Image.new("RGB", (width, height))
+        ImageDraw.Draw(image).text((-offset[0], 4), TITLE, font=font, fill=(0, 255, 0))
+        lcd.DisplayPILImage(image, x, y)
+        offset[0] = (offset[0] + 2) % 2000
+    naive_rate = timed(rerasterize)
+
+    marquee = Marquee(lcd, RECT, font)
+    marquee.set_title(TITLE)
+    marquee_rate = timed(marquee.step)
+
+    print(f"re-rasterize every step: {naive_rate:8.1f} steps/s")
+    print(f"marquee strip slices   : {marquee_rate:8.1f} steps/s   ({marquee_rate / naive_rate:.1f}x, {marquee.renders} render)")
+
+
+if __name__ == "__main__":
+    main()
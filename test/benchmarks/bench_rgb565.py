@@ -0,0 +1,38 @@
+#Microbenchmark: RGB888 -> RGB565 conversion for a full 800x480 frame and for a 300x48 rectangle of it,
+#per-pixel Python (as the older LcdCommRevA.DisplayPILImage did) vs NumPy with fresh arrays vs claire_lcd.Rgb565Converter.
+
+import struct
+import numpy as np
+from PIL import Image
+from bench_common import timed
+from claire_lcd import Rgb565Converter
+
+
+def per_pixel(pixels):
+    image = Image.fromarray(np.ascontiguousarray(pixels))
+    pix, line = image.load(), bytearray()
+    for h in range(image.height):
+        for w in range(image.width):
+            r, g, b = pix[w, h]
+            line += struct.pack('<H', ((r >> 3) << 11) | ((g >> 2) << 5) | (b >> 3))
+    return bytes(line)
+
+
+def numpy_allocating(pixels):
+    r, g, b = (pixels[..., channel].astype(np.uint16) for channel in range(3))
+    return (((r & 0xF8) << 8) | ((g & 0xFC) << 3) | (b >> 3)).astype('<u2').tobytes()
+
+
+def main():
+    frame     = np.random.default_rng(0).integers(0, 256, (480, 800, 3), dtype=np.uint8)
+    converter = Rgb565Converter()
+    for name, pixels in [("full frame 800x480", frame), ("rectangle 300x48", frame[400:448, 250:550])]:
+        assert bytes(converter.convert(pixels)) == numpy_allocating(pixels) == per_pixel(pixels)
+        print(f"{name}:")
+        for method, function in [("per-pixel python", per_pixel), ("numpy, allocating", numpy_allocating), ("pooled converter", converter.convert)]:
+            rate = timed(lambda: function(pixels), 1.0)
+            print(f"    {method:>18}: {rate:10.1f} conversions/s  {rate * pixels.shape[0] * pixels.shape[1] / 1e6:8.1f} Mpixel/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+#Benchmark: bytes per frame and frames per second of ScreenWriter against redrawing the whole screen, for a typical
+#120x40 dashboard update (a clock, a few counters and a progress bar changing, everything else the same).
+#claire_console needs Windows (msvcrt).
+
+import io
+import time
+from bench_common import timed
+from claire_console import ScreenWriter
+
+WIDTH, HEIGHT = 120, 40
+
+
+def draw(screen, frame):
+    screen.put(0, 0, f"{'Copying music':<100}{time.strftime('%H:%M:%S', time.gmtime(frame)):>20}", sgr="1;37;44")
+    for row in range(2, HEIGHT - 2):
+        screen.put(2, row, f"worker {row:2}: {'ok' if (row + frame // 50) % 7 else 'busy':<6} files={row * 1000 + (frame if row < 6 else 0):>8,}",
+                   sgr="32" if (row + frame // 50) % 7 else "1;33")
+    done = frame % 101
+    screen.put(2, HEIGHT - 1, "[" + "#" * done + "." * (100 - done) + "]", sgr="36")
+
+
+def full_redraw(screen):
+    """
+    What a dashboard without diffing writes: clear, then every cell with its SGR.
+    """
+    out = ["\x1b[2J\x1b[H"]
+    for chars, attrs in zip(screen.chars, screen.attrs):
+        current = None
+        for char, sgr in zip(chars, attrs):
+            if sgr != current: out.append(f"\x1b[0;{sgr}m"); current = sgr
+            out.append(char)
+        out.append("\r\n")
+    return "".join(out)
+
+
+def main():
+    stream = io.StringIO()
+    screen = ScreenWriter(WIDTH, HEIGHT, stream=stream)
+    frame = [0]
+
+    def diffed():
+        draw(screen, frame[0])
+        screen.present()
+        stream.seek(0); stream.truncate()
+        frame[0] += 1
+    diffed()
+    screen.frames = screen.bytes_written = 0
+    diffed_fps = timed(diffed)
+
+    full_bytes = [0]
+    def full():
+        draw(screen, frame[0])
+        full_bytes[0] = len(full_redraw(screen))
+        frame[0] += 1
+    full_fps = timed(full)
+
+    print(f"full redraw : {full_fps:8.1f} fps, {full_bytes[0]:7,d} bytes/frame")
+    print(f"ScreenWriter: {diffed_fps:8.1f} fps, {screen.stats()['bytes_per_frame']:7,.0f} bytes/frame")
+
+
+if __name__ == "__main__":
+    main()
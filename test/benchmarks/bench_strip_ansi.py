@@ -0,0 +1,29 @@
+#Benchmark: claire_ansi.strip_ansi (text and UTF-8 bytes) against the regex strip_ansi_from_file used to have, in MB/s,
+#on log text colored the way our scripts color it, including the OSC palette changes tick() sends.
+
+import re
+from bench_common import timed
+from claire_ansi import strip_ansi, AnsiStripper
+
+OLD_ANSI_ESCAPE = re.compile(r'\x1B(?:[@-Z\\-_]|\[[0-?]*[ -/]*[@-~])')
+LINE = ("\x1b[1;32mOK\x1b[0m copying \x1b[38;2;255;128;0mfile\x1b[0m number 12345 of 67890 "
+        "\x1b]10;rgb:c0/c0/c0\x1b\\\x1b[ q\x1b]12;#FF8000\x07ünïcödé\n")
+
+
+def main(megabytes=4):
+    text = LINE * (megabytes * 1024 * 1024 // len(LINE.encode()))
+    data = text.encode()
+    size = len(data) / 1e6
+
+    print(f"old regex       : {timed(lambda: OLD_ANSI_ESCAPE.sub('', text)) * size:7.1f} MB/s, leaves {OLD_ANSI_ESCAPE.sub('', LINE)!r}")
+    print(f"strip_ansi text : {timed(lambda: strip_ansi(text)) * size:7.1f} MB/s, leaves {strip_ansi(LINE)!r}")
+    print(f"strip_ansi bytes: {timed(lambda: strip_ansi(data)) * size:7.1f} MB/s")
+    chunks = [data[i:i + 4096] for i in range(0, len(data), 4096)]
+    def streamed():
+        stripper = AnsiStripper(binary=True)
+        for chunk in chunks: stripper.feed(chunk)
+    print(f"streamed bytes  : {timed(streamed) * size:7.1f} MB/s (4KB writes)")
+
+
+if __name__ == "__main__":
+    main()
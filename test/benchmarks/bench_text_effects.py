@@ -0,0 +1,47 @@
+#Benchmark: drawing text with shadow/blur/contrast the full-frame way (as in test/test_font_attributes.py: copy the
+#whole 800x480 image, filter or enhance all of it, draw) vs claire_images.TextEffects, which only touches the text region,
+#and TextEffects redrawing the same text on the same background, which its region cache turns into a paste.
+
+import numpy as np
+from PIL import Image, ImageDraw, ImageFilter, ImageEnhance
+from bench_common import timed
+from claire_fonts import font_registry
+from claire_images import TextEffects, TextEffect
+
+TEXT = "Text Example"
+
+
+def full_frame(background, font, effect):
+    image = background.copy()
+    if effect.contrast != 1.0: image = ImageEnhance.Contrast(image).enhance(effect.contrast)
+    if effect.blur_radius:     image = image.filter(ImageFilter.GaussianBlur(radius=effect.blur_radius))
+    d = ImageDraw.Draw(image)
+    if effect.shadow_offset:   d.text((10 + effect.shadow_offset[0], 10 + effect.shadow_offset[1]), TEXT, font=font, fill=effect.shadow_color)
+    d.text((10, 10), TEXT, font=font, fill=effect.fill)
+    return image
+
+
+def main():
+    background = Image.fromarray(np.random.default_rng(0).integers(0, 256, (480, 800, 3), dtype=np.uint8))
+    font_path  = font_registry.find("JetBrains Mono").path
+    font       = font_registry.font_from_path(font_path, 40)
+    effects    = TextEffects(max_cached_regions=0)                 # the region work itself, every time
+    cached     = TextEffects()
+    image      = background.copy()
+
+    for name, effect in [("shadow", TextEffect(shadow_offset=(2, 2))), ("blur 2", TextEffect(blur_radius=2)),
+                         ("contrast 0.5", TextEffect(contrast=0.5))]:
+        full_rate   = timed(lambda: full_frame(background, font, effect), 1.0)
+        region_rate = timed(lambda: effects.draw(image, (10, 10), TEXT, font_path, 40, effect), 1.0)
+        box         = (0, 0, 400, 120)
+        patch       = background.crop(box)
+        def redraw():                                           # a dashboard restoring the background behind the text each frame
+            image.paste(patch, box)
+            cached.draw(image, (10, 10), TEXT, font_path, 40, effect)
+        redraw_rate = timed(redraw, 1.0)
+        print(f"{name:>14}: full frame {full_rate:8.1f}/s   region {region_rate:8.1f}/s   ({region_rate / full_rate:.1f}x)"
+              f"   same background {redraw_rate:8.1f}/s   ({redraw_rate / full_rate:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
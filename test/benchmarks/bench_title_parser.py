@@ -0,0 +1,26 @@
+#Benchmark: extract_band_and_track_from_raw_title() over the test_examples() corpus with logging at WARNING (the
+#debug calls are filtered out and never formatted), and with the debug calls kept in a ring-buffer trace.
+
+import logging
+from bench_common import timed
+import claire_logging
+import claire_winamp
+
+
+def parse_all():
+    for example in claire_winamp.TITLE_EXAMPLES:
+        claire_winamp.extract_band_and_track_from_raw_title(example)
+
+
+def main():
+    count = len(claire_winamp.TITLE_EXAMPLES)
+    claire_winamp.logger.setLevel(logging.WARNING)
+    print(f"logging at WARNING  : {timed(parse_all) * count:10,.0f} titles/s")
+
+    trace = claire_logging.trace_to_ring(claire_winamp.logger)
+    print(f"ring-buffer tracing : {timed(parse_all) * count:10,.0f} titles/s")
+    claire_logging.stop_trace(claire_winamp.logger, trace)
+
+
+if __name__ == "__main__":
+    main()
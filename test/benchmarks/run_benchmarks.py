@@ -0,0 +1,231 @@
+#Benchmark suite for the library's hot paths, with stored baselines. Run from the repo root:
+#
+#    python test/benchmarks/run_benchmarks.py                   # run, compare to baselines.json, exit 1 on a regression
+#    python test/benchmarks/run_benchmarks.py --save            # run and store the results as the new baselines
+#    python test/benchmarks/run_benchmarks.py --threshold 10 tick title_parse
+#
+#Every metric is a rate, so higher is better; a metric regresses when it drops more than --threshold percent (default
+#BENCH_THRESHOLD or 20) below its baseline. Baselines only mean something on the machine that recorded them, so
+#baselines.json isn't kept in the repo. Benchmarks whose modules can't be imported here (claire_console needs
+#Windows, claire_winamp needs pywin32, claire_vlc needs requests) are reported as skipped, not failed.
+
+import os
+import io
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import threading
+import contextlib
+import http.server
+from bench_common import timed
+
+DEFAULT_BASELINES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baselines.json")
+BENCHMARKS = {}                                                         # name -> (function returning the rate, unit)
+
+
+def benchmark(name, unit):
+    def decorator(function):
+        BENCHMARKS[name] = (function, unit)
+        return function
+    return decorator
+
+
+@benchmark("tick", "ticks/s")
+def bench_tick(seconds):
+    import claire_console
+    with contextlib.redirect_stdout(io.StringIO()):
+        return timed(claire_console.tick, seconds)
+
+
+@benchmark("tick_meter", "ticks/s")
+def bench_tick_meter(seconds):
+    import claire_console
+    with contextlib.redirect_stdout(io.StringIO()), claire_console.TickMeter(total=10**9):
+        return timed(claire_console.tick, seconds)
+
+
+@benchmark("color_cycle", "steps/s")
+def bench_color_cycle(seconds):
+    import claire_console
+    control = claire_console.ColorControl()
+    with contextlib.redirect_stdout(io.StringIO()) as output:
+        def cycle():
+            control.color_cycle(count=100, prevent_machine_slowdown=False)
+            output.seek(0); output.truncate()
+        return timed(cycle, seconds) * 100
+
+
+@benchmark("rename_collisions", "renames/s")
+def bench_rename_collisions(seconds, collisions=50):
+    import claire_files
+    directory = tempfile.mkdtemp()
+    try:
+        target = os.path.join(directory, "track.mp3")
+        for name in ["track.mp3"] + [f"track-{i}.mp3" for i in range(1, collisions + 1)]:
+            open(os.path.join(directory, name), "w").close()
+        source = os.path.join(directory, "incoming.mp3")
+        def rename():
+            open(source, "w").close()
+            os.remove(claire_files.rename(source, target))         # rename() returns the name it had to pick
+        return timed(rename, seconds)
+    finally:
+        shutil.rmtree(directory)
+
+
+@benchmark("strip_ansi_from_file", "MB/s")
+def bench_strip_ansi_from_file(seconds, megabytes=4):
+    import claire_files
+    line = "\x1b[1;32mOK\x1b[0m \x1b]0;title\x07copying \x1b[38;2;255;128;0mfile\x1b[0m number 12345 of 67890\n"
+    content = line * (megabytes * 1024 * 1024 // len(line))
+    directory = tempfile.mkdtemp()
+    try:
+        path = os.path.join(directory, "log.txt")
+        total, calls = 0.0, 0
+        while total < seconds:
+            with open(path, "w") as file: file.write(content)
+            start = time.perf_counter()
+            claire_files.strip_ansi_from_file(path)
+            total += time.perf_counter() - start
+            calls += 1
+        return len(content.encode()) * calls / total / 1e6
+    finally:
+        shutil.rmtree(directory)
+
+
+@benchmark("title_parse", "titles/s")
+def bench_title_parse(seconds):
+    import claire_winamp
+    def parse_all():
+        for example in claire_winamp.TITLE_EXAMPLES:
+            claire_winamp.extract_band_and_track_from_raw_title(example)
+    return timed(parse_all, seconds) * len(claire_winamp.TITLE_EXAMPLES)
+
+
+@benchmark("playlist_position_lookup", "lookups/s")
+def bench_playlist_position_lookup(seconds, tracks=5000):
+    import claire_winamp
+    directory = tempfile.mkdtemp()
+    previous_root, os.environ["WINAMP_PLAYLIST_ROOT"] = os.environ.get("WINAMP_PLAYLIST_ROOT"), directory
+
+    class FakeWinamp(claire_winamp.Winamp):
+        def connect(self):
+            self.window_id, self._version = 1, "5.9"
+        def get_trackinfo_raw(self):
+            return f"{tracks // 2 + 1}. Band – {tracks // 2} - Winamp"         # matches the current entry, like a real window title
+        def send_user_command(self, command, data=0):
+            command = getattr(command, "value", command)
+            if command == claire_winamp.UserCommand.DumpPlaylist.value:
+                with open(os.path.join(directory, "winamp.m3u8"), "w", encoding="utf-8-sig") as playlist_file:
+                    playlist_file.write("#EXTM3U\n" + "".join(f"#EXTINF:1,{i}\nC:\\music\\{i}.mp3\n" for i in range(tracks)))
+            if command == claire_winamp.UserCommand.PlaylistLength.value:
+                return tracks
+            return tracks // 2
+
+    try:
+        winamp = FakeWinamp()
+        winamp.saved_playlist_path = os.path.join(directory, "winamp.m3u8")
+        return timed(winamp.get_current_track_file_path, seconds)
+    finally:
+        if previous_root is None: os.environ.pop("WINAMP_PLAYLIST_ROOT", None)
+        else:                     os.environ["WINAMP_PLAYLIST_ROOT"] = previous_root
+        shutil.rmtree(directory)
+
+
+class FakeVlcHandler(http.server.BaseHTTPRequestHandler):
+    STATUS = json.dumps({"state": "playing", "position": 0.25, "information": {"category": {"meta": {"title": "Excuse Me?"}}},
+                         "video": {"width": 1920, "height": 1080, "fps": 23.976}}).encode()
+
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(self.STATUS)))
+        self.end_headers()
+        self.wfile.write(self.STATUS)
+
+    def log_message(self, *args):
+        pass
+
+
+@benchmark("vlc_status_poll", "polls/s")
+def bench_vlc_status_poll(seconds):
+    import claire_vlc
+    server = http.server.ThreadingHTTPServer(("localhost", 0), FakeVlcHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    previous_port, claire_vlc.VLC_LUA_PORT = claire_vlc.VLC_LUA_PORT, str(server.server_address[1])
+    try:
+        return timed(claire_vlc.get_vlc_status, seconds)
+    finally:
+        claire_vlc.VLC_LUA_PORT = previous_port
+        server.shutdown()
+        server.server_close()
+
+
+def run(names, seconds):
+    """
+    :return: {name: rate} for the benchmarks that ran, and {name: reason} for the ones that were skipped
+    """
+    results, skipped = {}, {}
+    for name in names:
+        function, unit = BENCHMARKS[name]
+        try:
+            results[name] = function(seconds)
+        except ImportError as e:
+            skipped[name] = str(e)
+            print(f"{name:26} skipped: {e}")
+            continue
+        print(f"{name:26} {results[name]:14,.1f} {unit}")
+    return results, skipped
+
+
+def compare(results, baselines, threshold):
+    """
+    :param threshold: Largest allowed drop below baseline, in percent
+    :return: Names of the metrics that regressed
+    """
+    regressions = []
+    for name, rate in results.items():
+        baseline = baselines.get(name)
+        if not baseline:
+            continue
+        change = (rate - baseline) / baseline * 100
+        regressed = change < -threshold
+        if regressed: regressions.append(name)
+        print(f"{name:26} {change:+7.1f}% vs baseline {baseline:,.1f}{'   REGRESSION' if regressed else ''}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the library's hot paths against stored baselines")
+    parser.add_argument("names", nargs="*", help=f"benchmarks to run (default: all of {', '.join(BENCHMARKS)})")
+    parser.add_argument("--seconds", type=float, default=1.0, help="how long to run each benchmark")
+    parser.add_argument("--threshold", type=float, default=float(os.environ.get("BENCH_THRESHOLD", 20)), help="allowed drop in percent")
+    parser.add_argument("--baselines", default=DEFAULT_BASELINES, help="baselines file")
+    parser.add_argument("--save", action="store_true", help="store the results as the new baselines")
+    args = parser.parse_args(argv)
+    unknown = [name for name in args.names if name not in BENCHMARKS]
+    if unknown:
+        parser.error(f"unknown benchmark: {', '.join(unknown)}")
+
+    results, _ = run(args.names or list(BENCHMARKS), args.seconds)
+    baselines = {}
+    if os.path.exists(args.baselines):
+        with open(args.baselines, encoding="utf-8") as file: baselines = json.load(file)
+    if args.save:
+        baselines.update(results)
+        with open(args.baselines, "w", encoding="utf-8") as file: json.dump(baselines, file, indent=2, sort_keys=True)
+        print(f"* saved {len(results)} baselines to {args.baselines}")
+        return 0
+
+    print()
+    regressions = compare(results, baselines, args.threshold)
+    if regressions:
+        print(f"\n* {len(regressions)} regressed more than {args.threshold}%: {', '.join(regressions)}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
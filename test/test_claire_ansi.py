@@ -0,0 +1,109 @@
+import io
+import os
+import random
+import sys
+import shutil
+import tempfile
+import unittest
+import claire_ansi
+
+
+COLORED = "\x1b[1;32mOK\x1b[0m copied \x1b[38;2;255;128;0mfile\x1b[0m\n"
+
+
+EVERYTHING = ("\x1b[1;32mcsi\x1b[0m "
+              "\x1b]11;rgb:00/00/00\x1b\\osc-st "                           # what tick() sends
+              "\x1b[ q\x1b]12;#FF8000\x07osc-bel "
+              "\x1bP1$r0m\x1b\\dcs \x1bXsos\x1b\\\x1b^pm\x1b\\\x1b_apc\x1b\\strings "
+              "\x1b(B\x1b7nf \x9b31mc1\x9b0m \x9d0;title\x9c\x85 "
+              "\x1b]0;cut short\x1b[31mabort "
+              "ünïcödé ✓\n")
+EVERYTHING_STRIPPED = "csi osc-st osc-bel dcs strings nf c1  abort ünïcödé ✓\n"
+
+
+class TestStripAnsi(unittest.TestCase):
+    def test_text(self):
+        self.assertEqual(claire_ansi.strip_ansi(EVERYTHING), EVERYTHING_STRIPPED)
+
+    def test_utf8_bytes(self):
+        self.assertEqual(claire_ansi.strip_ansi(EVERYTHING.encode()), EVERYTHING_STRIPPED.encode())
+        self.assertEqual(claire_ansi.strip_ansi("ŝœ\x1b[0m".encode()), "ŝœ".encode())           # continuation bytes 0x9c/0x93 stay
+
+    def test_bytes_split_anywhere(self):
+        data = EVERYTHING.encode()
+        for split in range(len(data)):
+            stripper = claire_ansi.AnsiStripper(binary=True)
+            self.assertEqual(stripper.feed(data[:split]) + stripper.feed(data[split:]), EVERYTHING_STRIPPED.encode(), f"split at {split}")
+
+
+class TestAnsiStripper(unittest.TestCase):
+    def test_everything_split_anywhere(self):
+        for split in range(len(EVERYTHING)):
+            stripper = claire_ansi.AnsiStripper()
+            self.assertEqual(stripper.feed(EVERYTHING[:split]) + stripper.feed(EVERYTHING[split:]), EVERYTHING_STRIPPED, f"split at {split}")
+
+    def test_sequences_split_across_writes(self):
+        for split in range(len(COLORED)):
+            stripper = claire_ansi.AnsiStripper()
+            self.assertEqual(stripper.feed(COLORED[:split]) + stripper.feed(COLORED[split:]), "OK copied file\n", f"split at {split}")
+
+    def test_one_character_at_a_time(self):
+        stripper = claire_ansi.AnsiStripper()
+        self.assertEqual("".join(stripper.feed(character) for character in EVERYTHING * 3), EVERYTHING_STRIPPED * 3)
+        stripper = claire_ansi.AnsiStripper(binary=True)
+        data = EVERYTHING.encode() * 3
+        self.assertEqual(b"".join(stripper.feed(data[i:i + 1]) for i in range(len(data))), EVERYTHING_STRIPPED.encode() * 3)
+
+    def test_unterminated_string_before_another_introducer(self):
+        data = "\x1b]hello\x9b31m\x07 \x1b]hello\x1bP1$r\x1b\\done".encode()
+        for split in range(len(data) + 1):
+            stripper = claire_ansi.AnsiStripper(binary=True)
+            self.assertEqual(stripper.feed(data[:split]) + stripper.feed(data[split:]) + stripper.flush(), b" done", f"split at {split}")
+
+    def test_flush_keeps_what_strip_ansi_keeps(self):
+        stripper = claire_ansi.AnsiStripper()
+        self.assertEqual(stripper.feed("done\x1b") + stripper.flush(), claire_ansi.strip_ansi("done\x1b"))
+        self.assertEqual(stripper.feed("\x1b]unfinished") + stripper.flush(), claire_ansi.strip_ansi("\x1b]unfinished"))
+
+    def test_random_splits_match_stripping_the_whole(self):
+        pieces = ["\x1b", "\x1b\\", "\x1b[32m", "\x1b]0;", "]", "[", "P", "_", "\\", "\x07", "\x9b", "\x9c", "\x9d", "\x90", "\x85",
+                  "3", "m", ";", "(", " ", "hello", "é", "\xa0", "\n"]
+        rng = random.Random(45)
+        for _ in range(2000):
+            text = "".join(rng.choice(pieces) for _ in range(rng.randint(0, 40)))
+            for data in (text, text.encode()):
+                splits = sorted(rng.sample(range(len(data) + 1), min(len(data) + 1, rng.randint(1, 6))))
+                stripper = claire_ansi.AnsiStripper(binary=isinstance(data, bytes))
+                streamed = [stripper.feed(data[start:end]) for start, end in zip([0] + splits, splits + [len(data)])]
+                self.assertEqual(data[:0].join(streamed) + stripper.flush(), claire_ansi.strip_ansi(data), f"{data!r} split at {splits}")
+
+
+class TestAnsiTee(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.log_path = os.path.join(self.temp_dir, "job.log")
+
+    def tearDown(self):
+        claire_ansi.untee()
+        shutil.rmtree(self.temp_dir)
+
+    def test_terminal_gets_colors_and_log_gets_text(self):
+        terminal, log = io.StringIO(), io.StringIO()
+        tee = claire_ansi.AnsiTee(terminal, log)
+        for piece in (COLORED[:5], COLORED[5:20], COLORED[20:]): self.assertEqual(tee.write(piece), len(piece))
+        self.assertEqual(terminal.getvalue(), COLORED)
+        self.assertEqual(log.getvalue(), "OK copied file\n")
+
+    def test_installs_as_stdout_and_stderr(self):
+        stdout, stderr = sys.stdout, sys.stderr
+        with claire_ansi.tee_to_log(self.log_path, mode="w"):
+            self.assertIsInstance(sys.stdout, claire_ansi.AnsiTee)
+            print("\x1b[31mred\x1b[0m on stdout")
+            print("\x1b[33mwarning\x1b[0m on stderr", file=sys.stderr)
+        self.assertIs(sys.stdout, stdout)
+        self.assertIs(sys.stderr, stderr)
+        with open(self.log_path) as f: self.assertEqual(f.read(), "red on stdout\nwarning on stderr\n")
+
+
+if __name__ == '__main__':
+    unittest.main()
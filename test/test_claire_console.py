@@ -0,0 +1,272 @@
+import io
+import os
+import re
+import sys
+import time
+import random
+import threading
+import unittest
+from unittest import mock
+import multiprocessing
+import claire_console
+
+
+class FakeTerminal:
+    """
+    Just enough of a terminal to replay what ScreenWriter writes: cursor position (CUP, CUF), SGR, and printing.
+    """
+
+    TOKEN = re.compile(r'\x1b\[(\d*)(?:;(\d*))?H|\x1b\[(\d*)C|\x1b\[([\d;]*)m|([^\x1b])')
+
+    def __init__(self, width, height):
+        self.cells = [[(" ", "")] * width for _ in range(height)]
+        self.x = self.y = 0
+        self.sgr = ""
+
+    def feed(self, output):
+        position = 0
+        for match in self.TOKEN.finditer(output):
+            self.assert_contiguous(match, position, output)
+            position = match.end()
+            row, column, forward, sgr, char = match.groups()
+            if match.group(0).endswith("H"): self.y, self.x = int(row) - 1, int(column) - 1
+            elif forward is not None:        self.x += int(forward or 1)
+            elif sgr is not None:            self.sgr = sgr[2:] if sgr.startswith("0;") else ("" if sgr in ("0", "") else sgr)
+            else:
+                self.cells[self.y][self.x] = (char, self.sgr)
+                self.x += 1
+        self.assert_contiguous(None, position, output)
+
+    @staticmethod
+    def assert_contiguous(match, position, output):
+        end = match.start() if match else len(output)
+        assert position == end, f"unparsed output {output[position:end]!r}"
+
+
+class TestScreenWriter(unittest.TestCase):
+    def setUp(self):
+        self.stream = io.StringIO()
+        self.screen = claire_console.ScreenWriter(20, 5, stream=self.stream)
+
+    def written(self):
+        output = self.stream.getvalue()
+        self.stream.seek(0); self.stream.truncate()
+        return output
+
+    def test_unchanged_frame_writes_nothing(self):
+        self.screen.put(0, 0, "hello", sgr="1;32")
+        self.screen.present()
+        self.written()
+        self.assertEqual(self.screen.present(), 0)
+        self.assertEqual(self.written(), "")
+
+    def test_only_changed_cells_are_written(self):
+        self.screen.put(0, 2, "Files: 1234")
+        self.screen.present()
+        self.written()
+        self.screen.put(0, 2, "Files: 1299")
+        self.screen.present()
+        self.assertEqual(self.written(), "\x1b[3;10H\x1b[0m99")
+
+    def test_replayed_output_matches_back_buffer(self):
+        terminal, rng = FakeTerminal(20, 5), random.Random(1)
+        for _ in range(200):
+            for _ in range(rng.randrange(4)):
+                self.screen.put(rng.randrange(-3, 20), rng.randrange(5), "".join(rng.choice("ab .") for _ in range(rng.randrange(1, 8))),
+                                sgr=rng.choice(["", "1", "32", "1;33"]))
+            self.screen.present()
+            terminal.feed(self.written())
+            expected = [list(zip(chars, attrs)) for chars, attrs in zip(self.screen.chars, self.screen.attrs)]
+            self.assertEqual(terminal.cells, expected)
+
+
+def tick_many(count):
+    for _ in range(count): claire_console.tick()
+    return count
+
+
+class TestTickAggregator(unittest.TestCase):
+    def setUp(self):
+        self.heartbeats = []
+        self.aggregator = claire_console.TickAggregator(interval=0.01, render=lambda: self.heartbeats.append(1))
+
+    def tearDown(self):
+        self.aggregator.stop()
+
+    def test_threads_are_counted_without_losing_ticks(self):
+        self.aggregator.start()
+        threads = [threading.Thread(target=tick_many, args=(5000,)) for _ in range(8)]
+        for thread in threads: thread.start()
+        for thread in threads: thread.join()
+        self.assertEqual(self.aggregator.total(), 40000)
+        self.assertEqual(self.aggregator.slots_used.value, 8)
+
+    def test_threads_beyond_the_slots_share_the_overflow_slot(self):
+        aggregator = claire_console.TickAggregator(slots=4)
+        for _ in range(3):                                                     # short-lived threads, like a recycling pool
+            threads = [threading.Thread(target=lambda: [aggregator.tick() for _ in range(100)]) for _ in range(5)]
+            for thread in threads: thread.start()
+            for thread in threads: thread.join()
+        self.assertEqual(aggregator.total(), 1500)
+        self.assertEqual(aggregator.counts[4], 1100)
+        aggregator.sample(now=0.0)
+        aggregator.tick()
+        aggregator.sample(now=1.0)
+        self.assertEqual(aggregator.rates()["(overflow)"], 1.0)
+
+    def test_worker_processes_share_one_writer(self):
+        self.aggregator.start()
+        self.aggregator.tick()                                                 # the parent's slot must not be shared with forked workers
+        with multiprocessing.Pool(2, initializer=claire_console.init_tick_worker, initargs=(self.aggregator,)) as pool:
+            self.assertEqual(sum(pool.map(tick_many, [1000] * 4)), 4000)
+        self.assertEqual(self.aggregator.total(), 4001)
+        self.assertEqual(self.aggregator.counts[0], 1)
+        self.aggregator.stop()
+        self.assertGreater(len(self.heartbeats), 0)
+
+    def test_heartbeat_is_paced_like_tick(self):
+        control, stdout = claire_console.ColorControl(), io.StringIO()
+        aggregator = claire_console.TickAggregator()
+        with mock.patch.object(claire_console, "color_control", control), mock.patch.object(sys, "stdout", stdout):
+            with mock.patch.object(claire_console, "terminal_backlogged", lambda stream: True):
+                aggregator.heartbeat()
+            self.assertEqual((control.stalls, control.frames_written, stdout.getvalue()), (1, 0, ""))
+            aggregator.heartbeat()                                             # too soon after the skipped one
+            self.assertEqual(control.frames_written, 0)
+            control.last_cycle_time -= control.min_cycle_delta
+            aggregator.heartbeat()
+            self.assertEqual(control.frames_written, 1)
+            self.assertNotEqual(stdout.getvalue(), "")
+
+    def test_rates_per_worker(self):
+        self.aggregator.sample(now=0.0)
+        self.aggregator.tick(50)
+        self.aggregator.sample(now=0.5)
+        self.assertEqual(list(self.aggregator.rates().values()), [100.0])
+        self.assertTrue(list(self.aggregator.rates())[0].endswith("/MainThread"))
+
+
+class SlowTerminal(io.StringIO):
+    """
+    A terminal at the end of a slow link: every flush takes `delay` seconds.
+    """
+
+    def __init__(self, delay):
+        super().__init__()
+        self.delay = delay
+
+    def flush(self):
+        time.sleep(self.delay)
+
+
+class TestAdaptivePacing(unittest.TestCase):
+    def setUp(self):
+        self.control = claire_console.ColorControl()
+        self.control.min_cycle_delta = 0.005
+        self.stdout = sys.stdout
+
+    def tearDown(self):
+        sys.stdout = self.stdout
+
+    def tick_for(self, seconds):
+        end = time.perf_counter() + seconds
+        while time.perf_counter() < end: self.control.tick(mode="fg")
+
+    def test_slow_terminal_widens_the_interval(self):
+        sys.stdout = SlowTerminal(0.004)
+        self.tick_for(0.3)
+        stats = self.control.pacing_stats()
+        self.assertGreater(stats["slow_writes"], 0)
+        self.assertGreaterEqual(stats["cycle_delta"], 0.08)                    # writes of 4ms only fit intervals of 80ms or more
+        self.assertLess(stats["effective_rate"], 50)
+
+    def test_fast_terminal_tightens_again(self):
+        sys.stdout = io.StringIO()
+        self.control.base_cycle_delta, self.control.min_cycle_delta = 0.005, 0.04
+        self.tick_for(0.3)
+        self.assertEqual(self.control.pacing_stats()["cycle_delta"], 0.005)
+        self.assertEqual(self.control.pacing_stats()["slow_writes"], 0)
+
+    def test_blocking_writes_skip_frames_without_select(self):
+        sys.stdout = SlowTerminal(0.02)                                        # each write blocks longer than the interval
+        with mock.patch.object(claire_console, "terminal_backlogged", lambda stream: False):   # as on Windows
+            self.tick_for(0.3)
+        stats = self.control.pacing_stats()
+        self.assertGreater(stats["stalls"], 0)
+        self.assertGreater(stats["frames_written"], 0)
+
+    @unittest.skipIf(os.name == "nt", "select() only works on sockets on Windows")
+    def test_backlogged_pipe_skips_frames_instead_of_blocking(self):
+        read_end, write_end = os.pipe()
+        os.set_blocking(write_end, False)
+        try:
+            while True: os.write(write_end, b"x" * 65536)
+        except BlockingIOError:
+            pass
+        os.set_blocking(write_end, True)
+        sys.stdout = stream = os.fdopen(write_end, "w")
+        try:
+            self.tick_for(0.05)                                                # would hang on a blocking write
+            stats = self.control.pacing_stats()
+            self.assertGreater(stats["stalls"], 0)
+            self.assertEqual(stats["frames_written"], 0)
+        finally:
+            sys.stdout = self.stdout
+            os.close(read_end)
+            stream.close()
+
+
+class TestTickMeter(unittest.TestCase):
+    def setUp(self):
+        self.stream = io.StringIO()
+        self.meter = claire_console.TickMeter(total=1000, label="copying", interval=0.5, half_life=1.0, stream=self.stream)
+
+    def tearDown(self):
+        self.meter.stop()
+
+    def test_rate_and_eta(self):
+        self.meter.update(now=0.0)
+        self.meter.items = 100
+        self.meter.update(now=1.0)
+        self.assertEqual(self.meter.rate, 100.0)
+        self.assertEqual(self.meter.eta(), 9.0)
+        self.assertEqual(self.stream.getvalue(), "\x1b]2;copying 100/1,000 (10%) 100/s ETA 0:09\x07")
+        self.meter.items = 400
+        self.meter.update(now=2.0)                                             # 300/s for one half-life: halfway there
+        self.assertEqual(self.meter.rate, 200.0)
+
+    def test_updates_within_the_interval_write_nothing(self):
+        self.meter.update(now=0.0)
+        self.meter.items = 10
+        self.meter.update(now=0.1)
+        self.assertIsNone(self.meter.rate)
+        self.assertEqual(self.stream.getvalue(), "")
+
+    def test_title_push_is_flushed_on_start(self):
+        flushed = []
+        self.stream.flush = lambda: flushed.append(self.stream.getvalue())
+        self.meter.start()
+        self.assertEqual(flushed, ["\x1b[22;0t"])
+
+    def test_tick_counts_items_and_prints_no_lines(self):
+        stdout, sys.stdout = sys.stdout, io.StringIO()
+        pacing = dict(vars(claire_console.color_control))
+        try:
+            self.meter.interval, claire_console.color_control.min_cycle_delta = 0.0, 0.0
+            with self.meter:
+                for _ in range(50): claire_console.tick(items=2)
+            output = sys.stdout.getvalue()
+        finally:
+            sys.stdout = stdout
+            vars(claire_console.color_control).clear()
+            vars(claire_console.color_control).update(pacing)
+        self.assertEqual(self.meter.items, 100)
+        self.assertGreater(self.meter.titles_written, 0)
+        self.assertIsNone(claire_console.tick_meter)
+        self.assertNotIn("\n", output)
+        self.assertTrue(self.stream.getvalue().startswith("\x1b[22;0t\x1b]2;copying "))
+        self.assertTrue(self.stream.getvalue().endswith("\x1b[23;0t"))
+
+
+if __name__ == '__main__':
+    unittest.main()
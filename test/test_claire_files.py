@@ -0,0 +1,74 @@
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+import claire_files
+
+
+class TestStripAnsiTree(unittest.TestCase):
+    COLORED = "\x1b[1;32mOK\x1b[0m copied file\n"
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        for i in range(6):
+            self.write(os.path.join("jobs" if i % 2 else "", f"job{i}.log"), self.COLORED * 100)
+        self.write("plain.log", "nothing to strip\n")
+        self.write("notes.txt", self.COLORED)
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def write(self, name, content):
+        path = os.path.join(self.root, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w') as f: f.write(content)
+        return path
+
+    def read(self, name):
+        with open(os.path.join(self.root, name)) as f: return f.read()
+
+    def test_strips_matching_files_in_parallel(self):
+        report = claire_files.strip_ansi_tree(self.root, "*.log", workers=2)
+        self.assertEqual((report.files_stripped, report.files_clean, report.files_skipped), (6, 1, 0))
+        self.assertEqual(self.read(os.path.join("jobs", "job1.log")), "OK copied file\n" * 100)
+        self.assertEqual(self.read("notes.txt"), self.COLORED)                      # doesn't match the pattern
+        self.assertGreater(report.bytes_processed, 0)
+
+    def test_second_run_skips_unchanged_files(self):
+        claire_files.strip_ansi_tree(self.root, "*.log", workers=1)
+        self.write("job2.log", self.COLORED)                                        # changed
+        os.utime(os.path.join(self.root, "job4.log"), ns=(0, 0))                    # touched, same content
+        report = claire_files.strip_ansi_tree(self.root, "*.log", workers=1)
+        self.assertEqual((report.files_stripped, report.files_clean, report.files_skipped), (1, 0, 6))
+        self.assertEqual(self.read("job2.log"), "OK copied file\n")
+        self.assertEqual(claire_files.strip_ansi_tree(self.root, "*.log", workers=1).files_skipped, 7)
+
+
+    def test_cp1252_file_keeps_bytes_that_look_like_utf8_c1_controls(self):
+        path = os.path.join(self.root, "ansi.log")
+        with open(path, 'wb') as f: f.write("\x1b[32mcafé Â›1m done\n".encode("cp1252"))
+        self.assertTrue(claire_files.strip_ansi_from_file(path))
+        with open(path, 'rb') as f: self.assertEqual(f.read(), "café Â›1m done\n".encode("cp1252"))
+        with open(path, 'wb') as f: f.write("\x1b[32mok \x9b1m done\n".encode("utf-8"))     # a real C1 CSI in a UTF-8 file
+        self.assertTrue(claire_files.strip_ansi_from_file(path))
+        with open(path, 'rb') as f: self.assertEqual(f.read(), b"ok  done\n")
+
+    @unittest.skipIf(os.name == "nt", "creating symlinks needs extra privileges on Windows")
+    def test_failed_files_are_reported_and_the_rest_still_done(self):
+        os.symlink(os.path.join(self.root, "missing"), os.path.join(self.root, "dangling.log"))   # fails to stat
+        strip_ansi = claire_files.strip_ansi
+        def strip_and_delete_job5(content):                                                    # job5 vanishes before its turn
+            if os.path.exists(os.path.join(self.root, "jobs", "job5.log")): os.remove(os.path.join(self.root, "jobs", "job5.log"))
+            return strip_ansi(content)
+        with mock.patch.object(claire_files, "strip_ansi", strip_and_delete_job5):
+            report = claire_files.strip_ansi_tree(self.root, "*.log", workers=1)
+        self.assertEqual(sorted(os.path.basename(filename) for filename, _ in report.failures), ["dangling.log", "job5.log"])
+        self.assertEqual((report.files_stripped, report.files_clean), (5, 1))
+        self.write(os.path.join("jobs", "job5.log"), self.COLORED)
+        report = claire_files.strip_ansi_tree(self.root, "*.log", workers=1)                  # the manifest was saved
+        self.assertEqual((report.files_stripped, report.files_skipped, len(report.failures)), (1, 6, 1))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,97 @@
+import os
+import json
+import shutil
+import tempfile
+import unittest
+import claire_fonts
+
+
+class TestFontRegistry(unittest.TestCase):
+    def setUp(self):
+        self.registry = claire_fonts.FontRegistry([claire_fonts.DEFAULT_FONT_DIR])   # res/fonts only, without saving an index
+
+    def test_filename_parsing(self):
+        face = claire_fonts.face_from_filename("res/fonts/jetbrains-mono/JetBrainsMono-SemiBoldItalic.ttf")
+        self.assertEqual((face.family, face.weight, face.italic), ("JetBrainsMono", 600, True))
+        face = claire_fonts.face_from_filename("res/fonts/generale-mono/GeneraleMonoA.ttf")
+        self.assertEqual((face.family, face.weight, face.italic), ("GeneraleMonoA", 400, False))
+
+    def test_find_closest_weight(self):
+        self.assertTrue(self.registry.find("Roboto", 850).path.endswith("Roboto-Black.ttf"))
+        self.assertTrue(self.registry.find("jetbrains mono", "Bold", italic=True).path.endswith("JetBrainsMono-BoldItalic.ttf"))
+        with self.assertRaises(KeyError): self.registry.find("Comic Sans")
+        with self.assertRaises(KeyError): self.registry.find("Roboto", "Heavy")
+        self.assertTrue(self.registry.find("jetbrains mono", "Semi Bold").path.endswith("JetBrainsMono-SemiBold.ttf"))
+
+    def test_fonts_are_cached(self):
+        font = self.registry.font("Roboto Mono", 24)
+        self.assertIs(self.registry.font("Roboto Mono", 24), font)
+        self.assertEqual(self.registry.cache_info()["font_misses"], 1)
+
+    def test_font_files_are_bounded_too(self):
+        registry = claire_fonts.FontRegistry([claire_fonts.DEFAULT_FONT_DIR], max_fonts=2)
+        for family in ("Roboto Mono", "JetBrains Mono", "Roboto"): registry.font(family, 24)
+        registry.font("Roboto", 30)                                            # another size of a file still cached
+        info = registry.cache_info()
+        self.assertEqual((info["font_files_read"], info["font_files_cached"]), (3, 2))
+
+    def test_text_width_matches_pillow(self):
+        font = self.registry.font("JetBrains Mono", 40)
+        self.assertEqual(self.registry.text_width("Excuse Me?", "JetBrains Mono", 40), font.getlength("Excuse Me?"))
+
+
+class TestFontDiscovery(unittest.TestCase):
+    @staticmethod
+    def create_font_file(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w') as f: f.write('not really a font')
+
+    def setUp(self):
+        self.temp_dir   = tempfile.mkdtemp()
+        self.fonts_dir  = os.path.join(self.temp_dir, "fonts")
+        self.cache_path = os.path.join(self.temp_dir, "cache", "font_index.json")
+        self.create_font_file(os.path.join(self.fonts_dir, "a", "Shallow-Regular.ttf"))
+        self.create_font_file(os.path.join(self.fonts_dir, "a", "b", "c", "d", "Deep-Regular.ttf"))
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def discovery(self, max_depth=2):
+        return claire_fonts.FontDiscovery([self.fonts_dir], max_depth=max_depth, cache_path=self.cache_path)
+
+    def test_depth_limit(self):
+        self.assertIsNotNone(self.discovery().find("shallow"))
+        self.assertIsNone   (self.discovery().find("deep"))
+        self.assertIsNotNone(self.discovery(max_depth=4).find("deep"))
+
+    def test_index_is_reused_until_a_directory_changes(self):
+        first = self.discovery()
+        self.assertIsNotNone(first.find("shallow"))
+        self.assertTrue(first.scanned)
+        second = self.discovery()
+        self.assertEqual(second.fonts, first.fonts)
+        self.assertFalse(second.scanned)
+        self.create_font_file(os.path.join(self.fonts_dir, "a", "New-Regular.ttf"))
+        os.utime(os.path.join(self.fonts_dir, "a"), (0, 0))              # make sure the mtime differs even on coarse filesystems
+        third = self.discovery()
+        self.assertIsNotNone(third.find("new"))
+        self.assertTrue(third.scanned)
+
+    def test_malformed_index_is_a_cache_miss(self):
+        self.discovery().fonts
+        for index in ([], {"search_path": [self.fonts_dir], "max_depth": 2}, {"search_path": [self.fonts_dir], "max_depth": 2, "dir_mtimes": [], "fonts": {}}):
+            with open(self.cache_path, 'w') as f: json.dump(index, f)
+            discovery = self.discovery()
+            self.assertIsNotNone(discovery.find("shallow"))
+            self.assertTrue(discovery.scanned)
+
+    def test_registry_uses_the_same_index(self):
+        discovery = self.discovery()
+        registry  = claire_fonts.FontRegistry(discovery=discovery)
+        self.assertEqual(registry.find("Shallow").path, discovery.find("shallow"))
+        with self.assertRaises(KeyError): registry.find("Deep")                 # below max_depth for both
+        self.assertEqual(registry.families(), ["Shallow"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,78 @@
+import unittest
+import numpy as np
+from PIL import Image, ImageDraw, ImageFilter
+import claire_images
+import claire_fonts
+
+
+class TestBackgroundCache(unittest.TestCase):
+    def setUp(self):
+        self.cache = claire_images.BackgroundCache()
+
+    def test_png_is_preferred(self):
+        self.assertTrue(self.cache.find(480, 800).endswith("480x800_circuit.png"))
+
+    def test_decoded_once(self):
+        first = self.cache.get(800, 480)
+        self.assertIs(self.cache.get(800, 480), first)
+        self.assertEqual((self.cache.hits, self.cache.misses), (1, 1))
+        self.assertEqual(first.shape, (480, 800, 3))
+        self.assertFalse(first.flags.writeable)
+
+    def test_crop_is_a_view(self):
+        region = self.cache.crop(800, 480, (10, 20, 300, 60))
+        self.assertEqual(region.shape, (60, 300, 3))
+        self.assertTrue(np.shares_memory(region, self.cache.get(800, 480)))
+
+    def test_memory_bound_evicts(self):
+        cache = claire_images.BackgroundCache(max_bytes=800 * 480 * 3)
+        cache.get(800, 480)
+        cache.get(480, 800)
+        self.assertEqual(cache.evictions, 1)
+        self.assertLessEqual(cache.cached_bytes, 800 * 480 * 3)
+
+
+class TestTextEffects(unittest.TestCase):
+    def setUp(self):
+        self.fonts      = claire_fonts.FontRegistry([claire_fonts.DEFAULT_FONT_DIR])  # res/fonts only, without saving an index
+        self.font_path  = self.fonts.find("JetBrains Mono").path
+        self.font       = self.fonts.font_from_path(self.font_path, 40)
+        self.background = Image.fromarray(np.random.default_rng(0).integers(0, 256, (480, 800, 3), dtype=np.uint8))
+        self.effects    = claire_images.TextEffects(fonts=self.fonts)
+
+    def test_shadow_matches_full_frame_drawing(self):
+        expected = self.background.copy()
+        d = ImageDraw.Draw(expected)
+        d.text((12, 12), "Text Example", font=self.font, fill=(0, 0, 0))
+        d.text((10, 10), "Text Example", font=self.font, fill=(0, 255, 0))
+        image = self.background.copy()
+        self.effects.draw(image, (10, 10), "Text Example", self.font_path, 40, claire_images.TextEffect(shadow_offset=(2, 2)))
+        self.assertTrue(np.array_equal(np.asarray(image), np.asarray(expected)))
+
+    def test_blur_only_touches_the_text_region(self):
+        expected = self.background.filter(ImageFilter.GaussianBlur(radius=2))
+        ImageDraw.Draw(expected).text((10, 10), "Text Example", font=self.font, fill=(0, 255, 0))
+        image = self.background.copy()
+        x, y, width, height = self.effects.draw(image, (10, 10), "Text Example", self.font_path, 40, claire_images.TextEffect(blur_radius=2))
+        changed = np.any(np.asarray(image) != np.asarray(self.background), axis=2)
+        self.assertFalse(changed[:y].any() or changed[y + height:].any() or changed[:, :x].any() or changed[:, x + width:].any())
+        self.assertTrue(np.array_equal(np.asarray(image)[y:y + height, x:x + width], np.asarray(expected)[y:y + height, x:x + width]))
+
+    def test_text_is_rasterized_once(self):
+        for _ in range(3): self.effects.draw(self.background.copy(), (10, 10), "Text Example", self.font_path, 40)
+        self.assertEqual(self.effects.cache_info().misses, 1)
+
+
+    def test_blurred_region_is_reused_on_the_same_background(self):
+        effect = claire_images.TextEffect(blur_radius=2, contrast=0.5, shadow_offset=(2, 2))
+        first, second = self.background.copy(), self.background.copy()
+        self.effects.draw(first,  (10, 10), "Text Example", self.font_path, 40, effect)
+        self.effects.draw(second, (10, 10), "Text Example", self.font_path, 40, effect)
+        self.assertEqual(self.effects.region_cache_info()["hits"], 1)
+        self.assertTrue(np.array_equal(np.asarray(first), np.asarray(second)))
+        self.effects.draw(first, (10, 10), "Text Example", self.font_path, 40, effect)    # the background under it changed
+        self.assertEqual(self.effects.region_cache_info()["misses"], 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,231 @@
+import sys
+import enum
+import queue
+import types
+import threading
+import unittest
+from unittest import mock
+import numpy as np
+import claire_lcd
+import claire_fonts
+
+
+class FakeLcd:
+    def __init__(self, width=800, height=480):
+        self.width, self.height = width, height
+        self.calls = []
+    def get_width (self): return self.width
+    def get_height(self): return self.height
+    def DisplayPILImage(self, image, x=0, y=0, image_width=0, image_height=0):
+        self.calls.append((x, y) + image.size)
+
+
+class TestDirtyRegionRenderer(unittest.TestCase):
+    def setUp(self):
+        self.lcd      = FakeLcd()
+        self.renderer = claire_lcd.DirtyRegionRenderer(self.lcd)
+        self.frame    = np.zeros((480, 800, 3), dtype=np.uint8)
+
+    def test_first_frame_is_sent_whole(self):
+        self.assertEqual(self.renderer.render(self.frame), [(0, 0, 800, 480)])
+
+    def test_unchanged_frame_sends_nothing(self):
+        self.renderer.render(self.frame)
+        self.assertEqual(self.renderer.render(self.frame.copy()), [])
+
+    def test_only_changed_rectangle_is_sent(self):
+        self.renderer.render(self.frame)
+        frame = self.frame.copy()
+        frame[100:120, 40:70] = 255
+        self.assertEqual(self.renderer.render(frame), [(32, 96, 48, 32)])
+        self.assertEqual(self.lcd.calls[-1], (32, 96, 48, 32))
+
+    def test_separate_changes_are_separate_rectangles(self):
+        self.renderer.render(self.frame)
+        frame = self.frame.copy()
+        frame[0, 0] = 1
+        frame[479, 799] = 1
+        self.assertEqual(sorted(self.renderer.render(frame)), [(0, 0, 16, 16), (784, 464, 16, 16)])
+
+
+class TestMarquee(unittest.TestCase):
+    def setUp(self):
+        self.lcd  = FakeLcd()
+        self.font = claire_fonts.FontRegistry([claire_fonts.DEFAULT_FONT_DIR]).font("JetBrains Mono", 36)   # res/fonts only, without saving an index
+
+    def test_long_title_scrolls_without_rerendering(self):
+        marquee = claire_lcd.Marquee(self.lcd, (0, 400, 300, 48), self.font, step=5)
+        marquee.set_title("The Coathangers – Excuse Me? and then some more title")
+        for _ in range(1000): self.assertTrue(marquee.step())
+        self.assertEqual(marquee.renders, 1)
+        self.assertEqual(self.lcd.calls[-1], (0, 400, 300, 48))
+
+    def test_wraps_around_seamlessly(self):
+        marquee = claire_lcd.Marquee(self.lcd, (0, 400, 300, 48), self.font, step=1)
+        marquee.set_title("The Coathangers – Excuse Me? and then some more title")
+        start = marquee.frame().copy()
+        for _ in range(marquee.period): marquee.step()
+        self.assertTrue(np.array_equal(marquee.frame(), start))
+
+    def test_short_title_does_not_scroll(self):
+        marquee = claire_lcd.Marquee(self.lcd, (0, 400, 300, 48), self.font)
+        marquee.set_title("Freya")
+        self.assertFalse(marquee.step())
+        marquee.set_title("Freya")
+        self.assertEqual(len(self.lcd.calls), 1)
+
+
+class TestRgb565Converter(unittest.TestCase):
+    def test_conversion(self):
+        pixels = np.array([[[255, 0, 0], [0, 255, 0], [0, 0, 255], [255, 255, 255]]], dtype=np.uint8)
+        data = claire_lcd.Rgb565Converter(little_endian=True).convert(pixels)
+        self.assertEqual(bytes(data), bytes([0x00, 0xF8, 0xE0, 0x07, 0x1F, 0x00, 0xFF, 0xFF]))
+        data = claire_lcd.Rgb565Converter(little_endian=False).convert(pixels)
+        self.assertEqual(bytes(data), bytes([0xF8, 0x00, 0x07, 0xE0, 0x00, 0x1F, 0xFF, 0xFF]))
+
+    def test_strided_rectangle_matches_copy(self):
+        frame     = np.random.default_rng(0).integers(0, 256, (480, 800, 3), dtype=np.uint8)
+        converter = claire_lcd.Rgb565Converter()
+        view      = bytes(converter.convert(frame[100:140, 200:520]))
+        self.assertEqual(view, bytes(converter.convert(frame[100:140, 200:520].copy())))
+
+    def test_buffers_are_reused(self):
+        converter = claire_lcd.Rgb565Converter()
+        frame     = np.zeros((480, 800, 3), dtype=np.uint8)
+        for _ in range(10): converter.convert(frame[0:48, 0:300])
+        self.assertEqual(converter.allocations, 1)
+
+
+class SlowLinkLcd(FakeLcd):
+    """
+    A panel on a link of a given speed: every push moves the fake clock forward by the time the bytes would take.
+    """
+
+    def __init__(self, bytes_per_second):
+        super().__init__()
+        self.bytes_per_second = bytes_per_second
+        self.now = 0.0
+    def clock(self): return self.now
+    def DisplayPILImage(self, image, x=0, y=0, image_width=0, image_height=0):
+        super().DisplayPILImage(image, x, y)
+        self.now += image.size[0] * image.size[1] * 2 / self.bytes_per_second
+
+
+class TestFrameScheduler(unittest.TestCase):
+    def make_scheduler(self, bytes_per_second):
+        self.lcd = SlowLinkLcd(bytes_per_second)
+        scheduler = claire_lcd.FrameScheduler(self.lcd, target_fps=10, clock=self.lcd.clock, initial_bytes_per_second=bytes_per_second)
+        scheduler.add_widget("progress", lambda: (np.zeros((12, 760, 3), np.uint8), 20, 440), interval=0.1, priority=10)
+        scheduler.add_widget("art"     , lambda: (np.zeros((300, 300, 3), np.uint8), 0, 0) , interval=0.1, priority=1)
+        return scheduler
+
+    def run_frames(self, scheduler, count):
+        for _ in range(count):
+            scheduler.tick()
+            self.lcd.now = max(self.lcd.now, scheduler.frames * 0.1)
+
+    def test_fast_link_pushes_everything(self):
+        scheduler = self.make_scheduler(10e6)
+        self.run_frames(scheduler, 20)
+        stats = scheduler.stats()
+        self.assertEqual((stats["progress"]["pushes"], stats["art"]["pushes"]), (20, 20))
+
+    def test_slow_link_skips_low_priority(self):
+        scheduler = self.make_scheduler(200e3)
+        self.run_frames(scheduler, 20)
+        stats = scheduler.stats()
+        self.assertGreater(stats["art"]["skips"], 0)
+        self.assertGreater(stats["art"]["pushes"], 0)                    # skipped, but not starved
+        self.assertEqual(stats["progress"]["pushes"], 20)                # never gives way to the art
+
+
+class QueuedLcd(FakeLcd):
+    """
+    A panel driven like the turing app's threaded mode: DisplayPILImage() only queues lines of 8 rows, and drain()
+    writes them out at the link's speed.
+    """
+
+    def __init__(self, bytes_per_second):
+        super().__init__()
+        self.bytes_per_second = bytes_per_second
+        self.update_queue = queue.Queue()
+        self.credit = 0.0
+        self.now = 0.0
+    def clock(self): return self.now
+    def DisplayPILImage(self, image, x=0, y=0, image_width=0, image_height=0):
+        super().DisplayPILImage(image, x, y)
+        width, height = image.size
+        for row in range(0, height, 8): self.update_queue.put(width * min(8, height - row) * 2)
+    def drain(self, seconds):
+        self.now += seconds
+        self.credit += seconds * self.bytes_per_second
+        while not self.update_queue.empty() and self.credit >= self.update_queue.queue[0]:
+            self.credit -= self.update_queue.get()
+        if self.update_queue.empty(): self.credit = 0.0
+
+
+class TestFrameSchedulerQueuedDriver(unittest.TestCase):
+    def test_throughput_comes_from_the_queue_draining(self):
+        lcd = QueuedLcd(200e3)
+        scheduler = claire_lcd.FrameScheduler(lcd, target_fps=10, clock=lcd.clock)
+        scheduler.add_widget("progress", lambda: (np.zeros((12, 760, 3), np.uint8), 20, 440), interval=0.1, priority=10)
+        scheduler.add_widget("art"     , lambda: (np.zeros((300, 300, 3), np.uint8), 0, 0) , interval=0.1, priority=1)
+        most_queued = 0
+        for _ in range(100):
+            scheduler.tick()
+            most_queued = max(most_queued, sum(lcd.update_queue.queue))
+            lcd.drain(0.1)
+        stats = scheduler.stats()
+        self.assertAlmostEqual(stats["scheduler"]["link_bytes_per_second"], 200e3, delta=40e3)
+        self.assertGreater(stats["scheduler"]["backpressure_frames"], 0)
+        self.assertGreater(stats["art"]["pushes"], 0)
+        self.assertLess(most_queued, 2 * 300 * 300 * 2)                  # the backlog doesn't keep growing
+
+
+class LcdCommRevA(FakeLcd):
+    """
+    Named like the turing driver, so push_region() sends it raw RGB565 through SendCommand() and SendLine().
+    """
+
+    def __init__(self, queued=False):
+        super().__init__()
+        self.update_queue = queue.Queue() if queued else None
+        self.update_queue_mutex = threading.Lock()
+        self.commands, self.lines = [], []
+    def SendCommand(self, command, x, y, ex, ey): self.commands.append((command, x, y, ex, ey))
+    def SendLine(self, line):                     self.lines.append(line)
+
+
+class TestPushRegionRawRgb565(unittest.TestCase):
+    def setUp(self):
+        class Command(enum.IntEnum):
+            DISPLAY_BITMAP = 197
+        lcd_comm_rev_a = types.ModuleType("library.lcd.lcd_comm_rev_a")
+        lcd_comm_rev_a.Command = self.Command = Command
+        patcher = mock.patch.dict(sys.modules, {"library": types.ModuleType("library"), "library.lcd": types.ModuleType("library.lcd"),
+                                                "library.lcd.lcd_comm_rev_a": lcd_comm_rev_a})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.frame = np.random.default_rng(0).integers(0, 256, (480, 800, 3), dtype=np.uint8)
+
+    def test_bitmap_command_and_lines(self):
+        lcd = LcdCommRevA()
+        claire_lcd.push_region(lcd, self.frame[100:140, 200:520], 200, 100)
+        self.assertEqual(lcd.commands, [(self.Command.DISPLAY_BITMAP, 200, 100, 519, 139)])
+        expected = bytes(claire_lcd.Rgb565Converter(little_endian=True).convert(self.frame[100:140, 200:520].copy()))
+        self.assertEqual(b"".join(bytes(line) for line in lcd.lines), expected)
+        self.assertTrue(all(len(line) <= 800 * 8 for line in lcd.lines))
+        self.assertEqual(lcd.calls, [])                                        # DisplayPILImage() isn't used
+
+    def test_queued_lines_are_copies(self):
+        lcd = LcdCommRevA(queued=True)
+        converter = claire_lcd.Rgb565Converter()
+        claire_lcd.push_region(lcd, self.frame[0:16, 0:100], 0, 0, converter)
+        first = b"".join(lcd.lines)
+        self.assertTrue(all(isinstance(line, bytes) for line in lcd.lines))
+        converter.convert(self.frame[16:32, 0:100])                            # reuses the converter's buffer
+        self.assertEqual(b"".join(lcd.lines), first)
+
+
+if __name__ == '__main__':
+    unittest.main()
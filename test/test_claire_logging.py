@@ -0,0 +1,45 @@
+import os
+import glob
+import logging
+import unittest
+import claire_logging
+
+
+class TestClaireLogging(unittest.TestCase):
+    def test_get_logger_leaves_root_alone(self):
+        root_handlers, root_level = list(logging.root.handlers), logging.root.level
+        logger = claire_logging.get_logger("claire_test_module")
+        claire_logging.get_logger("claire_test_module")
+        self.assertEqual(logging.root.handlers, root_handlers)
+        self.assertEqual(logging.root.level, root_level)
+        self.assertEqual(sum(isinstance(handler, logging.NullHandler) for handler in logger.handlers), 1)
+        self.assertEqual(logger.level, logging.NOTSET)
+
+    def test_every_module_is_a_package_logger(self):
+        package_dir = os.path.dirname(os.path.abspath(claire_logging.__file__))
+        modules = {os.path.splitext(os.path.basename(path))[0] for path in glob.glob(os.path.join(package_dir, "claire_*.py"))}
+        self.assertEqual(modules - set(claire_logging.PACKAGE_LOGGER_NAMES), set())
+
+    def test_ring_buffer_formats_only_when_read(self):
+        logger = claire_logging.get_logger("claire_test_ring")
+        logger.propagate = False                                             # a test runner's capture handler would format them
+        calls = []
+        trace = claire_logging.trace_to_ring(logger, capacity=3)
+        try:
+            for i in range(5):
+                logger.debug("step %d: %s", i, claire_logging.Lazy(lambda i=i: calls.append(i) or f"value {i}"))
+            self.assertEqual(calls, [])
+            self.assertEqual(trace.lines(), [f"\t\t[DEBUG] step {i}: value {i}" for i in (2, 3, 4)])
+            self.assertEqual(calls, [2, 3, 4])
+        finally:
+            claire_logging.stop_trace(logger, trace)
+        self.assertEqual(logger.level, logging.NOTSET)
+
+    def test_filtered_out_records_are_never_formatted(self):
+        logger = claire_logging.get_logger("claire_test_filtered")
+        logger.setLevel(logging.WARNING)
+        logger.debug("%s", claire_logging.Lazy(lambda: self.fail("formatted a filtered-out record")))
+
+
+if __name__ == '__main__':
+    unittest.main()
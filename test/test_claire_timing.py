@@ -0,0 +1,40 @@
+import json
+import unittest
+import claire_timing
+
+
+class TestTimings(unittest.TestCase):
+    def test_disabled_records_nothing(self):
+        timings = claire_timing.Timings(enabled=False)
+        @timings.timed("add")
+        def add(a, b): return a + b
+        with timings.span("block"): pass
+        timings.count("events")
+        self.assertEqual(add(1, 2), 3)
+        self.assertIs(timings.span("a"), timings.span("b"))                    # one shared do-nothing context manager
+        self.assertEqual(timings.summary(), {"spans": {}, "counters": {}})
+
+    def test_spans_decorators_and_counters(self):
+        timings = claire_timing.Timings(enabled=True)
+        @timings.timed()
+        def fail(): raise ValueError("still timed")
+        for _ in range(3):
+            with timings.span("block"): pass
+        with self.assertRaises(ValueError): fail()
+        timings.count("events", 2)
+        summary = json.loads(timings.dump_json())
+        self.assertEqual(summary["spans"]["block"]["count"], 3)
+        self.assertIn("TestTimings.test_spans_decorators_and_counters.<locals>.fail", summary["spans"])
+        self.assertEqual(summary["counters"], {"events": 2})
+
+    def test_percentiles(self):
+        histogram = claire_timing.LatencyHistogram()
+        for i in range(1, 1001): histogram.record(i / 1000 * 0.1)         # 0.1ms .. 100ms, evenly
+        summary = histogram.summary()
+        for name, expected in (("p50", 0.05), ("p95", 0.095), ("p99", 0.099)):
+            self.assertAlmostEqual(summary[name], expected, delta=expected * 0.1)
+        self.assertEqual((summary["min"], summary["max"], summary["count"]), (0.0001, 0.1, 1000))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,162 @@
+import os
+import shutil
+import tempfile
+import threading
+import time
+import types
+import unittest
+from unittest import mock
+import claire_usb
+
+
+class FakeClock:
+    def __init__(self): self.now = 0.0
+    def __call__(self):  return self.now
+
+
+class TestUsbDeviceRegistry(unittest.TestCase):
+    def add_device(self, name, vid, pid, serial=""):
+        path = os.path.join(self.sysfs, name)
+        os.makedirs(path)
+        self.devnum = getattr(self, "devnum", 0) + 1
+        for attribute, value in (("idVendor", f"{vid:04x}"), ("idProduct", f"{pid:04x}"), ("serial", serial), ("product", "Smart Screen"),
+                                 ("devnum", str(self.devnum))):
+            with open(os.path.join(path, attribute), 'w') as f: f.write(value + "\n")
+
+    def setUp(self):
+        self.sysfs = tempfile.mkdtemp()
+        self.add_device("usb1", 0x1d6b, 0x0002)                              # root hub
+        self.add_device("1-1", 0x1a86, 0x5722, "USB35INCHIPSV2")
+        os.makedirs(os.path.join(self.sysfs, "1-1:1.0"))                     # interface, not a device
+        self.clock = FakeClock()
+        self.registry = claire_usb.UsbDeviceRegistry(self.sysfs, poll_interval=1.0, clock=self.clock)
+
+    def tearDown(self):
+        shutil.rmtree(self.sysfs)
+
+    def test_lazy_lookups(self):
+        self.assertEqual(self.registry.devices_read, 0)
+        device = self.registry.find(0x1a86, 0x5722)
+        self.assertEqual((device.serial, device.product), ("USB35INCHIPSV2", "Smart Screen"))
+        self.assertIs(self.registry.find_serial("USB35INCHIPSV2"), device)
+        self.assertIsNone(self.registry.find(0x1234, 0x5678))
+        self.assertEqual(len(self.registry.all()), 2)
+
+    def test_hotplug_only_reads_new_devices(self):
+        self.registry.find(0x1a86, 0x5722)
+        self.assertEqual(self.registry.devices_read, 2)
+        self.add_device("1-2", 0x0483, 0x5740, "REVB")
+        self.assertIsNone(self.registry.find(0x0483, 0x5740))                # not polled again yet
+        self.clock.now += 1.0
+        self.assertEqual(self.registry.find(0x0483, 0x5740).serial, "REVB")
+        self.assertEqual(self.registry.devices_read, 3)
+        shutil.rmtree(os.path.join(self.sysfs, "1-1"))
+        self.clock.now += 1.0
+        self.assertIsNone(self.registry.find(0x1a86, 0x5722))
+        self.assertIsNone(self.registry.find_serial("USB35INCHIPSV2"))
+
+    def test_other_device_on_the_same_port_replaces_the_old_one(self):
+        self.registry.find(0x1a86, 0x5722)
+        shutil.rmtree(os.path.join(self.sysfs, "1-1"))
+        self.add_device("1-1", 0x0483, 0x5740, "REVB")                     # swapped between two polls
+        self.clock.now += 1.0
+        self.assertIsNone(self.registry.find(0x1a86, 0x5722))
+        self.assertEqual(self.registry.find(0x0483, 0x5740).serial, "REVB")
+        self.clock.now += 1.0
+        self.assertFalse(self.registry.refresh())
+        self.assertEqual(self.registry.devices_read, 3)
+
+    def test_enumerates_once_without_sysfs(self):
+        calls = []
+        def enumerate_devices():
+            calls.append(1)
+            return [claire_usb.UsbDevice(0x1a86, 0x5722, "A", path="hid1")]
+        registry = claire_usb.UsbDeviceRegistry(None, enumerate_devices=enumerate_devices)
+        for _ in range(3): self.assertEqual(registry.find(0x1a86, 0x5722).serial, "A")
+        self.assertEqual(len(calls), 1)
+
+    def test_non_hid_devices_are_listed_without_sysfs(self):
+        screen   = types.SimpleNamespace(idVendor=0x1a86, idProduct=0x5722, iSerialNumber=3, iManufacturer=1, iProduct=2, bus=1, address=7)
+        keyboard = types.SimpleNamespace(idVendor=0x046d, idProduct=0xc31c, iSerialNumber=0, iManufacturer=1, iProduct=2, bus=1, address=3)
+        strings  = {(7, 3): "USB35INCHIPSV2", (7, 2): "UsbMonitor", (3, 2): "Keyboard"}
+        hid_devices = [{"vendor_id": 0x046d, "product_id": 0xc31c, "serial_number": "", "path": b"hid-keyboard"},
+                       {"vendor_id": 0x0483, "product_id": 0x5740, "serial_number": "REVB", "path": b"hid-knob"}]
+        with mock.patch.object(claire_usb.usb.core, "find", lambda find_all: [screen, keyboard]), \
+             mock.patch.object(claire_usb.usb.util, "get_string", lambda device, index: strings.get((device.address, index), "")), \
+             mock.patch.object(claire_usb.hid, "enumerate", lambda: hid_devices, create=True):
+            registry = claire_usb.UsbDeviceRegistry(None)
+            device = registry.find(0x1a86, 0x5722)
+            self.assertEqual((device.serial, device.product, device.path, device.devnum), ("USB35INCHIPSV2", "UsbMonitor", "usb:1:7", 7))
+            self.assertEqual(len(registry.find_all(0x046d, 0xc31c)), 1)                  # listed by both, kept once
+            self.assertEqual(registry.find_serial("REVB").path, "hid-knob")               # HID only, pyusb didn't list it
+
+
+
+class FakeHidDevice:
+    """
+    Emits numbered reports at a fixed rate, like a mouse or a knob being turned, through hidapi's read(max_length, timeout_ms).
+    """
+
+    def __init__(self, rate, count, report_size=8):
+        self.interval = 1 / rate
+        self.count = count
+        self.report_size = report_size
+        self.sent = 0
+        self.start = None
+
+    def read(self, max_length, timeout_ms):
+        if self.start is None: self.start = time.perf_counter()
+        if self.sent >= self.count:
+            time.sleep(timeout_ms / 1000)
+            return []
+        delay = self.start + self.sent * self.interval - time.perf_counter()
+        if delay > timeout_ms / 1000:
+            time.sleep(timeout_ms / 1000)
+            return []
+        if delay > 0: time.sleep(delay)
+        self.sent += 1
+        return list(self.sent.to_bytes(4, "little")) + [0] * (self.report_size - 4)
+
+
+def report_number(report):
+    return int.from_bytes(report.data[:4], "little")
+
+
+class TestHidReader(unittest.TestCase):
+    def test_iterator_gets_every_report_in_order(self):
+        reader = claire_usb.HidReader(FakeHidDevice(rate=2000, count=200), report_size=8).start()
+        numbers = []
+        for batch in reader:
+            numbers += [report_number(report) for report in batch]
+            if len(numbers) == 200: break
+        reader.close()
+        self.assertEqual(numbers, list(range(1, 201)))
+        self.assertEqual(reader.stats()["dropped"], 0)
+
+    def test_callbacks_get_batches_with_timestamps(self):
+        batches, done = [], threading.Event()
+        def callback(batch):
+            batches.append(batch)
+            if sum(map(len, batches)) == 100: done.set()
+        reader = claire_usb.HidReader(FakeHidDevice(rate=5000, count=100), report_size=8, batch_size=16)
+        reader.add_callback(callback)
+        with reader:
+            self.assertTrue(done.wait(5))
+        reports = [report for batch in batches for report in batch]
+        self.assertTrue(all(len(batch) <= 16 for batch in batches))
+        self.assertEqual([report.timestamp for report in reports], sorted(report.timestamp for report in reports))
+
+    def test_full_ring_drops_oldest(self):
+        reader = claire_usb.HidReader(None, report_size=8, capacity=4)
+        for number in range(1, 11):
+            reader.put(number.to_bytes(4, "little"), float(number))
+        self.assertEqual([report_number(report) for report in reader.read_batch(timeout=0)], [7, 8, 9, 10])
+        self.assertEqual((reader.dropped, reader.overruns), (6, 1))
+        for number in range(11, 17):
+            reader.put(number.to_bytes(4, "little"), float(number))
+        self.assertEqual((reader.dropped, reader.overruns), (8, 2))
+        self.assertEqual(reader.read_batch(timeout=0)[0], claire_usb.HidReport((13).to_bytes(4, "little"), 13.0))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,330 @@
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+from pathlib import Path
+import claire_winamp
+import json
+import threading
+import claire_logging
+from claire_winamp import Winamp, UserCommand, WinampPlaylistLocator, AlbumArtResolver, TrackPositionTracker, PlayingStatus, WinampCommandQueue
+
+
+class FakeWinamp(Winamp):
+    """
+    A Winamp controller that answers user commands from an in-memory playlist instead of a real Winamp window.
+    """
+
+    def __init__(self, playlist_path, tracks):
+        self.tracks = list(tracks)
+        self.position = 0
+        self.sent = []
+        super().__init__()
+        self.saved_playlist_path = playlist_path
+
+    def connect(self):
+        self.window_id = 1
+        self._version = "5.9"
+
+    def get_trackinfo_raw(self):
+        track = self.tracks[self.position].replace("\\", "/")
+        band  = os.path.basename(os.path.dirname(os.path.dirname(track)))
+        return f"{self.position + 1}. {band} – {os.path.splitext(os.path.basename(track))[0]} - Winamp"
+
+    def send_user_command(self, command, data=0):
+        if isinstance(command, UserCommand): command = command.value
+        self.sent.append(command)
+        if command == UserCommand.DumpPlaylist.value:
+            if not self.saved_playlist_path: return self.position
+            with open(self.saved_playlist_path, "w", encoding="utf-8-sig") as playlist_file:
+                playlist_file.write("#EXTM3U\n")
+                for track in self.tracks: playlist_file.write(f"#EXTINF:1,{track}\n{track}\n")
+            return self.position
+        if command == UserCommand.PlaylistLength.value:   return len(self.tracks)
+        if command == UserCommand.PlaylistPosition.value: return self.position
+        return 0
+
+
+class TestPlaylistFingerprint(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.winamp   = FakeWinamp(os.path.join(self.temp_dir, "winamp.m3u8"), [f"C:\\music\\band\\album\\{i}.mp3" for i in range(10)])
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def test_unchanged_playlist_is_dumped_once(self):
+        for _ in range(5): self.winamp.get_current_track_file_path()
+        self.assertEqual(self.winamp.dumps_performed, 1)
+        self.assertEqual(self.winamp.dumps_avoided  , 4)
+
+    def test_length_change_dumps_again(self):
+        self.winamp.get_current_track_file_path()
+        self.winamp.tracks.append("C:\\music\\band\\album\\new.mp3")
+        self.winamp.position = 10
+        self.assertEqual(self.winamp.get_current_track_file_path(), "C:\\music\\band\\album\\new.mp3")
+        self.assertEqual(self.winamp.dumps_performed, 2)
+
+    def test_same_length_playlist_swap_dumps_again(self):
+        self.winamp.tracks = ["C:\\music\\Pixies\\Doolittle\\01 Debaser.mp3", "C:\\music\\Pixies\\Doolittle\\02 Tame.mp3"]
+        self.assertEqual(self.winamp.get_current_track_file_path(), "C:\\music\\Pixies\\Doolittle\\01 Debaser.mp3")
+        self.winamp.tracks = ["C:\\music\\Fugazi\\Repeater\\01 Turnover.mp3", "C:\\music\\Fugazi\\Repeater\\02 Repeater.mp3"]
+        self.assertEqual(self.winamp.get_current_track_file_path(), "C:\\music\\Fugazi\\Repeater\\01 Turnover.mp3")
+        self.assertEqual(self.winamp.dumps_performed, 2)
+
+    def test_file_names_without_titles_are_not_dumped_every_call(self):
+        self.winamp.get_trackinfo_raw = lambda: "1. Pixies – Debaser - Winamp"
+        for _ in range(5): self.winamp.get_current_track_file_path()
+        self.assertEqual(self.winamp.dumps_performed, 2)
+
+    def test_missing_playlist_file_gives_no_track(self):
+        self.winamp.saved_playlist_path = None
+        self.winamp.playlist_locator.locate = lambda: ""
+        self.assertIsNone(self.winamp.get_current_track_file_path())
+        self.assertIsNone(self.winamp.get_current_track_file_path())
+
+
+class TestPlaylistLocator(unittest.TestCase):
+    @staticmethod
+    def create_playlist(directory, mtime):
+        os.makedirs(directory, exist_ok=True)
+        playlist_path = os.path.join(directory, "winamp.m3u8")
+        with open(playlist_path, "w") as f: f.write("#EXTM3U\n")
+        os.utime(playlist_path, (mtime, mtime))
+        return playlist_path
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.old_root = os.environ.get(WinampPlaylistLocator.ENVIRONMENT_VARIABLE)
+        os.environ[WinampPlaylistLocator.ENVIRONMENT_VARIABLE] = self.temp_dir
+
+    def tearDown(self):
+        if self.old_root is None: del os.environ[WinampPlaylistLocator.ENVIRONMENT_VARIABLE]
+        else:                     os.environ[WinampPlaylistLocator.ENVIRONMENT_VARIABLE] = self.old_root
+        shutil.rmtree(self.temp_dir)
+
+    def test_finds_most_recent_playlist(self):
+        self.create_playlist(os.path.join(self.temp_dir, "Winamp"), 1000)
+        newest = self.create_playlist(os.path.join(self.temp_dir, "winamp-portable"), 2000)
+        self.assertEqual(WinampPlaylistLocator().locate(), newest)
+
+    def test_does_not_rescan_when_nothing_changed(self):
+        self.create_playlist(os.path.join(self.temp_dir, "Winamp"), 1000)
+        locator = WinampPlaylistLocator()
+        for _ in range(10): locator.locate()
+        self.assertEqual(locator.scans, 1)
+
+    def test_rescans_when_profile_moves(self):
+        old_dir = os.path.join(self.temp_dir, "Winamp")
+        self.create_playlist(old_dir, 1000)
+        locator = WinampPlaylistLocator()
+        locator.locate()
+        shutil.rmtree(old_dir)
+        newest = self.create_playlist(os.path.join(self.temp_dir, "Winamp-new"), 2000)
+        self.assertEqual(locator.locate(), newest)
+
+    def test_deleted_playlist_is_noticed_on_the_next_call(self):
+        for name in ("Winamp", "Winamp-old", "Winamp-older"):
+            self.create_playlist(os.path.join(self.temp_dir, name), 1000)
+        chosen = self.create_playlist(os.path.join(self.temp_dir, "Winamp-new"), 2000)
+        locator = WinampPlaylistLocator()
+        locator.locate()
+        os.remove(chosen)
+        self.assertNotEqual(locator.locate(), chosen)
+        self.assertEqual(locator.scans, 2)
+
+    @unittest.skipUnless(sys.platform.startswith("linux"), "inotify is only available on Linux")
+    def test_close_releases_the_inotify_descriptor(self):
+        self.create_playlist(os.path.join(self.temp_dir, "Winamp"), 1000)
+        with WinampPlaylistLocator(use_inotify=True) as locator:
+            locator.locate()
+            fd = locator.inotify.fd
+        self.assertIsNone(locator.inotify)
+        with self.assertRaises(OSError): os.fstat(fd)
+
+    def test_directory_removed_during_scan_is_skipped(self):
+        newest = self.create_playlist(os.path.join(self.temp_dir, "Winamp"), 2000)
+        os.makedirs(os.path.join(self.temp_dir, "Winamp-gone"))
+        real_stat = Path.stat
+        seen = []
+        def stat(path, *args, **kwargs):
+            if path.name == "Winamp-gone":
+                seen.append(path)
+                if len(seen) > 1: raise FileNotFoundError(path)             # gone between is_dir() and stat()
+            return real_stat(path, *args, **kwargs)
+        with mock.patch.object(Path, "stat", stat):
+            self.assertEqual(WinampPlaylistLocator().locate(), newest)
+
+
+class TestAlbumArtResolver(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.winamp   = FakeWinamp(os.path.join(self.temp_dir, "winamp.m3u8"), ["C:\\music\\Pixies\\Doolittle\\01.mp3",
+                                                                                "C:\\music\\Fugazi\\Repeater\\01.mp3",
+                                                                                "C:\\music\\Weezer\\Weezer\\01.mp3"])
+        with open(os.path.join(self.temp_dir, "album_covers.json")        , "w") as f: json.dump({"Doolittle": "doolittle", "Weezer - Weezer": "blue"}, f)
+        with open(os.path.join(self.temp_dir, "album_name_exceptions.txt"), "w") as f: f.write("Weezer\n")
+        self.resolver = AlbumArtResolver(self.winamp, self.temp_dir)
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def test_known_album(self):
+        self.assertEqual(self.resolver.resolve(0), ("doolittle", "Doolittle"))
+
+    def test_unknown_album_uses_default(self):
+        self.assertEqual(self.resolver.resolve(1), ("logo", "Winamp v5.9"))
+
+    def test_album_name_exception_uses_artist(self):
+        self.assertEqual(self.resolver.resolve(2), ("blue", "Weezer"))
+
+    def test_unchanged_playlist_is_built_once(self):
+        for position in range(3): self.resolver.resolve(position)
+        self.assertEqual(self.resolver.builds, 1)
+
+    def test_paths_of_earlier_playlists_are_forgotten(self):
+        self.resolver.resolve(0)
+        self.winamp.tracks = ["C:\\music\\Pixies\\Doolittle\\01.mp3"]
+        self.assertEqual(self.resolver.resolve(0), ("doolittle", "Doolittle"))
+        self.assertEqual(list(self.resolver.by_path), ["C:\\music\\Pixies\\Doolittle\\01.mp3"])
+
+
+class FakeClock:
+    def __init__(self): self.now = 100.0
+    def __call__(self): return self.now
+
+
+class TestTrackPositionTracker(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.winamp   = FakeWinamp(os.path.join(self.temp_dir, "winamp.m3u8"), ["C:\\a.mp3"])
+        self.winamp.status, self.winamp.track_position, self.winamp.track_length = PlayingStatus.Playing, 5000, 200
+        self.winamp.get_playing_status = lambda: self.winamp.status
+        self.winamp.get_track_status   = lambda: (self.winamp.track_length * 1000, self.winamp.track_position)
+        self.clock   = FakeClock()
+        self.tracker = TrackPositionTracker(self.winamp, sample_interval=1.0, clock=self.clock)
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def test_interpolates_between_samples(self):
+        self.assertEqual(self.tracker.get_track_position(), 5000)
+        self.clock.now += 0.25
+        self.assertEqual(self.tracker.get_track_position(), 5250)
+        self.assertEqual(self.tracker.samples, 1)
+
+    def test_paused_track_does_not_move(self):
+        self.winamp.status = PlayingStatus.Paused
+        self.tracker.get_track_position()
+        self.clock.now += 0.5
+        self.assertEqual(self.tracker.get_track_position(), 5000)
+
+    def test_seek_resynchronizes(self):
+        self.tracker.get_track_position()
+        self.winamp.seek_track(60000)
+        self.winamp.track_position = 60000
+        self.assertEqual(self.tracker.get_track_position(), 60000)
+        self.assertEqual(self.tracker.samples, 2)
+
+    def test_last_second_of_the_track_is_not_resampled_every_read(self):
+        self.winamp.track_position = 199500
+        self.tracker.get_track_position()
+        for _ in range(8):
+            self.clock.now += 0.1
+            self.assertLessEqual(self.tracker.get_track_position(), 200000)
+        self.assertEqual(self.tracker.samples, 1)
+
+    def test_invalidate_from_another_thread_during_a_read(self):
+        self.tracker.get_track_position()
+        estimate = self.tracker.estimate
+        def invalidate_then_estimate(*args):
+            invalidator = threading.Thread(target=self.tracker.invalidate)
+            invalidator.start()
+            invalidator.join()                                                  # after the check, before the estimate
+            return estimate(*args)
+        self.tracker.estimate = invalidate_then_estimate
+        self.clock.now += 0.25
+        self.assertEqual(self.tracker.get_track_position(), 5250)
+        self.assertEqual(self.tracker.get_track_position(), 5000)              # the invalidation still takes a sample
+        self.assertEqual(self.tracker.samples, 2)
+
+    def test_spurious_position_is_clamped(self):
+        self.winamp.track_position = 4294967000
+        self.assertEqual(self.tracker.get_track_position(), 0)
+
+
+class TestWinampCommandQueue(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.winamp   = FakeWinamp(os.path.join(self.temp_dir, "winamp.m3u8"), [])
+        self.release  = threading.Event()
+        self.messages = []
+        self.queue    = WinampCommandQueue(self.winamp, transport=self.transport, timeout=0.1)
+
+    def tearDown(self):
+        self.release.set()
+        self.queue.close()
+        shutil.rmtree(self.temp_dir)
+
+    def transport(self, window_id, message, wparam, lparam, timeout):
+        self.release.wait()
+        self.messages.append((message, wparam, lparam))
+        if wparam == 999: raise TimeoutError("hung")
+        return wparam
+
+    def test_consecutive_volume_sets_keep_the_last(self):
+        first   = self.queue.submit_user_command(UserCommand.PlayingStatus)     # keeps the worker busy
+        futures = [self.queue.set_volume(level) for level in range(10, 20)]
+        self.release.set()
+        self.assertEqual([future.result(1) for future in futures], [19] * 10)
+        first.result(1)
+        self.assertEqual(len(self.messages), 2)
+        self.assertEqual(self.queue.stats()["coalesced"], 9)
+
+    def test_query_after_setter_is_not_merged_with_query_before_it(self):
+        first   = self.queue.submit_user_command(UserCommand.PlayingStatus)     # keeps the worker busy
+        before  = self.queue.submit_user_command(UserCommand.TrackStatus)
+        seek    = self.queue.submit_user_command(UserCommand.SeekTrack, 60000)
+        after   = self.queue.submit_user_command(UserCommand.TrackStatus)
+        again   = self.queue.submit_user_command(UserCommand.TrackStatus)
+        self.release.set()
+        for future in (first, before, seek, after, again): future.result(1)
+        self.assertEqual([lparam for _, _, lparam in self.messages],
+                         [UserCommand.PlayingStatus.value, UserCommand.TrackStatus.value, UserCommand.SeekTrack.value, UserCommand.TrackStatus.value])
+        self.assertEqual(self.queue.stats()["coalesced"], 1)
+
+    def test_timeout_is_reported_on_the_future(self):
+        self.release.set()
+        with self.assertRaises(TimeoutError): self.queue.submit_user_command(UserCommand.TrackInfo, 999).result(1)
+        self.assertEqual(self.queue.stats()["timed_out"], 1)
+        self.assertEqual(self.queue.stats()["sent"], 0)
+
+    def test_position_is_invalidated_when_sent_not_when_queued(self):
+        invalidated = []
+        self.winamp.position_tracker = mock.Mock(invalidate=lambda: invalidated.append(len(self.messages)))
+        volume = self.queue.set_volume(50)
+        seek   = self.queue.submit_user_command(UserCommand.SeekTrack, 60000)
+        self.assertEqual(invalidated, [])                                       # the worker has not sent the seek yet
+        self.release.set()
+        volume.result(1)
+        seek.result(1)
+        self.assertEqual(invalidated, [2])                                      # only after the seek, not the volume
+
+
+class TestTitleParsing(unittest.TestCase):
+    def test_debug_trace_of_every_example_formats(self):
+        trace = claire_logging.trace_to_ring(claire_winamp.logger, capacity=100000)
+        try:
+            results = [claire_winamp.extract_band_and_track_from_raw_title(example) for example in claire_winamp.TITLE_EXAMPLES]
+            lines = trace.lines()
+        finally:
+            claire_logging.stop_trace(claire_winamp.logger, trace)
+        self.assertIn(("The Coathangers", "Excuse Me?"), results)
+        self.assertIn(("", ""), results)                                      # PURPOSEFUL ERROR
+        self.assertTrue(any("can't find en-dash" in line and "%artist%" in line for line in lines))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,5 +1,6 @@
 from PIL import Image, ImageDraw, ImageFont, ImageFilter, ImageEnhance
 import numpy as np
+import claire_fonts
 
 # Function to create a random pixel background
 def create_random_background(width, height):
@@ -90,8 +91,8 @@ def draw_text_examples(image, font_path):
 
 def find_first_ttf_file(start_dir):
     """
-    Searches for the first .ttf file starting from the given directory,
-    then searches in subdirectories and parent directories.
+    Searches for the first .ttf file in the given directory (a few levels down at most), then in res/fonts. The system
+    font directories aren't searched and no font index is saved, so installed fonts and the home directory don't matter.
 
     Args:
         start_dir (str): The directory to start the search from.
@@ -99,29 +100,11 @@ def find_first_ttf_file(start_dir):
     Returns:
         str: The path of the first .ttf file found, or None if no file is found.
     """
-    # Search in current directory and subdirectories
-    import os
-    for root, dirs, files in os.walk(start_dir):
-        for file in files:
-            if file.lower().endswith('.ttf'):
-                ttf_path = os.path.join(root, file)
-                print(f"Found .ttf file: {ttf_path}")
-                return ttf_path
-
-    # Search in parent directories
-    parent_dir = start_dir
-    while True:
-        parent_dir = os.path.dirname(parent_dir)
-        if parent_dir == os.path.dirname(parent_dir):  # root directory
-            break
-        for root, dirs, files in os.walk(parent_dir):
-            for file in files:
-                if file.lower().endswith('.ttf'):
-                    ttf_path = os.path.join(root, file)
-                    print(f"Found .ttf file: {ttf_path}")
-                    return ttf_path
-    print("No .ttf file found.")
-    return None
+    discovery = claire_fonts.FontDiscovery([start_dir, claire_fonts.DEFAULT_FONT_DIR], cache_path='')
+    ttf_path  = next((font for font in discovery.fonts if font.lower().endswith('.ttf')), None)
+    if ttf_path: print(f"Found .ttf file: {ttf_path}")
+    else:        print("No .ttf file found.")
+    return ttf_path
 
 
 # Main script